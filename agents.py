@@ -2,108 +2,20 @@
 import os
 import json
 import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
-import requests
 from flask import jsonify  # Keep for existing error responses
+from llm_client import call_llm, get_llm_content, stream_llm
+from paper import papers_from_dicts
+from rate_limiter import submit_in_context
+from token_counter import count_tokens, truncate_to_tokens
 
 # Load environment variables from .env file in the same directory as this file
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path, override=True)
 
-# Get API keys
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-
-# Debug print to verify keys are loaded
-print(f"[AGENTS.PY] OPENAI_API_KEY loaded: {'Yes' if OPENAI_API_KEY else 'No'}")
-print(f"[AGENTS.PY] DEEPSEEK_API_KEY loaded: {'Yes' if DEEPSEEK_API_KEY else 'No'}")
-
-# API Endpoints
-OPENAI_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
-# !!! IMPORTANT: Replace with the actual DeepSeek API endpoint !!!
-DEEPSEEK_COMPLETIONS_URL = "https://api.deepseek.com/v1/chat/completions" # Placeholder
-
-def _call_openai_api(messages, model_name, temperature=0.7, max_tokens=None):
-    """Helper function to call OpenAI API."""
-    if not OPENAI_API_KEY:
-        return {"error": "OpenAI API key not found."}
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model_name,
-        "messages": messages,
-        "temperature": temperature
-    }
-    if max_tokens:
-        payload["max_tokens"] = max_tokens
-    
-    try:
-        response = requests.post(OPENAI_COMPLETIONS_URL, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()  # Raises an exception for HTTP error codes
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"OpenAI API request failed: {e}")
-        return {"error": f"OpenAI API request failed: {str(e)}"}
-
-def _call_deepseek_api(messages, model_name, temperature=0.7, max_tokens=None):
-    """Helper function to call DeepSeek API."""
-    # !!! IMPORTANT: This is a placeholder. Adapt to DeepSeek's actual API. !!!
-    # You'll need to verify the model_name, payload structure, and endpoint.
-    if not DEEPSEEK_API_KEY:
-        return {"error": "DeepSeek API key not found."}
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}", # Or other auth mechanism
-        "Content-Type": "application/json"
-    }
-    # Hypothetical payload structure for DeepSeek - ADJUST AS NEEDED
-    payload = {
-        "model": model_name, # This might be part of the URL or a specific payload parameter
-        "messages": messages, # Ensure this message format is what DeepSeek expects
-        "temperature": temperature,
-        # "max_tokens": max_tokens, # Check if DeepSeek supports this
-    }
-    if max_tokens: # Add if supported
-        payload["max_tokens"] = max_tokens
-
-    try:
-        response = requests.post(DEEPSEEK_COMPLETIONS_URL, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
-        # !!! IMPORTANT: DeepSeek's response structure might differ from OpenAI's.
-        # You may need to adapt how you extract 'content' below.
-        # For example, it might not be ['choices'][0]['message']['content']
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"DeepSeek API request failed: {e}")
-        return {"error": f"DeepSeek API request failed: {str(e)}"}
-
-def get_llm_response_content(result, model_name):
-    """Extracts content from LLM response, handling potential differences."""
-    if "error" in result:
-        return result # Propagate error
-
-    try:
-        # Standard OpenAI structure
-        if model_name.startswith("gpt"):
-            return result['choices'][0]['message']['content']
-        # Placeholder for DeepSeek - adjust based on their actual response
-        elif model_name.startswith("deepseek"):
-            # Example: You might need to access result['data']['choices'][0]['content'] or similar
-            # This is a common alternative structure. CONSULT DEEPSEEK DOCS.
-            if 'choices' in result and result['choices'] and 'message' in result['choices'][0] and 'content' in result['choices'][0]['message']:
-                 return result['choices'][0]['message']['content']
-            # Add other potential structures for DeepSeek if necessary
-            else:
-                print(f"Unexpected response structure from DeepSeek: {result}")
-                return {"error": "Failed to parse response from DeepSeek due to unexpected structure."}
-        else:
-            return {"error": f"Content extraction not implemented for model: {model_name}"}
-    except (KeyError, IndexError, TypeError) as e:
-        print(f"Failed to parse content from {model_name} response: {e}. Response: {result}")
-        return {"error": f"Failed to parse content from {model_name} response."}
-
 
 def generate_research_questions_and_purpose(objective, num_questions, model_name="gpt-3.5-turbo"):
     prompt_content = (f"You are a helpful assistant capable of generating research questions along with their purposes "
@@ -115,16 +27,10 @@ def generate_research_questions_and_purpose(objective, num_questions, model_name
         {"role": "user", "content": prompt_content}
     ]
 
-    result_json = {}
-    if model_name.startswith("gpt"):
-        result_json = _call_openai_api(messages, model_name)
-    elif model_name.startswith("deepseek"):
-        result_json = _call_deepseek_api(messages, model_name)
-    else:
-        return {"error": f"Unsupported model: {model_name}"}
+    result_json = call_llm(messages, model_name)
 
-    content = get_llm_response_content(result_json, model_name)
-    if isinstance(content, dict) and "error" in content: # Check if get_llm_response_content returned an error
+    content = get_llm_content(result_json, model_name)
+    if isinstance(content, dict) and "error" in content: # Check if get_llm_content returned an error
         return content
 
     lines = [line for line in content.strip().split('\n') if line.strip()]
@@ -155,43 +61,163 @@ def generate_research_questions_and_purpose(objective, num_questions, model_name
     return {"research_questions": question_purpose_objects[:num_questions]}
 
 
-def generate_summary_llm(prompt, model_name="gpt-3.5-turbo"):
-    """Generates a summary using the specified LLM based on the provided prompt."""
-    messages = [
+def _summary_messages(prompt):
+    return [
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": prompt}
     ]
+
+def generate_summary_llm(prompt, model_name="gpt-3.5-turbo"):
+    """Generates a summary using the specified LLM based on the provided prompt."""
+    messages = _summary_messages(prompt)
     
-    result_json = {}
-    if model_name.startswith("gpt"):
-        result_json = _call_openai_api(messages, model_name)
-    elif model_name.startswith("deepseek"):
-        result_json = _call_deepseek_api(messages, model_name)
-    else:
-        return {"error": f"Unsupported model: {model_name}"}
+    result_json = call_llm(messages, model_name)
 
-    content = get_llm_response_content(result_json, model_name)
+    content = get_llm_content(result_json, model_name)
     if isinstance(content, dict) and "error" in content:
         return content
     return content.strip()
 
+def generate_summary_llm_stream(prompt, model_name="gpt-3.5-turbo"):
+    """Streaming variant of generate_summary_llm: yields text deltas, or an {"error": ...} dict."""
+    return stream_llm(_summary_messages(prompt), model_name)
+
 def generate_abstract_llm(prompt, model_name="gpt-3.5-turbo"):
     """Generates a summary abstract using the specified LLM."""
     return generate_summary_llm(prompt, model_name)
 
+def generate_abstract_llm_stream(prompt, model_name="gpt-3.5-turbo"):
+    """Streams a summary abstract using the specified LLM."""
+    return generate_summary_llm_stream(prompt, model_name)
+
+def build_abstract_prompt(research_questions, objective, search_string):
+    return (f"Based on the research questions: '{research_questions}', the objective: '{objective}', "
+            f"and the search string: '{search_string}', generate a comprehensive abstract.")
+
+def build_introduction_prompt(total_papers_count, filtered_papers_count, search_string, objective,
+                              research_questions, answers):
+    """Introduction prompt from the review's paper counts, research questions and answers ({question, answer} dicts)."""
+    # Constructing the introduction based on the provided data
+    prompt_intro = (f"This document synthesizes findings. Initially, {total_papers_count} papers related to \"{search_string}\" were considered. "
+                    f"After filtering, {filtered_papers_count} papers were thoroughly examined. The primary research objective is: {objective}.")
+
+    prompt_questions = "\n\nKey Research Questions Addressed:\n" + "\n".join([f"- {q}" for q in research_questions])
+
+    # Summarize answers briefly
+    answers_summary_parts = []
+    for ans_obj in answers:
+        if isinstance(ans_obj, dict) and 'question' in ans_obj and 'answer' in ans_obj:
+            # Take first 150 chars of answer for brevity in prompt
+            ans_brief = ans_obj['answer'][:150] + "..." if len(ans_obj['answer']) > 150 else ans_obj['answer']
+            answers_summary_parts.append(f"- For question '{ans_obj['question']}': {ans_brief}")
+    prompt_answers = "\n\nSummary of Key Findings:\n" + "\n".join(answers_summary_parts)
+
+    return (f"{prompt_intro}{prompt_questions}{prompt_answers}\n\nBased on this information, "
+            f"generate a coherent introduction and high-level summary of the findings for a research paper section.")
+
 def generate_introduction_summary_llm(prompt, model_name="gpt-3.5-turbo"):
     """Generates an introduction summary using the specified LLM."""
     return generate_summary_llm(prompt, model_name)
 
-def generate_summary_conclusion_llm(papers_info, model_name="gpt-3.5-turbo"):
-    """Generates a conclusion summary from papers_info using the specified LLM."""
-    prompt_parts = ["Summarize the conclusions of the following papers:"]
-    for paper in papers_info:
-        title = paper.get("title", "N/A")
-        author = paper.get("creator", "N/A") # Assuming 'creator' holds author info
-        year = paper.get("year", "N/A")
-        prompt_parts.append(f"- '{title}' by {author} ({year})")
-    prompt = " ".join(prompt_parts)
-    
-    return generate_summary_llm(prompt, model_name)
+# --- Conclusion summaries (map-reduce) ---
+# Papers per conclusion prompt are bounded by tokens; larger reviews are summarised chunk by
+# chunk (concurrently) and the partial summaries are then merged, recursively, into one.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+# Average papers per chunk. Chunk boundaries are picked from each paper's hash, so adding a
+# paper only changes the chunk it lands in and the other chunks' prompts (and cache entries) stay valid.
+SUMMARY_CHUNK_TARGET_PAPERS = 12
+SUMMARY_ABSTRACT_MAX_TOKENS = 120
+_CONCLUSION_HEADER = "Summarize the conclusions of the following papers:"
+_REDUCE_HEADER = ("The following are summaries of the conclusions of different groups of papers from the same "
+                  "literature review. Merge them into one coherent summary of the conclusions, keeping the key findings:")
+
+
+def _paper_hash(paper):
+    identity = (paper.doi or paper.title or paper.url).strip().lower()
+    return int(hashlib.sha1(identity.encode("utf-8")).hexdigest(), 16)
+
+
+def _conclusion_line(paper, model_name):
+    line = f"- '{paper.title or 'N/A'}' by {paper.authors or 'N/A'} ({paper.year or 'N/A'})"
+    if paper.abstract:
+        line += f": {truncate_to_tokens(paper.abstract, SUMMARY_ABSTRACT_MAX_TOKENS, model_name)}"
+    return line
+
+
+def chunk_papers(papers, model_name=None, max_tokens=None, target_papers=SUMMARY_CHUNK_TARGET_PAPERS):
+    """Splits papers into groups of conclusion lines that each fit in `max_tokens`.
+
+    Papers are ordered by hash and a chunk ends after any paper whose hash is divisible by
+    `target_papers` (content-defined chunking), or earlier when the token bound is reached.
+    """
+    max_tokens = max_tokens or SUMMARY_CHUNK_TOKENS
+    hashed = sorted(((_paper_hash(paper), paper) for paper in papers), key=lambda item: item[0])
+    chunks, current, used = [], [], 0
+    for paper_hash, paper in hashed:
+        line = truncate_to_tokens(_conclusion_line(paper, model_name), max_tokens, model_name)
+        cost = count_tokens(line, model_name) + 1
+        if current and used + cost > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += cost
+        if paper_hash % target_papers == 0:
+            chunks.append(current)
+            current, used = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _group_by_tokens(texts, max_tokens, model_name):
+    """Packs texts, in order, into groups of at most `max_tokens` (each group holds at least two when possible)."""
+    groups, current, used = [], [], 0
+    for text in texts:
+        cost = count_tokens(text, model_name) + 2
+        if len(current) >= 2 and used + cost > max_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summarise_all(prompts, model_name):
+    """Runs summary prompts concurrently; returns the summaries in order, or the first error dict."""
+    if len(prompts) == 1:
+        results = [generate_summary_llm(prompts[0], model_name)]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(SUMMARY_MAX_WORKERS, len(prompts))),
+                                thread_name_prefix="summaries") as executor:
+            futures = [submit_in_context(executor, generate_summary_llm, prompt, model_name) for prompt in prompts]
+            results = [future.result() for future in futures]
+    for result in results:
+        if isinstance(result, dict) and "error" in result:
+            return result
+    return results
 
+
+def generate_summary_conclusion_llm(papers_info, model_name="gpt-3.5-turbo"):
+    """Generates a conclusion summary from papers_info using the specified LLM.
+
+    Small reviews are summarised in one call. Larger ones are chunked (see chunk_papers), each
+    chunk is summarised concurrently, and the partial summaries are reduced until one remains.
+    Every prompt goes through the LLM response cache, so re-running after adding a few papers
+    only pays for the chunks (and reduce steps) whose input changed.
+    """
+    papers = papers_from_dicts(papers_info)
+    chunks = chunk_papers(papers, model_name)
+    if len(chunks) <= 1:
+        prompt_parts = [_CONCLUSION_HEADER] + (chunks[0] if chunks else [])
+        return generate_summary_llm(" ".join(prompt_parts), model_name)
+
+    print(f"[SUMMARY] Summarising conclusions of {len(papers)} papers in {len(chunks)} chunks")
+    summaries = _summarise_all(["\n".join([_CONCLUSION_HEADER] + chunk) for chunk in chunks], model_name)
+    while isinstance(summaries, list) and len(summaries) > 1:
+        groups = _group_by_tokens(summaries, SUMMARY_CHUNK_TOKENS, model_name)
+        print(f"[SUMMARY] Reducing {len(summaries)} partial summaries in {len(groups)} groups")
+        summaries = _summarise_all(["\n\n".join([_REDUCE_HEADER] + group) for group in groups], model_name)
+    return summaries if isinstance(summaries, dict) else summaries[0]
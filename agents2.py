@@ -1,48 +1,8 @@
 # agents2.py
-import requests
 import json
 import os
 
-# Assuming helper functions might be moved to a shared utility or OPENAI_API_KEY is loaded here too
-# For this example, we'll re-define simplified call logic or you can import from agents.py
-# from agents import _call_openai_api, _call_deepseek_api, get_llm_response_content # Ideal case
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-OPENAI_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
-DEEPSEEK_COMPLETIONS_URL = "https://api.deepseek.com/v1/chat/completions" # Placeholder
-
-# --- Start Duplicated/Simplified Helper Functions (Ideally import from a shared util or agents.py) ---
-def _call_llm_api(messages, model_name, temperature=0.7):
-    if model_name.startswith("gpt"):
-        if not OPENAI_API_KEY: return {"error": "OpenAI API key not found."}
-        api_key = OPENAI_API_KEY
-        url = OPENAI_COMPLETIONS_URL
-    elif model_name.startswith("deepseek"):
-        if not DEEPSEEK_API_KEY: return {"error": "DeepSeek API key not found."}
-        api_key = DEEPSEEK_API_KEY
-        url = DEEPSEEK_COMPLETIONS_URL # Placeholder
-    else:
-        return {"error": f"Unsupported model prefix for API call: {model_name}"}
-
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"model": model_name, "messages": messages, "temperature": temperature}
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": f"API request failed for {model_name}: {str(e)}"}
-
-def _get_llm_content(result, model_name):
-    if "error" in result: return result
-    try:
-        # This part needs to be robust for different model response structures
-        return result['choices'][0]['message']['content']
-    except (KeyError, IndexError, TypeError):
-        return {"error": f"Failed to parse content from {model_name} response."}
-# --- End Duplicated/Simplified Helper Functions ---
+from llm_client import call_llm, get_llm_content
 
 
 def extract_search_string(content):
@@ -72,9 +32,9 @@ def generate_search_string_llm(objective, research_questions, model_name="gpt-3.
         {"role": "user", "content": combined_prompt}
     ]
     
-    result_json = _call_llm_api(messages, model_name) # Using the simplified local helper
+    result_json = call_llm(messages, model_name)
     
-    content = _get_llm_content(result_json, model_name) # Using the simplified local helper
+    content = get_llm_content(result_json, model_name)
     if isinstance(content, dict) and "error" in content:
         return content # Error dictionary
 
@@ -1,125 +1,388 @@
-from scholarly import scholarly
-import csv
-from scholarly import ProxyGenerator, scholarly
 import os
 import requests
 import json
+import re
+import time
+import queue
+import random
+import threading
+import difflib
+import itertools
+import unicodedata
+import contextvars
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from exporters import paper_rows, write_export
+from llm_cache import SEARCH_CACHE_TTLS, search_cache, search_key
+from metrics import record_search_call
+from paper import Paper
+from proxy_pool import is_captcha, scholar_proxy_pool
+from rate_limiter import get_rate_limiter, request_slot, submit_in_context
 
 api_key = os.getenv('SCOPUS_API_KEY')
-# Initialize a global variable to track if the proxy setup has been done
-proxy_setup_done = False
+# Route Google Scholar traffic through proxy_pool's health-scored proxies. 0 = direct.
+SCHOLAR_USE_PROXY = os.getenv("SCHOLAR_USE_PROXY", "1") != "0"
+# Proxies tried for one Scholar page before the search gives up.
+SCHOLAR_MAX_ROTATIONS = int(os.getenv("SCHOLAR_MAX_ROTATIONS", "5"))
+
+# scholarly (and the fake-useragent/bs4/selenium stack behind it) is imported on the first
+# Google Scholar search rather than at import, so server start-up stays fast.
+_scholarly = None
+_scholarly_lock = threading.Lock()
+# scholarly routes every request through one global session, so a page is fetched under this lock
+# with the proxy chosen for it. Proxy URL -> its scholarly ProxyGenerator, None -> direct.
+_scholar_fetch_lock = threading.Lock()
+_scholar_generators = {}
+_scholar_route = None
+
+
+def get_scholarly():
+    """The scholarly client, imported on first use. With SCHOLAR_USE_PROXY the proxy health checks start too."""
+    global _scholarly
+    if _scholarly is None:
+        with _scholarly_lock:
+            if _scholarly is None:
+                started = time.perf_counter()
+                from scholarly import scholarly
+                if SCHOLAR_USE_PROXY:
+                    scholar_proxy_pool.start()
+                _scholarly = scholarly
+                print(f"[SCHOLAR] Initialised in {time.perf_counter() - started:.2f}s")
+    return _scholarly
+
+
+def _route_scholar(proxy):
+    """Points scholarly's session at `proxy` (None = direct). Call with _scholar_fetch_lock held."""
+    global _scholar_route
+    if _scholar_route == proxy and proxy in _scholar_generators:
+        return
+    generator = _scholar_generators.get(proxy)
+    if generator is None:
+        from scholarly import ProxyGenerator
+        generator = ProxyGenerator()
+        if proxy is not None and not generator.SingleProxy(http=proxy):
+            raise SearchAPIError(f"Proxy {proxy} is not reachable")
+        _scholar_generators[proxy] = generator
+    # Passing the generator twice stops scholarly from scraping its own free proxies for the second session
+    get_scholarly().use_proxy(generator, generator)
+    _scholar_route = proxy
+
+
+def scholar_ready():
+    return _scholarly is not None
+
+
+# --- Paginated retrieval helpers shared by the Scopus and Semantic Scholar searches ---
+SCOPUS_API_URL = os.getenv("SCOPUS_API_URL", "https://api.elsevier.com/content/search/scopus")
+S2_API_URL = os.getenv("SEMANTIC_SCHOLAR_API_URL", "https://api.semanticscholar.org/graph/v1")
+SCOPUS_PAGE_SIZE = int(os.getenv("SCOPUS_PAGE_SIZE", "25"))  # 25 is the Scopus maximum for standard keys
+S2_PAGE_SIZE = int(os.getenv("S2_PAGE_SIZE", "100"))  # Semantic Scholar's per-request maximum
+S2_RELEVANCE_MAX = 1000  # offset + limit ceiling of /paper/search; bulk search is used beyond it
+# Pages fetched ahead of the consumer while it processes the current one.
+SEARCH_PREFETCH_PAGES = int(os.getenv("SEARCH_PREFETCH_PAGES", "2"))
+SEARCH_MAX_RETRIES = int(os.getenv("SEARCH_MAX_RETRIES", "5"))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "60"))
+
+_search_session = requests.Session()
+
 
-def setup_proxy():
-    global proxy_setup_done
-    # Check if the proxy setup has already been done
-    if not proxy_setup_done:
+class SearchAPIError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _retry_delay(response, attempt):
+    """Seconds to wait before retrying: the server's Retry-After when given, else jittered exponential backoff."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
         try:
-            # Set up a ProxyGenerator object to use free proxies
-            pg = ProxyGenerator()
-            pg.FreeProxies()
-            scholarly.use_proxy(pg)
-            
-            # Mark the setup as done
-            proxy_setup_done = True
-            print("Proxy setup completed.")
-        except Exception as e:
-            print(f"Proxy setup failed: {e}")
-            print("Continuing without proxy setup...")
-            proxy_setup_done = True  # Mark as done to avoid retrying
-    else:
-        print("Proxy setup was already completed earlier in this session.")
+            return min(float(retry_after), 120.0)
+        except ValueError:
+            pass
+    return min(2 ** attempt, 60) * (0.5 + random.random() / 2)
+
+
+def _get_json_with_backoff(url, headers, params, source_name, limiter=None):
+    """GETs a search API page, retrying 429/5xx responses and connection errors with backoff.
+
+    Each attempt first waits for `limiter` (the source's shared rate limiter), when given.
+    """
+    started = time.perf_counter()
+    queue_wait = 0.0
+    for attempt in range(SEARCH_MAX_RETRIES + 1):
+        if limiter is not None:
+            queue_wait += limiter.acquire()
+        response = None
+        try:
+            queued = time.monotonic()
+            with request_slot():
+                queue_wait += time.monotonic() - queued
+                response = _search_session.get(url, headers=headers, params=params, timeout=SEARCH_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            if attempt == SEARCH_MAX_RETRIES:
+                record_search_call(source_name, time.perf_counter() - started, queue_wait, attempt, ok=False)
+                raise SearchAPIError(f"{source_name} request failed: {e}")
+        else:
+            if response.status_code == 200:
+                record_search_call(source_name, time.perf_counter() - started, queue_wait, attempt)
+                return response.json()
+            if (response.status_code != 429 and response.status_code < 500) or attempt == SEARCH_MAX_RETRIES:
+                record_search_call(source_name, time.perf_counter() - started, queue_wait, attempt, ok=False)
+                raise SearchAPIError(response.text, response.status_code)
+        delay = _retry_delay(response, attempt)
+        print(f"{source_name} request throttled or failed (attempt {attempt + 1}); retrying in {delay:.1f}s")
+        time.sleep(delay)
 
-# Example usage - wrapped in try-except to handle proxy failures gracefully
-try:
-    setup_proxy()
-except Exception as e:
-    print(f"Initial proxy setup failed: {e}")
-    print("Continuing without proxy setup...")
 
+def prefetch_pages(pages, depth=SEARCH_PREFETCH_PAGES):
+    """Iterates `pages` on a background thread, keeping at most `depth` pages buffered ahead of the consumer.
 
+    Exceptions from the producer are re-raised in the consumer. Closing the returned generator early
+    stops the producer at its next page.
+    """
+    if depth <= 0:
+        yield from pages
+        return
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
 
+    def _put(item):
+        # Waits for buffer space, giving up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-def fetch_papers(search_string, min_results=8):
-    search_query = scholarly.search_pubs(search_string)
-    papers_details = []
-    for _ in range(min_results):
+    def _produce():
         try:
-            paper = next(search_query)
-            paper_details = {
-                'title': paper['bib']['title'],
-                'author': paper['bib'].get('author'),
-                'pub_year': paper['bib'].get('pub_year'),
-                'publication_url': paper.get('pub_url', 'Not Available'),
-                'journal_name': paper['bib'].get('journal', 'Not Available'),
-                # Attempting to extract DOI, publication date, and making an educated guess on paper type
-                'doi': paper.get('doi', 'Not Available'),
-                'publication_date': paper['bib'].get('pub_year', 'Not Available'), # Simplified to publication year
-                'paper_type': 'Journal' if 'journal' in paper['bib'] else 'Conference' if 'conference' in paper['bib'] else 'Primary Study' # Simplistic categorization
-            }
-            papers_details.append(paper_details)
-        except StopIteration:
-            break  # Exit if there are no more results
-    return papers_details
-
-
-def search_semantic_scholar(search_string, start_year, limit=10):
-    """Search papers using Semantic Scholar API"""
+            for page in pages:
+                if not _put(("page", page)):
+                    return
+            _put(("done", None))
+        except Exception as e:
+            _put(("error", e))
+
+    # The producer runs in the caller's context so its requests are rate limited for the same review
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(_produce,), name="search-prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, item = buffer.get()
+            if kind == "page":
+                yield item
+            elif kind == "error":
+                raise item
+            else:
+                return
+    finally:
+        stop.set()
+
+
+# --- Search result cache ---
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _store_results(key, papers, limit):
+    search_cache.set(key, {"papers": [paper.to_dict() for paper in papers], "limit": limit, "fetched_at": time.time()})
+
+
+def _refresh(key, fetch, limit):
+    try:
+        papers = fetch(limit)
+        if isinstance(papers, list):
+            _store_results(key, papers, limit)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def cached_search(source, fetch, search_string, limit, use_cache=True, **filters):
+    """Returns fetch(limit) (papers, or an {"error": ...} dict), answered from search_cache when possible.
+
+    Entries are keyed on the normalised search string and `filters`; one fetched with a larger
+    limit (or that exhausted the results) serves smaller limits. Entries older than the source's
+    SEARCH_CACHE_TTLS are still served, and refreshed in the background at the entry's own limit
+    (or the caller's, if larger) so a small request doesn't shrink the entry.
+    """
+    key = search_key(source, search_string, **filters)
+    entry = search_cache.get(key) if use_cache else None
+    if entry is not None and (entry["limit"] >= limit or len(entry["papers"]) < entry["limit"]):
+        if time.time() - entry["fetched_at"] > SEARCH_CACHE_TTLS.get(source, 0):
+            with _refreshing_lock:
+                refresh = key not in _refreshing
+                _refreshing.add(key)
+            if refresh:
+                print(f"[SEARCH_CACHE] Serving stale {source} results while refreshing")
+                submit_in_context(_refresh_executor, _refresh, key, fetch, max(entry["limit"], limit))
+        return [Paper.from_dict(paper) for paper in entry["papers"][:limit]]
+
+    papers = fetch(limit)
+    if isinstance(papers, list) and search_cache.enabled:
+        _store_results(key, papers, limit)
+    return papers
+
+
+SCHOLAR_PAGE_SIZE = 10  # results per Google Scholar page fetched by scholarly
+
+
+def fetch_papers(search_string, min_results=8, use_cache=True):
+    return cached_search("scholar", lambda limit: _fetch_scholar(search_string, limit), search_string, min_results,
+                         use_cache)
+
+
+def _fetch_scholar(search_string, min_results):
+    # Errors come back as a dict, which cached_search doesn't store
+    try:
+        papers = []
+        for page in prefetch_pages(iter_scholar_pages(search_string, min_results)):
+            papers.extend(page)
+        return papers
+    except SearchAPIError as e:
+        print(f"Error in fetch_papers: {e}")
+        return {"error": f"Failed to fetch papers from Google Scholar: {e}"}
+
+
+def iter_scholar_pages(search_string, limit, page_size=SCHOLAR_PAGE_SIZE):
+    """Yields pages (lists of Paper) of Google Scholar results until `limit` papers have been returned.
+
+    Every page is its own scholarly query from the next start index, sent through the proxy pool's
+    best proxy. A page that fails or hits a CAPTCHA is reported against its proxy and retried on the
+    next best one, up to SCHOLAR_MAX_ROTATIONS times. Raises SearchAPIError when none gets through.
+    """
+    limiter = get_rate_limiter("scholar")
+    returned = 0
+    while returned < limit:
+        wanted = min(page_size, limit - returned)
+        tried = []
+        for attempt in range(SCHOLAR_MAX_ROTATIONS + 1):
+            proxy = scholar_proxy_pool.best(exclude=tried) if SCHOLAR_USE_PROXY else None
+            queue_wait = limiter.acquire()
+            started = time.perf_counter()
+            try:
+                with _scholar_fetch_lock:
+                    _route_scholar(proxy)
+                    queued = time.monotonic()
+                    with request_slot():
+                        queue_wait += time.monotonic() - queued
+                        # scholarly downloads the page when the query is created and parses rows lazily
+                        results = get_scholarly().search_pubs(search_string, start_index=returned)
+                        page = [Paper.from_scholarly(paper)
+                                for paper in itertools.islice(results, wanted)]
+                break
+            except Exception as e:
+                seconds = time.perf_counter() - started
+                # scholarly gives up with MaxTriesExceededException once Google keeps answering with CAPTCHAs
+                blocked = type(e).__name__ == "MaxTriesExceededException" or is_captcha(str(e))
+                if proxy is not None:
+                    scholar_proxy_pool.report(proxy, False, seconds, captcha=blocked)
+                    tried.append(proxy)
+                    with _scholar_fetch_lock:
+                        _scholar_generators.pop(proxy, None)
+                if attempt == SCHOLAR_MAX_ROTATIONS:
+                    record_search_call("scholar", seconds, queue_wait, attempt, False)
+                    raise SearchAPIError(f"Google Scholar request failed after {attempt + 1} attempts: {e}")
+                print(f"Google Scholar request via {proxy or 'direct connection'} failed "
+                      f"({'blocked' if blocked else e}); rotating proxy")
+                if proxy is None:
+                    time.sleep(_retry_delay(None, attempt))
+        seconds = time.perf_counter() - started
+        if proxy is not None:
+            scholar_proxy_pool.report(proxy, True, seconds)
+        record_search_call("scholar", seconds, queue_wait, attempt, True)
+        if page:
+            yield page
+            returned += len(page)
+        if len(page) < wanted:
+            return  # a short page is the last one
+
+
+def iter_semantic_scholar_pages(search_string, start_year, limit=10, page_size=S2_PAGE_SIZE):
+    """Yields pages (lists of Paper) from Semantic Scholar until `limit` papers have been returned.
+
+    Up to S2_RELEVANCE_MAX results are paged with `offset` on the relevance-ranked search;
+    larger requests switch to the bulk search endpoint and follow its continuation `token`.
+    Raises SearchAPIError on failure.
+    """
     api_key = os.getenv('SEMANTIC_SCHOLAR_API_KEY')
     if not api_key:
-        return {"error": "Semantic Scholar API key not found"}
-    
-    url = "https://api.semanticscholar.org/graph/v1/paper/search"
+        raise SearchAPIError("Semantic Scholar API key not found")
+
     headers = {
         "x-api-key": api_key,
         "Content-Type": "application/json"
     }
-    
     params = {
         "query": search_string,
         "year": f"{start_year}-{datetime.now().year}",
-        "limit": limit,
         "fields": "title,authors,year,url,venue,abstract,externalIds,openAccessPdf"
     }
-    
+
+    limiter = get_rate_limiter("semanticscholar", api_key)
+    returned = 0
+    if limit <= S2_RELEVANCE_MAX:
+        while returned < limit:
+            params.update(offset=returned, limit=min(page_size, limit - returned))
+            data = _get_json_with_backoff(f"{S2_API_URL}/paper/search", headers, params, "Semantic Scholar", limiter)
+            page = [Paper.from_semantic_scholar(p) for p in data.get('data', [])]
+            if not page:
+                return
+            returned += len(page)
+            yield page
+            if data.get('next') is None:
+                return
+    else:
+        token = None
+        while returned < limit:
+            if token:
+                params["token"] = token
+            data = _get_json_with_backoff(f"{S2_API_URL}/paper/search/bulk", headers, params, "Semantic Scholar",
+                                          limiter)
+            page = [Paper.from_semantic_scholar(p) for p in data.get('data', [])][:limit - returned]
+            if not page:
+                return
+            returned += len(page)
+            yield page
+            token = data.get('token')
+            if not token:
+                return
+
+
+def search_semantic_scholar(search_string, start_year, limit=10, use_cache=True):
+    """Search papers using Semantic Scholar API"""
+    limit = int(limit)
+    return cached_search("semanticscholar", lambda limit: _fetch_semantic_scholar(search_string, start_year, limit),
+                         search_string, limit, use_cache, start_year=int(start_year))
+
+
+def _fetch_semantic_scholar(search_string, start_year, limit):
     try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
         papers = []
-        for paper in data.get('data', []):
-            authors = ", ".join([author.get('name', '') for author in paper.get('authors', [])])
-            papers.append({
-                "title": paper.get('title', 'No title'),
-                "author": authors,
-                "pub_year": paper.get('year', ''),
-                "publication_url": paper.get('url', ''),
-                "journal_name": paper.get('venue', ''),
-                "doi": paper.get('externalIds', {}).get('DOI', ''),
-                "publication_date": str(paper.get('year', '')) if paper.get('year') else '',
-                "paper_type": 'Journal' if 'journal' in paper.get('venue', '').lower() else 'Conference',
-                "abstract": paper.get('abstract', ''),
-                "pdf_url": paper.get('openAccessPdf', {}).get('url', '') if paper.get('openAccessPdf') else ''
-            })
+        for page in prefetch_pages(iter_semantic_scholar_pages(search_string, start_year, limit)):
+            papers.extend(page)
         return papers
     except Exception as e:
         print(f"Error in search_semantic_scholar: {str(e)}")
         return {"error": f"Failed to fetch papers from Semantic Scholar: {str(e)}"}
 
 
-def save_papers_to_csv(papers_details, filename='papers.csv'):
-    fieldnames = ['title', 'author', 'pub_year', 'publication_url', 'journal_name', 'doi', 'publication_date', 'paper_type']
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for paper in papers_details:
-            writer.writerow(paper)
+def save_papers_to_csv(papers_details, filename='papers.csv', screening=None):
+    """Writes papers (with their screening records, if given) to a CSV file, one row at a time."""
+    write_export("csv", paper_rows(papers_details, screening), filename)
 
 
-def search_elsevier(search_string, start_year, end_year, limit):
-    
-    url = "https://api.elsevier.com/content/search/scopus"
+def iter_elsevier_pages(search_string, start_year, end_year, limit, page_size=SCOPUS_PAGE_SIZE):
+    """Yields pages (lists of Paper) from Scopus using cursor pagination (cursor=*).
+
+    Stops after `limit` entries or when Scopus has no more results. Raises SearchAPIError on failure.
+    """
     headers = {
         "X-ELS-APIKey": api_key,
         "Accept": "application/json"
@@ -128,32 +391,158 @@ def search_elsevier(search_string, start_year, end_year, limit):
     query = f"TITLE-ABS-KEY({search_string}) AND PUBYEAR = {start_year}"
     params = {
         "query": query,
-        "count": limit,
+        "cursor": "*",
     }
-    
 
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        response_data = response.json()
-        papers = response_data.get('search-results', {}).get('entry', [])
+    returned = 0
+    while returned < limit:
+        params["count"] = min(page_size, limit - returned)
+        response_data = _get_json_with_backoff(SCOPUS_API_URL, headers, params, "Elsevier",
+                                               get_rate_limiter("scopus", api_key))
+        results = response_data.get('search-results', {})
+        # An empty result set comes back as a single entry carrying an "error" field
+        page = [Paper.from_scopus(paper) for paper in results.get('entry', []) if "error" not in paper]
+        if not page:
+            return
+        returned += len(page)
+        yield page
+        next_cursor = (results.get('cursor') or {}).get('@next')
+        if not next_cursor or next_cursor == params["cursor"] or returned >= int(results.get('opensearch:totalResults', 0) or 0):
+            return
+        params["cursor"] = next_cursor
+
+
+def search_elsevier(search_string, start_year, end_year, limit, use_cache=True):
+    return cached_search("scopus", lambda limit: _fetch_elsevier(search_string, start_year, end_year, limit),
+                         search_string, int(limit), use_cache, start_year=int(start_year), end_year=int(end_year))
+
+
+def _fetch_elsevier(search_string, start_year, end_year, limit):
+    try:
         parsed_papers = []
-        for paper in papers:
-            parsed_paper = {
-                "affiliation-country": next((affil.get("affiliation-country", "Not Available") for affil in paper.get("affiliation", [])), "Not Available"),
-                "affilname": next((affil.get("affilname", "Not Available") for affil in paper.get("affiliation", [])), "Not Available"),
-                "creator": paper.get("dc:creator", "Not Available"),
-                "identifier": paper.get("dc:identifier", "Not Available"),
-                "title": paper.get("dc:title", "Not Available"),
-                "link": next((link["@href"] for link in paper.get("link", []) if link["@ref"] == "scopus"), "Not Available"),
-                "year": paper.get("prism:coverDate", "Not Available").split("-")[0],
-                "openaccess": paper.get("openaccess", "0") == "1",
-                "publicationName": paper.get("prism:publicationName", "Not Available"),
-                "aggregationType": paper.get("prism:aggregationType", "Not Available"),
-                "volume": paper.get("prism:volume", "Not Available"),
-                "doi": paper.get("prism:doi", "Not Available")
-            }
-            parsed_papers.append(parsed_paper)
+        for page in prefetch_pages(iter_elsevier_pages(search_string, start_year, end_year, int(limit))):
+            parsed_papers.extend(page)
         return parsed_papers
-    else:
-        print(f"Failed to fetch papers: {response.status_code} {response.text}")
-        return {"error": "Failed to fetch papers from Elsevier", "status_code": response.status_code, "message": response.text}
\ No newline at end of file
+    except SearchAPIError as e:
+        print(f"Failed to fetch papers: {e.status_code} {e.message}")
+        return {"error": "Failed to fetch papers from Elsevier", "status_code": e.status_code, "message": e.message}
+
+
+# --- Federated search across all sources ---
+# Sources queried by search_federated when the caller doesn't pick them.
+FEDERATED_SOURCES = [name.strip() for name in os.getenv("FEDERATED_SOURCES", "scopus,semanticscholar,scholar").split(",") if name.strip()]
+# Minimum difflib ratio between normalised titles for two records to count as the same paper.
+TITLE_MATCH_THRESHOLD = float(os.getenv("TITLE_MATCH_THRESHOLD", "0.93"))
+
+
+def _search_scholar(search_string, start_year, limit):
+    papers = fetch_papers(search_string, min_results=limit)
+    if isinstance(papers, dict):
+        return papers
+    # scholarly has no year filter, so apply start_year afterwards
+    return [p for p in papers if not p.year.isdigit() or int(p.year) >= int(start_year)]
+
+
+SEARCH_SOURCES = {
+    "scopus": lambda search_string, start_year, limit: search_elsevier(search_string, start_year, start_year, limit),
+    "semanticscholar": search_semantic_scholar,
+    "scholar": _search_scholar,
+}
+
+
+def normalize_doi(doi):
+    doi = str(doi or '').strip().lower()
+    doi = re.sub(r'^(https?://(dx\.)?doi\.org/|doi:)', '', doi)
+    return doi if doi.startswith('10.') else ''
+
+
+def normalize_title(title):
+    """Lower-cased ASCII title with punctuation removed and whitespace collapsed, for matching."""
+    title = unicodedata.normalize('NFKD', str(title or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', title.lower()))
+
+
+def _merge_records(kept, duplicate):
+    """Fills fields missing from `kept` with values from `duplicate` and unions their sources."""
+    for slot in Paper.__slots__:
+        if slot == 'sources':
+            kept.sources.extend(source for source in duplicate.sources if source not in kept.sources)
+        elif not getattr(kept, slot) and getattr(duplicate, slot):
+            setattr(kept, slot, getattr(duplicate, slot))
+
+
+def deduplicate_papers(papers, threshold=TITLE_MATCH_THRESHOLD):
+    """Merges records of the same paper, matched by DOI or by (fuzzy) normalised title.
+
+    Exact DOI and exact normalised-title matches are dict lookups. Fuzzy candidates are found
+    through an index on each title's three longest words, so only titles sharing one of those
+    words are compared with difflib.
+    """
+    unique = []
+    by_doi = {}
+    by_title = {}
+    by_token = {}
+    for paper in papers:
+        doi = normalize_doi(paper.doi)
+        title = normalize_title(paper.title)
+        match = by_doi.get(doi) if doi else None
+        if match is None and title:
+            match = by_title.get(title)
+        tokens = sorted(set(title.split()), key=len, reverse=True)[:3]
+        if match is None and title:
+            candidates = {i for token in tokens for i in by_token.get(token, ())}
+            for i in sorted(candidates):
+                other = normalize_title(unique[i].title)
+                other_doi = normalize_doi(unique[i].doi)
+                if doi and other_doi and doi != other_doi:
+                    continue  # Different DOIs are different papers, however similar the titles
+                if difflib.SequenceMatcher(None, title, other).ratio() >= threshold:
+                    match = i
+                    break
+        if match is None:
+            match = len(unique)
+            unique.append(paper)
+        else:
+            _merge_records(unique[match], paper)
+        if doi:
+            by_doi.setdefault(doi, match)
+        if title:
+            by_title.setdefault(title, match)
+            for token in tokens:
+                by_token.setdefault(token, []).append(match)
+    return unique
+
+
+def search_federated(search_string, start_year, limit=10, sources=None):
+    """Queries several sources concurrently and returns deduplicated Papers.
+
+    Returns {"papers": [...], "sources": {name: {"count", "latency", "error"?}}}; each paper lists
+    the sources that returned it under "sources".
+    """
+    sources = [s for s in (sources or FEDERATED_SOURCES) if s in SEARCH_SOURCES]
+    if not sources:
+        return {"error": "No valid search sources requested"}
+
+    def _query(source):
+        started = time.perf_counter()
+        try:
+            result = SEARCH_SOURCES[source](search_string, start_year, limit)
+        except Exception as e:
+            result = {"error": str(e)}
+        return source, result, round(time.perf_counter() - started, 3)
+
+    records = []
+    report = {}
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="search") as executor:
+        futures = [submit_in_context(executor, _query, source) for source in sources]
+        for source, result, latency in (future.result() for future in futures):
+            if isinstance(result, dict) and "error" in result:
+                print(f"Federated search: {source} failed: {result['error']}")
+                report[source] = {"count": 0, "latency": latency, "error": result["error"]}
+                continue
+            report[source] = {"count": len(result), "latency": latency}
+            records.extend(result)
+
+    if len(report) == sum(1 for r in report.values() if "error" in r):
+        return {"error": "All search sources failed", "sources": report}
+    return {"papers": deduplicate_papers(records), "sources": report}
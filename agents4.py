@@ -1,54 +1,32 @@
 # agent4.py
-import requests
 import os
 import re
+import hashlib
 import json # Added for consistency if needed, though not strictly used in original
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Assuming helper functions might be moved to a shared utility or API keys are loaded here too
-# from agents import _call_openai_api, _call_deepseek_api, get_llm_response_content # Ideal case
-
-OPENAI_API_KEY = os.getenv("API-KEY")
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-OPENAI_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
-DEEPSEEK_COMPLETIONS_URL = "https://api.deepseek.com/v1/chat/completions" # Placeholder
-
-# --- Start Duplicated/Simplified Helper Functions (Ideally import from a shared util or agents.py) ---
-def _call_llm_api_for_agents4(messages, model_name, temperature=0.7, max_tokens=None):
-    # This is a simplified version. For production, centralize this logic (e.g., in agents.py or a utils.py)
-    if model_name.startswith("gpt"):
-        if not OPENAI_API_KEY: return {"error": "OpenAI API key not found."}
-        api_key = OPENAI_API_KEY
-        url = OPENAI_COMPLETIONS_URL
-    elif model_name.startswith("deepseek"):
-        if not DEEPSEEK_API_KEY: return {"error": "DeepSeek API key not found."}
-        api_key = DEEPSEEK_API_KEY
-        url = DEEPSEEK_COMPLETIONS_URL # Placeholder
-    else:
-        return {"error": f"Unsupported model prefix for API call: {model_name}"}
+from llm_client import call_llm, get_llm_content, stream_llm
+from fulltext import fulltext_store
+from llm_cache import relevance_cache, relevance_key
+from paper import papers_from_dicts
+from rate_limiter import submit_in_context
+from retrieval import Bm25Index, TfidfScorer, paper_text
+from token_counter import count_tokens, truncate_to_tokens
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    payload = {"model": model_name, "messages": messages, "temperature": temperature}
-    if max_tokens:
-        payload["max_tokens"] = max_tokens
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=180) # Increased timeout for potentially longer tasks
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        return {"error": f"API request failed for {model_name}: {str(e)}"}
-
-def _get_llm_content_for_agents4(result, model_name):
-    if "error" in result: return result
-    try:
-        # This part needs to be robust for different model response structures
-        return result['choices'][0]['message']['content']
-    except (KeyError, IndexError, TypeError):
-        return {"error": f"Failed to parse content from {model_name} response."}
-# --- End Duplicated/Simplified Helper Functions ---
 
 def check_paper_relevance_llm(title, search_string, model_name="gpt-3.5-turbo"):
     # This function determines relevance. The original name included "keywords" but didn't explicitly extract them.
+    # Verdicts are cached per (title, search_string, model) so they are reused across sessions.
+    # Returns None when the LLM request failed or its reply was neither verdict, so callers can tell
+    # "unscreened" from "not relevant".
+    cache_key = relevance_key(title, search_string, model_name)
+    cached = relevance_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     # Adjusting prompt for clarity.
     prompt = (f"Determine if the paper titled '{title}' is relevant to the research topic described by "
               f"'{search_string}'. Respond with 'Relevant' or 'Not Relevant' only.")
@@ -57,60 +35,385 @@ def check_paper_relevance_llm(title, search_string, model_name="gpt-3.5-turbo"):
         {"role": "user", "content": prompt}
     ]
 
-    result_json = _call_llm_api_for_agents4(messages, model_name, temperature=0.2) # Lower temp for classification
+    result_json = call_llm(messages, model_name, temperature=0.2) # Lower temp for classification
     
-    response_text = _get_llm_content_for_agents4(result_json, model_name)
+    response_text = get_llm_content(result_json, model_name)
     if isinstance(response_text, dict) and "error" in response_text:
         print(f"Error checking relevance for '{title}': {response_text['error']}")
-        return False # Default to not relevant on error
+        return None
 
     print(f"Relevance check for '{title}' with {model_name}: {response_text}")
     if "not relevant" in response_text.lower():
+        relevance_cache.set(cache_key, False)
         return False
     elif "relevant" in response_text.lower():
+        relevance_cache.set(cache_key, True)
         return True
     else:
-        # If the model doesn't give a clear "Relevant" / "Not Relevant"
-        print(f"Ambiguous relevance response for '{title}': {response_text}. Defaulting to not relevant.")
-        return False
+        # No clear "Relevant" / "Not Relevant": leave the paper unscreened (and uncached) so it can be retried
+        print(f"Ambiguous relevance response for '{title}': {response_text}. Leaving it unscreened.")
+        return None
+
+
+# Abstracts are trimmed so a full batch stays well inside the context window.
+BATCH_ABSTRACT_MAX_CHARS = 600
+_BATCH_VERDICT_RE = re.compile(r"^\W*(\d+)\W+(not\s+relevant|relevant)\b", re.IGNORECASE)
+
+def parse_batch_relevance(response_text, count):
+    """Parses 'N: Relevant' / 'N: Not Relevant' lines into a list of True/False/None (unparsed) by index."""
+    verdicts = [None] * count
+    for line in response_text.splitlines():
+        match = _BATCH_VERDICT_RE.match(line.strip())
+        if not match:
+            continue
+        position = int(match.group(1)) - 1
+        if 0 <= position < count and verdicts[position] is None:
+            verdicts[position] = not match.group(2).lower().startswith("not")
+    return verdicts
+
+
+def check_papers_relevance_batch_llm(papers, search_string, model_name="gpt-3.5-turbo"):
+    """Classifies several papers in one request.
+
+    Returns True/False per paper, or None where no verdict parsed; returns None instead of a list
+    when the request itself failed.
+    """
+    items = []
+    for number, paper in enumerate(papers, start=1):
+        entry = f"{number}. Title: {paper.title}"
+        abstract = paper.abstract.strip()
+        if abstract:
+            if len(abstract) > BATCH_ABSTRACT_MAX_CHARS:
+                abstract = abstract[:BATCH_ABSTRACT_MAX_CHARS].rsplit(' ', 1)[0] + "..."
+            entry += f"\n   Abstract: {abstract}"
+        items.append(entry)
+    prompt = (f"Determine for each of the following {len(papers)} papers whether it is relevant to the research topic "
+              f"described by '{search_string}'.\n\n" + "\n".join(items) +
+              f"\n\nRespond with exactly one line per paper, in order, formatted as '<number>: Relevant' or "
+              f"'<number>: Not Relevant', and nothing else.")
+    messages = [
+        {"role": "system", "content": "You are an assistant that determines paper relevance."},
+        {"role": "user", "content": prompt}
+    ]
+
+    result_json = call_llm(messages, model_name, temperature=0.2, max_tokens=8 * len(papers) + 16)
+
+    response_text = get_llm_content(result_json, model_name)
+    if isinstance(response_text, dict) and "error" in response_text:
+        print(f"Error checking relevance for batch of {len(papers)} papers: {response_text['error']}")
+        return None
+
+    verdicts = parse_batch_relevance(response_text, len(papers))
+    for paper, relevant in zip(papers, verdicts):
+        if relevant is not None:
+            relevance_cache.set(relevance_key(paper.title, search_string, model_name), relevant)
+    unparsed = verdicts.count(None)
+    print(f"Batch relevance check of {len(papers)} papers with {model_name}: {unparsed} verdict(s) unparsed")
+    return verdicts
+
+
+# --- Concurrent screening ---
+# Max papers screened in flight at once. Request rates are capped per provider key by rate_limiter.
+SCREENING_MAX_WORKERS = int(os.getenv("SCREENING_MAX_WORKERS", "8"))
+# Papers per relevance request; 1 keeps the one-title-per-call behaviour.
+SCREENING_BATCH_SIZE = int(os.getenv("SCREENING_BATCH_SIZE", "1"))
+# Ceilings on per-request overrides of the two settings above.
+SCREENING_MAX_WORKERS_LIMIT = int(os.getenv("SCREENING_MAX_WORKERS_LIMIT", "32"))
+SCREENING_BATCH_SIZE_LIMIT = int(os.getenv("SCREENING_BATCH_SIZE_LIMIT", "50"))
+
+
+def screen_papers_llm(search_string, papers, model_name="gpt-3.5-turbo", max_workers=None, batch_size=None,
+                      progress=None, cancel_event=None):
+    """Checks relevance of every paper concurrently.
+
+    With batch_size > 1, papers are classified N at a time by check_papers_relevance_batch_llm and
+    only the items whose verdict failed to parse are re-checked one by one.
+
+    Returns one record per input paper, in input order:
+    {"index", "title", "relevant", "latency", "mode"} where latency is in seconds
+    (None for papers skipped because they have no title) and mode is "single", "batch" or "cached"
+    (batch records also carry the "batch" number they were sent in). "relevant" is None for papers
+    whose LLM request failed after retries and fallbacks, or whose reply was ambiguous: they are
+    unscreened, not excluded.
+
+    progress(done, total) is called as papers finish. Setting cancel_event stops work that has not
+    started yet; those papers come back unscreened ("relevant": None) with mode "cancelled".
+    """
+    papers = papers_from_dicts(papers)
+    max_workers = max(1, min(int(max_workers or SCREENING_MAX_WORKERS), SCREENING_MAX_WORKERS_LIMIT))
+    batch_size = max(1, min(int(batch_size or SCREENING_BATCH_SIZE), SCREENING_BATCH_SIZE_LIMIT))
 
+    def _screen_single(index, title):
+        started = time.perf_counter()
+        relevant = check_paper_relevance_llm(title, search_string, model_name)
+        return {"index": index, "title": title, "relevant": relevant,
+                "latency": round(time.perf_counter() - started, 3), "mode": "single"}
 
-def filter_papers_llm(search_string, papers, model_name="gpt-3.5-turbo"):
-    filtered_papers = []
-    for paper in papers:
-        title = paper.get('title')
+    def _screen_batch(batch_number, batch):
+        if cancel_event is not None and cancel_event.is_set():
+            return []
+        if len(batch) == 1:
+            return [_screen_single(batch[0][0], batch[0][1].title)]
+        started = time.perf_counter()
+        verdicts = check_papers_relevance_batch_llm([paper for _, paper in batch], search_string, model_name)
+        latency = round(time.perf_counter() - started, 3)
+        if verdicts is None:
+            return [{"index": index, "title": paper.title, "relevant": None, "latency": latency,
+                     "mode": "batch", "batch": batch_number} for index, paper in batch]
+        records = []
+        for (index, paper), relevant in zip(batch, verdicts):
+            if relevant is None:  # Unparsed verdict: ask about this paper on its own
+                records.append(_screen_single(index, paper.title))
+            else:
+                records.append({"index": index, "title": paper.title, "relevant": relevant,
+                                "latency": latency, "mode": "batch", "batch": batch_number})
+        return records
+
+    results = [None] * len(papers)
+    pending = []
+    for index, paper in enumerate(papers):
+        title = paper.title
         if not title:
             print(f"Paper skipped due to missing title: {paper}")
+            results[index] = {"index": index, "title": None, "relevant": False, "latency": None, "mode": None}
+            continue
+        cached = relevance_cache.get(relevance_key(title, search_string, model_name))
+        if cached is not None:
+            results[index] = {"index": index, "title": title, "relevant": cached, "latency": 0.0, "mode": "cached"}
             continue
-        if check_paper_relevance_llm(title, search_string, model_name):
-            filtered_papers.append(paper)
-    return filtered_papers
+        pending.append((index, paper))
+
+    done = len(papers) - len(pending)
+    if progress:
+        progress(done, len(papers))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="screening") as executor:
+        # Workers keep the caller's review context, so the rate limiter queues them fairly against other reviews
+        futures = [submit_in_context(executor, _screen_batch, number, pending[start:start + batch_size])
+                   for number, start in enumerate(range(0, len(pending), batch_size))]
+        for future in as_completed(futures):
+            records = future.result()
+            for record in records:
+                results[record["index"]] = record
+            done += len(records)
+            if progress:
+                progress(done, len(papers))
+            if cancel_event is not None and cancel_event.is_set():
+                for pending_future in futures:
+                    pending_future.cancel()
+
+    for index, paper in pending:
+        if results[index] is None:
+            results[index] = {"index": index, "title": paper.title, "relevant": None, "latency": None,
+                              "mode": "cancelled"}
+    return results
+
+
+def summarize_screening(results, wall_time):
+    """Aggregates per-paper latencies from screen_papers_llm into a small report."""
+    latencies = sorted(r["latency"] for r in results if r["latency"] is not None)
+    return {
+        "screened": len(latencies),
+        "cached": sum(1 for r in results if r["mode"] == "cached"),
+        "prescreened": sum(1 for r in results if r["mode"] == "prescreen"),
+        "relevant": sum(1 for r in results if r["relevant"]),
+        "unscreened": sum(1 for r in results if r["relevant"] is None),
+        "wall_time": round(wall_time, 3),
+        "mean_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "max_latency": latencies[-1] if latencies else None,
+        "requests": len({r["batch"] for r in results if r["mode"] == "batch"})
+                    + sum(1 for r in results if r["mode"] == "single"),
+        "per_paper": results,
+    }
+
+
+# --- Local pre-screening ---
+# TF-IDF similarity (0-1) below which papers are excluded without an LLM call, and above which
+# they are included without one (empty = always ask the LLM above the exclusion cutoff).
+PRESCREEN_EXCLUDE_BELOW = float(os.getenv("PRESCREEN_EXCLUDE_BELOW", "0.05"))
+PRESCREEN_INCLUDE_ABOVE = float(os.getenv("PRESCREEN_INCLUDE_ABOVE")) if os.getenv("PRESCREEN_INCLUDE_ABOVE") else None
 
 
-def generate_response_llm(question, papers_info, model_name="gpt-4-turbo-preview", max_tokens=512): # Increased default max_tokens
+def prescreen_papers(papers, search_string, research_questions=None, exclude_below=None, include_above=None):
+    """Scores each paper's title and abstract against the search string and research questions.
+
+    Returns one {"index", "title", "score", "decision"} per paper, where decision is "exclude"
+    (score < exclude_below), "include" (score >= include_above) or "llm" for the ambiguous band.
+    """
+    papers = papers_from_dicts(papers)
+    exclude_below = PRESCREEN_EXCLUDE_BELOW if exclude_below is None else float(exclude_below)
+    include_above = PRESCREEN_INCLUDE_ABOVE if include_above is None else float(include_above)
+    queries = [search_string] + [q for q in (research_questions or []) if q]
+    scores = TfidfScorer([paper_text(paper) for paper in papers]).score(queries)
+
+    decisions = []
+    for index, (paper, score) in enumerate(zip(papers, scores)):
+        score = round(float(score), 4)
+        if score < exclude_below:
+            decision = "exclude"
+        elif include_above is not None and score >= include_above:
+            decision = "include"
+        else:
+            decision = "llm"
+        decisions.append({"index": index, "title": paper.title, "score": score, "decision": decision})
+    return decisions
+
+
+def filter_papers_llm(search_string, papers, model_name="gpt-3.5-turbo", max_workers=None, stats=None,
+                      batch_size=None, progress=None, cancel_event=None,
+                      prescreen=False, research_questions=None, exclude_below=None, include_above=None):
+    """Returns the relevant Papers in input order. Pass a dict as `stats` to receive the screening report.
+
+    Papers whose relevance check failed are not returned; stats["unscreened"] counts them and their
+    per-paper records have "relevant": None, so they can be screened again.
+
+    With prescreen=True, prescreen_papers runs first and only its ambiguous band is sent to the LLM;
+    every per-paper record then carries its similarity "score".
+    """
+    papers = papers_from_dicts(papers)
+    started = time.perf_counter()
+    if not prescreen:
+        results = screen_papers_llm(search_string, papers, model_name, max_workers, batch_size,
+                                    progress=progress, cancel_event=cancel_event)
+    else:
+        decisions = prescreen_papers(papers, search_string, research_questions, exclude_below, include_above)
+        ambiguous = [d["index"] for d in decisions if d["decision"] == "llm"]
+        llm_results = screen_papers_llm(search_string, [papers[i] for i in ambiguous], model_name, max_workers,
+                                        batch_size, progress=progress, cancel_event=cancel_event)
+        results = [{"index": d["index"], "title": d["title"], "relevant": d["decision"] == "include",
+                    "latency": None, "mode": "prescreen", "score": d["score"]} for d in decisions]
+        for index, record in zip(ambiguous, llm_results):
+            results[index] = dict(record, index=index, score=decisions[index]["score"])
+    if stats is not None:
+        stats.update(summarize_screening(results, time.perf_counter() - started))
+    return [paper for paper, record in zip(papers, results) if record["relevant"]]
+
+
+# --- Answer context selection ---
+# Token budget for the "Papers Information" block of an answer prompt, and how many of the
+# best-matching papers (by BM25 against the question) are considered for it.
+ANSWER_CONTEXT_TOKENS = int(os.getenv("ANSWER_CONTEXT_TOKENS", "3000"))
+ANSWER_TOP_K = int(os.getenv("ANSWER_TOP_K", "40"))
+ANSWER_ABSTRACT_MAX_TOKENS = 200
+# Paper sets indexed recently; every question of a review reuses the same index.
+PAPER_INDEX_CACHE_SIZE = 16
+
+_paper_indexes = OrderedDict()
+_paper_indexes_lock = threading.Lock()
+
+
+def get_paper_index(papers):
+    """Returns a BM25 index over the papers' titles and abstracts, built once per distinct paper set."""
+    texts = [paper_text(paper) for paper in papers]
+    fingerprint = hashlib.sha256("\x1e".join(texts).encode("utf-8")).hexdigest()
+    with _paper_indexes_lock:
+        index = _paper_indexes.get(fingerprint)
+        if index is not None:
+            _paper_indexes.move_to_end(fingerprint)
+            return index
+    index = Bm25Index(texts)
+    with _paper_indexes_lock:
+        _paper_indexes[fingerprint] = index
+        while len(_paper_indexes) > PAPER_INDEX_CACHE_SIZE:
+            _paper_indexes.popitem(last=False)
+    return index
+
+
+def _paper_context_line(paper, model_name):
+    line = (f"- Title: '{paper.title or 'N/A'}', Author(s): {paper.authors or 'N/A'}, "
+            f"Year: {paper.year or 'N/A'}.")
+    if paper.abstract:
+        abstract = truncate_to_tokens(paper.abstract, ANSWER_ABSTRACT_MAX_TOKENS, model_name)
+        line += f" Abstract: {abstract}"
+    return line
+
+
+def select_context_papers(question, papers, model_name=None, token_budget=None, top_k=None):
+    """Picks the papers most relevant to `question` that fit into `token_budget` prompt tokens.
+
+    Papers are ranked by BM25 over title and abstract (input order breaks ties, so unmatched
+    papers keep their original order) and added best-first until the budget is spent.
+    Returns the context lines in rank order.
+    """
+    token_budget = ANSWER_CONTEXT_TOKENS if token_budget is None else token_budget
+    top_k = top_k or ANSWER_TOP_K
+    if not papers:
+        return []
+
+    lines, used = [], 0
+    for doc_id in get_paper_index(papers).rank(question, top_k):
+        line = _paper_context_line(papers[doc_id], model_name)
+        cost = count_tokens(line, model_name) + 1  # + newline
+        if used + cost > token_budget:
+            if lines:
+                break
+            # Always give the model at least the best match, shortened to fit
+            line = truncate_to_tokens(line, token_budget, model_name)
+            cost = token_budget
+        lines.append(line)
+        used += cost
+    return lines
+
+
+# Prompt tokens of full-text excerpts added to answers, from papers whose PDFs fulltext.py has
+# ingested (0 = titles and abstracts only), and how many best-matching papers' chunks are searched.
+ANSWER_FULLTEXT_TOKENS = int(os.getenv("ANSWER_FULLTEXT_TOKENS", "1500"))
+ANSWER_FULLTEXT_PAPERS = 10
+
+
+def select_fulltext_passages(question, papers, model_name=None, token_budget=None, top_papers=None):
+    """Full-text chunks that best match `question`, as context lines within `token_budget` tokens.
+
+    Only the chunks of the top BM25 papers are considered, and only those already in the
+    full-text store; nothing is downloaded here. Returns [] when none of them have been ingested.
+    """
+    token_budget = ANSWER_FULLTEXT_TOKENS if token_budget is None else token_budget
+    if not papers or token_budget <= 0:
+        return []
+    candidates = [papers[i] for i in get_paper_index(papers).rank(question, top_papers or ANSWER_FULLTEXT_PAPERS)]
+    passages = [(paper, chunk) for paper in candidates for chunk in fulltext_store.get_chunks(paper)]
+    if not passages:
+        return []
+
+    index = Bm25Index([chunk for _, chunk in passages])
+    scores = index.scores(question)
+    lines, used = [], 0
+    for i in index.rank(question):
+        if scores[i] <= 0:
+            break
+        paper, chunk = passages[i]
+        line = f"- From '{paper.title or 'N/A'}': {chunk}"
+        cost = count_tokens(line, model_name) + 1
+        if used + cost > token_budget:
+            if lines:
+                break
+            line = truncate_to_tokens(line, token_budget, model_name)
+            cost = token_budget
+        lines.append(line)
+        used += cost
+    return lines
+
+
+def _build_response_messages(question, papers_info, model_name=None, context_budget=None, top_k=None):
     messages = [{
         "role": "system",
         "content": "You are a knowledgeable assistant who can answer research questions based on provided papers information."
     }]
 
-    # Ensure papers_info is a list of dictionaries
+    # Ensure papers_info is a list of Papers
     if not isinstance(papers_info, list):
         papers_info = [] # Or handle error appropriately
 
-    papers_context_parts = []
-    for paper in papers_info:
-        if isinstance(paper, dict):
-            title = paper.get('title', 'N/A')
-            creator = paper.get('creator', 'N/A') # Author(s)
-            year = paper.get('year', 'N/A')
-            # Consider adding abstract if available and relevant for better context
-            papers_context_parts.append(f"- Title: '{title}', Author(s): {creator}, Year: {year}.")
-        else:
-            print(f"Skipping invalid paper entry: {paper}")
+    papers = papers_from_dicts(papers_info)
+    papers_context_parts = select_context_papers(question, papers, model_name, context_budget, top_k)
+    if len(papers_context_parts) < len(papers):
+        print(f"[ANSWER] Using {len(papers_context_parts)} of {len(papers)} papers as context for: {question[:60]}")
 
     papers_context = "\n".join(papers_context_parts)
     if not papers_context:
         papers_context = "No paper information provided."
+    excerpts = select_fulltext_passages(question, papers, model_name)
+    if excerpts:
+        papers_context += "\n\nFull-text excerpts:\n" + "\n".join(excerpts)
 
 
     messages.append({
@@ -124,12 +427,31 @@ def generate_response_llm(question, papers_info, model_name="gpt-4-turbo-preview
                     "If possible, cite relevant paper titles or authors for cross-verification. "
                     "Provide a comprehensive answer.")
     })
+    return messages
+
+
+def generate_response_llm(question, papers_info, model_name="gpt-4-turbo-preview", max_tokens=512, # Increased default max_tokens
+                          context_budget=None, top_k=None):
+    messages = _build_response_messages(question, papers_info, model_name, context_budget, top_k)
+    result_json = call_llm(messages, model_name, temperature=0.7, max_tokens=max_tokens,
+                           timeout=180) # Longer timeout for potentially longer answers
     
-    result_json = _call_llm_api_for_agents4(messages, model_name, temperature=0.7, max_tokens=max_tokens)
-    
-    latest_response = _get_llm_content_for_agents4(result_json, model_name)
+    latest_response = get_llm_content(result_json, model_name)
     if isinstance(latest_response, dict) and "error" in latest_response:
         return f"An error occurred while generating the response with {model_name}: {latest_response['error']}"
     
     return latest_response
 
+
+def generate_response_llm_stream(question, papers_info, model_name="gpt-4-turbo-preview", max_tokens=512,
+                                 context_budget=None, top_k=None):
+    """Streaming variant of generate_response_llm: yields answer text deltas.
+
+    Errors are yielded as the same "An error occurred ..." string generate_response_llm returns.
+    """
+    messages = _build_response_messages(question, papers_info, model_name, context_budget, top_k)
+    for delta in stream_llm(messages, model_name, temperature=0.7, max_tokens=max_tokens, timeout=180):
+        if isinstance(delta, dict) and "error" in delta:
+            yield f"An error occurred while generating the response with {model_name}: {delta['error']}"
+            return
+        yield delta
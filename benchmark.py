@@ -0,0 +1,207 @@
+# benchmark.py
+# Offline throughput benchmark. Runs screening, answering, search and the Flask routes against
+# mock_services at synthetic corpus sizes, without credentials or network access.
+#
+#   python benchmark.py --sizes 10,100,1000 --llm-latency 0.02 --output bench.json
+#   python benchmark.py --baseline bench.json --tolerance 0.2    # exit 1 on a throughput regression
+#
+# For each scenario and size it reports items per second, p50/p99 request latency and peak
+# Python memory (tracemalloc). The response caches are disabled so every run does the full work.
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+
+from mock_services import MockServices, synthetic_paper
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("screening", "answers", "search", "routes")
+SEARCH_STRING = "large language models AND code review"
+QUESTIONS = ["How are large language models used for code review?",
+             "Which benchmarks evaluate automated code review?",
+             "What limitations of LLM-based code review are reported?"]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values`, or None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _papers(size):
+    # Imported late: app modules read their endpoints from the environment at import time
+    from paper import Paper
+    return [Paper.from_semantic_scholar(synthetic_paper(i)) for i in range(size)]
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_screening(size, options):
+    from agents4 import filter_papers_llm
+
+    stats = {}
+    filter_papers_llm(SEARCH_STRING, _papers(size), options.model, stats=stats, batch_size=options.batch_size,
+                      max_workers=options.workers)
+    latencies = [record["latency"] for record in stats["per_paper"] if record["latency"] is not None]
+    return size, latencies, stats["unscreened"]
+
+
+def bench_answers(size, options):
+    from agents4 import generate_response_llm
+
+    papers = _papers(size)
+    latencies, errors = [], 0
+    for question in QUESTIONS:
+        answer, seconds = _timed(generate_response_llm, question, papers, options.model)
+        latencies.append(seconds)
+        errors += answer.startswith("An error occurred")
+    return len(QUESTIONS), latencies, errors
+
+
+def bench_search(size, options):
+    from agents3 import search_elsevier, search_semantic_scholar
+
+    latencies, items, errors = [], 0, 0
+    for search in (lambda: search_semantic_scholar(SEARCH_STRING, 2018, size),
+                   lambda: search_elsevier(SEARCH_STRING, 2018, 2018, size)):
+        papers, seconds = _timed(search)
+        latencies.append(seconds)
+        if isinstance(papers, dict):
+            errors += 1
+        else:
+            items += len(papers)
+    return items, latencies, errors
+
+
+def bench_routes(size, options):
+    from server import app
+
+    client = app.test_client()
+    papers = [paper.to_dict() for paper in _papers(size)]
+    requests = [
+        ("/api/filter_papers", {"search_string": SEARCH_STRING, "papers": papers, "model_name": options.model,
+                                "batch_size": options.batch_size}),
+        ("/api/answer_question", {"questions": QUESTIONS, "papers_info": papers, "model_name": options.model}),
+        ("/api/generate-summary-conclusion", {"papers_info": papers, "model_name": options.model}),
+    ]
+    latencies, errors = [], 0
+    for route, body in requests:
+        response, seconds = _timed(client.post, route, json=body)
+        latencies.append(seconds)
+        errors += response.status_code != 200
+    return size, latencies, errors
+
+
+def run_scenario(name, size, options, services):
+    before = dict(services.requests)
+    tracemalloc.start()
+    started = time.perf_counter()
+    # The agents print a line per paper; keep the report readable unless asked otherwise
+    with open(os.devnull, "w") as devnull, redirect_stdout(sys.stdout if options.verbose else devnull):
+        items, latencies, errors = globals()[f"bench_{name}"](size, options)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    requests = {key: count - before.get(key, 0) for key, count in services.requests.items()
+                if count != before.get(key, 0)}
+    return {"scenario": name, "size": size, "items": items, "seconds": round(elapsed, 3),
+            "throughput": round(items / elapsed, 2) if elapsed else None,
+            "p50": round(percentile(latencies, 0.5), 4) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 4) if latencies else None,
+            "peak_mb": round(peak / 2 ** 20, 2), "rss_mb": _max_rss_mb(), "errors": errors, "requests": requests}
+
+
+def _max_rss_mb():
+    """The process's peak resident set size so far (Linux reports KiB, macOS bytes)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def compare(results, baseline, tolerance):
+    """Scenario/size pairs whose throughput fell more than `tolerance` below the baseline's."""
+    previous = {(r["scenario"], r["size"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result["scenario"], result["size"]))
+        if old and old.get("throughput") and result["throughput"] is not None \
+                and result["throughput"] < old["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}@{result['size']}: {result['throughput']}/s "
+                               f"(baseline {old['throughput']}/s)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the review pipeline against local mock APIs.")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated corpus sizes (up to 10000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--batch-size", type=int, default=None, help="papers per relevance request")
+    parser.add_argument("--workers", type=int, default=None, help="screening workers")
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional throughput drop")
+    parser.add_argument("--verbose", action="store_true", help="keep the agents' log output")
+    options = parser.parse_args(argv)
+
+    sizes = [int(size) for size in options.sizes.split(",") if size.strip()]
+    scenarios = [name.strip() for name in options.scenarios.split(",") if name.strip() in SCENARIOS]
+    services = MockServices(llm_latency=options.llm_latency, search_latency=options.search_latency,
+                            error_rate=options.error_rate, rate_limit_rate=options.rate_limit_rate,
+                            corpus_size=max(sizes)).start()
+    scratch = tempfile.mkdtemp(prefix="slr-bench-")
+    os.environ.update(services.env())
+    os.environ.update(LLM_CACHE_ENABLED="0", LLM_BACKOFF_MAX="0.1",
+                      REVIEW_STORE_PATH=os.path.join(scratch, "reviews.sqlite3"))
+    # Import the app (and load the tokenizer) up front so start-up cost isn't counted in the first scenario
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        import server  # noqa: F401
+        from token_counter import count_tokens
+        count_tokens("warm-up")
+
+    results = []
+    print(f"{'scenario':<10} {'size':>6} {'items/s':>10} {'p50 s':>8} {'p99 s':>8} {'peak MB':>8} {'errors':>6}")
+    try:
+        for name in scenarios:
+            for size in sizes:
+                result = run_scenario(name, size, options, services)
+                results.append(result)
+                print(f"{name:<10} {size:>6} {result['throughput'] or 0:>10.1f} {result['p50'] or 0:>8.3f} "
+                      f"{result['p99'] or 0:>8.3f} {result['peak_mb']:>8.1f} {result['errors']:>6}")
+    finally:
+        services.stop()
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        for regression in regressions:
+            print(f"[BENCHMARK] Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# exporters.py
+# Streaming bibliographic exports (CSV, BibTeX, RIS, JSON Lines) for reference managers and PRISMA
+# reporting. Each exporter takes an iterable of (Paper, screening record or None) pairs and yields
+# the output a record at a time, so a Flask generator response (or a file) receives it
+# incrementally and exporting a large review uses constant memory. Every record carries its
+# screening status and its provenance: the databases it was found in plus the review's search.
+import io
+import csv
+import json
+
+from paper import Paper
+
+CSV_FIELDS = ["title", "authors", "year", "venue", "paper_type", "volume", "doi", "url", "pdf_url", "open_access",
+              "abstract", "identifier", "affiliation_name", "affiliation_country",
+              "screening_status", "screening_mode", "screening_score", "sources", "search_string", "session_id"]
+_RIS_TYPES = {"journal": "JOUR", "conference": "CONF", "conference proceeding": "CONF", "book": "BOOK",
+              "book series": "BOOK"}
+_BIBTEX_TYPES = {"JOUR": "article", "CONF": "inproceedings", "BOOK": "book"}
+_BIBTEX_SPECIAL = str.maketrans({"&": r"\&", "%": r"\%", "$": r"\$", "#": r"\#", "_": r"\_",
+                                 "{": "", "}": "", "\\": ""})
+# Fields kept verbatim apart from braces, which would unbalance the entry
+_BIBTEX_VERBATIM = {"doi", "url"}
+_BIBTEX_BRACES = str.maketrans({"{": "", "}": ""})
+
+
+def screening_status(record):
+    """"included", "excluded" or "unscreened" (never screened, or the relevance check failed)."""
+    if not record or record.get("relevant") is None:
+        return "unscreened"
+    return "included" if record["relevant"] else "excluded"
+
+
+def _screening(record):
+    return {"status": screening_status(record), "mode": (record or {}).get("mode"),
+            "score": (record or {}).get("score")}
+
+
+def _split_authors(authors):
+    # Sources join authors with ", " (Semantic Scholar, scholarly); Scopus gives one "Surname I." creator
+    return [name.strip() for name in authors.split(",") if name.strip()] if authors else []
+
+
+def _ris_type(paper):
+    return _RIS_TYPES.get(paper.paper_type.lower(), "GEN")
+
+
+def iter_csv(rows, provenance=None):
+    provenance = provenance or {}
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for paper, record in rows:
+        screening = _screening(record)
+        score = screening["score"]
+        writer.writerow({
+            "title": paper.title, "authors": paper.authors, "year": paper.year, "venue": paper.venue,
+            "paper_type": paper.paper_type, "volume": paper.volume, "doi": paper.doi, "url": paper.url,
+            "pdf_url": paper.pdf_url, "open_access": paper.open_access, "abstract": paper.abstract,
+            "identifier": paper.identifier, "affiliation_name": paper.affiliation_name,
+            "affiliation_country": paper.affiliation_country, "screening_status": screening["status"],
+            "screening_mode": screening["mode"] or "", "screening_score": "" if score is None else score,
+            "sources": ";".join(paper.sources),
+            "search_string": provenance.get("search_string") or "", "session_id": provenance.get("session_id") or "",
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _citation_key(paper, position):
+    surname = "".join(c for c in (_split_authors(paper.authors) or ["anon"])[0].split(" ")[-1] if c.isalnum())
+    word = next((w for w in paper.title.split() if len(w) > 3), "paper")
+    # The position keeps keys unique without remembering every key already written
+    return f"{surname or 'anon'}{paper.year}{''.join(c for c in word if c.isalnum())}{position}".lower()
+
+
+def iter_bibtex(rows, provenance=None):
+    # Imported here: bibtexparser (and pyparsing behind it) would add noticeably to server start-up
+    from bibtexparser.bibdatabase import BibDatabase
+    from bibtexparser.bwriter import BibTexWriter
+
+    provenance = provenance or {}
+    writer = BibTexWriter()
+    writer.indent = "  "
+    writer.order_entries_by = None
+    for position, (paper, record) in enumerate(rows, 1):
+        entry_type = _BIBTEX_TYPES.get(_ris_type(paper), "misc")
+        venue_field = {"article": "journal", "inproceedings": "booktitle"}.get(entry_type, "howpublished")
+        fields = {
+            "title": paper.title, "author": " and ".join(_split_authors(paper.authors)), "year": paper.year,
+            venue_field: paper.venue, "volume": paper.volume, "doi": paper.doi, "url": paper.url,
+            "abstract": paper.abstract,
+            # Non-standard fields: BibTeX styles ignore them, reference managers keep them
+            "screening": screening_status(record), "sources": ", ".join(paper.sources),
+            "search": provenance.get("search_string") or "",
+        }
+        entry = {name: value.translate(_BIBTEX_BRACES if name in _BIBTEX_VERBATIM else _BIBTEX_SPECIAL)
+                 for name, value in fields.items() if value}
+        entry.update(ENTRYTYPE=entry_type, ID=_citation_key(paper, position))
+        database = BibDatabase()
+        database.entries = [entry]
+        yield writer.write(database)
+
+
+def iter_ris(rows, provenance=None):
+    provenance = provenance or {}
+    for paper, record in rows:
+        screening = _screening(record)
+        lines = [("TY", _ris_type(paper)), ("TI", paper.title)]
+        lines += [("AU", author) for author in _split_authors(paper.authors)]
+        lines += [("PY", paper.year), ("T2", paper.venue), ("VL", paper.volume), ("DO", paper.doi),
+                  ("UR", paper.url), ("L1", paper.pdf_url), ("AB", " ".join(paper.abstract.split()))]
+        lines += [("DB", source) for source in paper.sources]
+        lines.append(("N1", f"Screening: {screening['status']}"
+                            + (f" ({screening['mode']})" if screening["mode"] else "")))
+        if provenance.get("search_string"):
+            lines.append(("N1", f"Search: {provenance['search_string']}"))
+        yield "".join(f"{tag}  - {value}\n" for tag, value in lines if value) + "ER  - \n\n"
+
+
+def iter_jsonl(rows, provenance=None):
+    provenance = provenance or {}
+    for paper, record in rows:
+        line = dict(paper.to_dict(), screening=_screening(record),
+                    provenance=dict(provenance, sources=paper.sources))
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+
+# format -> (exporter, mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "bibtex": (iter_bibtex, "application/x-bibtex", "bib"),
+    "ris": (iter_ris, "application/x-research-info-systems", "ris"),
+    "jsonl": (iter_jsonl, "application/x-ndjson", "jsonl"),
+}
+
+
+def export_records(fmt, rows, provenance=None):
+    """Yields `rows` ((Paper, screening record or None) pairs) in format `fmt`. Raises KeyError for unknown formats."""
+    return EXPORT_FORMATS[fmt][0](rows, provenance)
+
+
+def write_export(fmt, rows, path, provenance=None):
+    """Writes an export to `path` a record at a time."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in export_records(fmt, rows, provenance):
+            f.write(chunk)
+
+
+def paper_rows(papers, screening=None):
+    """Pairs papers (Papers or dicts) with the screening record at the same index of `screening`, if any."""
+    screening = screening or []
+    for index, paper in enumerate(papers):
+        if not isinstance(paper, (Paper, dict)):
+            continue
+        yield Paper.from_dict(paper), screening[index] if index < len(screening) else None
@@ -0,0 +1,332 @@
+# fulltext.py
+# Open-access full-text ingestion. PDFs linked from papers' pdf_url are downloaded concurrently,
+# their text is extracted in a process pool (pypdf is pure Python, so threads would serialise
+# on the GIL) and split into overlapping word chunks. Everything lands in an on-disk,
+# content-addressed store:
+#   sources/<key>.json    one per DOI (or URL when there is no DOI): status and the document it resolved to
+#   documents/<sha>.json  one per distinct PDF (sha256 of its bytes): page count and chunk hashes
+#   chunks/<sha>.txt      one per distinct chunk text
+# so re-runs never re-download a known source nor re-parse a known PDF. agents4 reads the chunks
+# to add full-text excerpts to answer prompts.
+import io
+import os
+import atexit
+import re
+import json
+import time
+import socket
+import hashlib
+import ipaddress
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from agents3 import normalize_doi
+from llm_cache import make_key
+from paper import papers_from_dicts
+from rate_limiter import request_slot, submit_in_context
+
+FULLTEXT_DIR = os.getenv("FULLTEXT_DIR", str(Path(__file__).parent / '.cache' / 'fulltext'))
+# PDFs downloaded at once, and processes extracting text (0 = extract in the download threads).
+FULLTEXT_MAX_DOWNLOADS = int(os.getenv("FULLTEXT_MAX_DOWNLOADS", "8"))
+FULLTEXT_MAX_PROCESSES = int(os.getenv("FULLTEXT_MAX_PROCESSES", str(min(4, os.cpu_count() or 1))))
+FULLTEXT_MAX_MB = float(os.getenv("FULLTEXT_MAX_MB", "25"))
+FULLTEXT_TIMEOUT = float(os.getenv("FULLTEXT_TIMEOUT", "60"))
+# Seconds before a source that failed to download or parse is tried again.
+FULLTEXT_RETRY_FAILED_AFTER = int(os.getenv("FULLTEXT_RETRY_FAILED_AFTER", str(24 * 3600)))
+# PDF URLs come from request bodies, so by default only hosts with public addresses are fetched.
+# Set to 1 to allow loopback/private hosts (e.g. a local mirror in development).
+FULLTEXT_ALLOW_PRIVATE = os.getenv("FULLTEXT_ALLOW_PRIVATE", "0") == "1"
+FULLTEXT_MAX_REDIRECTS = 5
+# Words per chunk, and words repeated from the end of one chunk at the start of the next.
+FULLTEXT_CHUNK_WORDS = 300
+FULLTEXT_CHUNK_OVERLAP = 40
+
+_download_session = requests.Session()
+_download_session.headers["User-Agent"] = "Mozilla/5.0 (compatible; SLR-Automation full-text fetcher)"
+
+
+def source_key(paper):
+    """Store key of a paper's full text: its DOI when it has one, else its PDF URL. None without a PDF URL."""
+    if not paper.pdf_url:
+        return None
+    doi = normalize_doi(paper.doi)
+    return make_key("fulltext", f"doi:{doi}" if doi else f"url:{paper.pdf_url.strip()}")
+
+
+def chunk_words(text, size=FULLTEXT_CHUNK_WORDS, overlap=FULLTEXT_CHUNK_OVERLAP):
+    """Splits text into chunks of `size` words, each starting `overlap` words before the previous one ended."""
+    words = text.split()
+    step = max(1, size - overlap)
+    return [" ".join(words[start:start + size]) for start in range(0, max(len(words) - overlap, 1), step)
+            if words[start:start + size]]
+
+
+def extract_pdf_chunks(data, size=FULLTEXT_CHUNK_WORDS, overlap=FULLTEXT_CHUNK_OVERLAP):
+    """Returns (page count, text chunks) of a PDF. Runs in a worker process."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    pages = [page.extract_text() or "" for page in reader.pages]
+    # Re-join words hyphenated across line breaks before chunking
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", "\n".join(pages))
+    return len(pages), chunk_words(text, size, overlap)
+
+
+class FullTextStore:
+    """The content-addressed directory tree described at the top of this module. Writes are atomic."""
+    def __init__(self, root=FULLTEXT_DIR):
+        self.root = Path(root)
+
+    def _path(self, kind, key, suffix):
+        return self.root / kind / key[:2] / f"{key}{suffix}"
+
+    def _write(self, path, text):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        temporary.write_text(text, encoding="utf-8")
+        os.replace(temporary, path)
+
+    def _read_json(self, path):
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def get_source(self, key):
+        return self._read_json(self._path("sources", key, ".json"))
+
+    def put_source(self, key, record):
+        self._write(self._path("sources", key, ".json"), json.dumps(dict(record, updated_at=time.time())))
+
+    def get_document(self, digest):
+        return self._read_json(self._path("documents", digest, ".json"))
+
+    def put_document(self, digest, pages, chunks):
+        hashes = []
+        for chunk in chunks:
+            chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+            path = self._path("chunks", chunk_hash, ".txt")
+            if not path.exists():
+                self._write(path, chunk)
+            hashes.append(chunk_hash)
+        self._write(self._path("documents", digest, ".json"), json.dumps({"pages": pages, "chunks": hashes}))
+
+    def get_chunks(self, paper):
+        """The stored text chunks of a paper's full text, or [] when it hasn't been ingested."""
+        key = source_key(paper)
+        source = self.get_source(key) if key else None
+        document = self.get_document(source["document"]) if source and source.get("document") else None
+        if document is None:
+            return []
+        chunks = []
+        for chunk_hash in document["chunks"]:
+            try:
+                chunks.append(self._path("chunks", chunk_hash, ".txt").read_text(encoding="utf-8"))
+            except OSError:
+                continue
+        return chunks
+
+    def document_id(self, paper):
+        """The sha256 of the PDF a paper's full text was extracted from, or None."""
+        key = source_key(paper)
+        source = self.get_source(key) if key else None
+        return source.get("document") if source else None
+
+
+fulltext_store = FullTextStore()
+
+
+class DownloadError(Exception):
+    pass
+
+
+def check_url(url):
+    """Raises DownloadError unless `url` is http(s) and (without FULLTEXT_ALLOW_PRIVATE) its host
+    resolves only to public addresses, so client-supplied URLs can't reach internal services."""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise DownloadError("only http(s) URLs can be downloaded")
+    if FULLTEXT_ALLOW_PRIVATE:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or 0,
+                                                                 proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise DownloadError(f"cannot resolve {parsed.hostname}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise DownloadError(f"{parsed.hostname} resolves to a non-public address")
+
+
+def download_pdf(url, max_bytes=None, timeout=None):
+    """GETs a PDF, refusing bodies that aren't PDFs or exceed `max_bytes`. Raises DownloadError.
+
+    Redirects are followed by hand so every hop passes check_url.
+    """
+    max_bytes = max_bytes or int(FULLTEXT_MAX_MB * 1024 * 1024)
+    try:
+        with request_slot():
+            for _ in range(FULLTEXT_MAX_REDIRECTS + 1):
+                check_url(url)
+                response = _download_session.get(url, stream=True, timeout=timeout or FULLTEXT_TIMEOUT,
+                                                 allow_redirects=False)
+                if not response.is_redirect:
+                    break
+                response.close()
+                url = urljoin(url, response.headers["Location"])
+            else:
+                raise DownloadError("too many redirects")
+            with response:
+                if response.status_code != 200:
+                    raise DownloadError(f"HTTP {response.status_code}")
+                parts, size = [], 0
+                for part in response.iter_content(64 * 1024):
+                    size += len(part)
+                    if size > max_bytes:
+                        raise DownloadError(f"larger than {max_bytes // 2 ** 20} MB")
+                    parts.append(part)
+    except requests.exceptions.RequestException as e:
+        raise DownloadError(str(e))
+    data = b"".join(parts)
+    # Publishers often answer PDF links with an HTML landing or login page
+    if not data.lstrip()[:5].startswith(b"%PDF"):
+        raise DownloadError("response is not a PDF")
+    return data
+
+
+# One extraction pool per process, created on first use and shut down at exit. Workers are
+# spawned, not forked: forking a server process that already runs threads can deadlock the child.
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _process_pool():
+    global _parse_pool
+    if FULLTEXT_MAX_PROCESSES <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            try:
+                _parse_pool = ProcessPoolExecutor(max_workers=FULLTEXT_MAX_PROCESSES,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError) as e:
+                # e.g. serverless runtimes without /dev/shm; fall back to extracting in the download threads
+                print(f"[FULLTEXT] Process pool unavailable ({e}); extracting text in threads")
+                return None
+            atexit.register(_parse_pool.shutdown)
+        return _parse_pool
+
+
+def _extract(data, parse_pool):
+    """extract_pdf_chunks in `parse_pool`, or in the calling thread without one."""
+    global _parse_pool
+    if parse_pool is None:
+        return extract_pdf_chunks(data)
+    try:
+        return parse_pool.submit(extract_pdf_chunks, data).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory on a huge PDF); the next call starts a fresh pool
+        with _parse_pool_lock:
+            if _parse_pool is parse_pool:
+                _parse_pool = None
+        raise DownloadError("text extraction crashed")
+
+
+def ingest_fulltext(papers, store=None, max_downloads=None, max_processes=None, progress=None, cancel_event=None):
+    """Downloads and indexes the open-access full text of `papers` (Papers or dicts with pdf_url).
+
+    Sources already in the store are skipped, as are recent failures (retried after
+    FULLTEXT_RETRY_FAILED_AFTER seconds); a PDF already parsed under another source is not parsed again.
+    Text is extracted in the shared process pool (max_processes=0: in the download threads).
+    progress(done, total) is called as sources finish. Returns a report of counts and per-source errors.
+    """
+    store = store or fulltext_store
+    papers = papers_from_dicts(papers)
+    started = time.perf_counter()
+    report = {"papers": len(papers), "no_pdf": 0, "cached": 0, "skipped": 0, "downloaded": 0, "parsed": 0,
+              "failed": 0, "errors": {}}
+
+    pending = {}
+    now = time.time()
+    for paper in papers:
+        key = source_key(paper)
+        if key is None:
+            report["no_pdf"] += 1
+            continue
+        if key in pending:
+            continue
+        source = store.get_source(key)
+        if source and source["status"] == "ok":
+            report["cached"] += 1
+        elif source and now - source.get("updated_at", 0) < FULLTEXT_RETRY_FAILED_AFTER:
+            report["skipped"] += 1
+        else:
+            pending[key] = paper
+
+    total = len(pending)
+    done = 0
+    lock = threading.Lock()
+    # PDF digest -> extraction Future, so the same PDF linked from several sources is parsed once
+    parsing = {}
+    parse_pool = None if max_processes == 0 else _process_pool()
+
+    def _ingest(key, paper):
+        if cancel_event is not None and cancel_event.is_set():
+            return "cancelled"
+        try:
+            data = download_pdf(paper.pdf_url)
+            digest = hashlib.sha256(data).hexdigest()
+            outcome = "downloaded"
+            if store.get_document(digest) is None:
+                with lock:
+                    extraction = parsing.get(digest)
+                    owner = extraction is None
+                    if owner:
+                        extraction = parsing[digest] = Future()
+                if owner:
+                    try:
+                        extraction.set_result(_extract(data, parse_pool))
+                    except Exception as e:
+                        extraction.set_exception(e)
+                pages, chunks = extraction.result()
+                if not chunks:
+                    raise DownloadError("no extractable text (scanned PDF?)")
+                if owner:
+                    store.put_document(digest, pages, chunks)
+                    outcome = "parsed"
+            store.put_source(key, {"status": "ok", "url": paper.pdf_url, "doi": paper.doi, "document": digest})
+            return outcome
+        except Exception as e:
+            store.put_source(key, {"status": "failed", "url": paper.pdf_url, "doi": paper.doi, "error": str(e)})
+            with lock:
+                report["errors"][paper.title or paper.pdf_url] = str(e)
+            print(f"[FULLTEXT] Could not ingest {paper.pdf_url}: {e}")
+            return "failed"
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_downloads or FULLTEXT_MAX_DOWNLOADS, total)),
+                                thread_name_prefix="fulltext") as executor:
+            futures = [submit_in_context(executor, _ingest, key, paper) for key, paper in pending.items()]
+            for future in futures:
+                outcome = future.result()
+                if outcome == "parsed":
+                    report["downloaded"] += 1
+                if outcome != "cancelled":
+                    report[outcome] += 1
+                done += 1
+                if progress:
+                    progress(done, total)
+
+    report["wall_time"] = round(time.perf_counter() - started, 3)
+    print(f"[FULLTEXT] {report['parsed']} parsed, {report['downloaded'] - report['parsed']} reused, "
+          f"{report['cached']} cached, {report['failed']} failed of {len(papers)} papers")
+    return report
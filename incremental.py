@@ -0,0 +1,91 @@
+# incremental.py
+# Incremental re-evaluation of a review session. Every stage output stored in review_store is
+# tagged with a fingerprint of the inputs it was computed from:
+#   screening verdict  <- paper (title, abstract, DOI), search string, model, pre-screen options
+#   answer             <- question, the relevant papers (and their ingested full texts), model, context budget
+#   summary            <- the prompt it was generated from (or the relevant papers), model
+# A stage is only recomputed when its fingerprint changes, so editing the search string or adding
+# a few papers costs in proportion to what changed rather than to the whole review.
+import time
+
+from fulltext import fulltext_store
+from llm_cache import make_key
+from review_store import review_store
+from agents4 import filter_papers_llm, summarize_screening, ANSWER_CONTEXT_TOKENS, ANSWER_TOP_K
+
+# filter_papers_llm options that change verdicts (worker counts, batching, progress and cancellation don't).
+_SCREENING_INPUTS = ("prescreen", "research_questions", "exclude_below", "include_above")
+
+
+def paper_fingerprint(paper):
+    return make_key(paper.title, paper.abstract, paper.doi)
+
+
+def corpus_fingerprint(papers):
+    """Fingerprint of a paper list, in order (answer context ranking breaks ties by input order)."""
+    return make_key([paper_fingerprint(paper) for paper in papers])
+
+
+def screening_fingerprint(paper, search_string, model_name, options):
+    inputs = {name: options.get(name) for name in _SCREENING_INPUTS}
+    if not inputs.get("prescreen"):
+        # Cutoffs and research questions only matter to pre-screening
+        inputs = {}
+    return make_key("screening", paper_fingerprint(paper), search_string, model_name, inputs)
+
+
+def fulltext_fingerprint(papers):
+    """Changes when full text is ingested for any of the papers, so answers grounded on it are redone."""
+    return make_key([fulltext_store.document_id(paper) for paper in papers if paper.pdf_url])
+
+
+def answer_fingerprint(question, papers, model_name, context_budget=None, top_k=None):
+    return make_key("answer", question, corpus_fingerprint(papers), fulltext_fingerprint(papers), model_name,
+                    context_budget or ANSWER_CONTEXT_TOKENS, top_k or ANSWER_TOP_K)
+
+
+def filter_session_papers(session_id, search_string, model_name="gpt-3.5-turbo", stats=None, **options):
+    """filter_papers_llm over a session's papers that only re-screens papers whose inputs changed.
+
+    Papers with a stored verdict for the same fingerprint keep it (per-paper mode "reused"); the rest
+    are screened with `options` and their verdicts stored. Unscreened or cancelled papers get no
+    fingerprint, so the next run retries them. Returns (relevant Papers, per-paper records).
+    """
+    started = time.perf_counter()
+    state = review_store.get_screening_state(session_id)
+    fingerprints = [screening_fingerprint(paper, search_string, model_name, options) for paper, _, _ in state]
+    stale = [index for index, (_, record, stored) in enumerate(state)
+             if stored != fingerprints[index] or record is None or record.get("relevant") is None]
+    print(f"[INCREMENTAL] Screening {len(stale)} of {len(state)} papers in session {session_id}")
+
+    records = [None] * len(state)
+    for index, (_, record, stored) in enumerate(state):
+        if stored == fingerprints[index] and record is not None and record.get("relevant") is not None:
+            records[index] = dict(record, index=index, mode="reused", latency=None)
+
+    screened = {}
+    if stale:
+        filter_papers_llm(search_string, [state[index][0] for index in stale], model_name, stats=screened, **options)
+    for position, record in enumerate(screened.get("per_paper", [])):
+        index = stale[position]
+        records[index] = dict(record, index=index)
+    review_store.record_verdicts(session_id, [records[index] for index in stale],
+                                 {index: fingerprints[index] for index in stale if records[index]["relevant"] is not None})
+
+    if stats is not None:
+        stats.update(summarize_screening(records, time.perf_counter() - started))
+        stats["reused"] = len(state) - len(stale)
+    return [paper for (paper, _, _), record in zip(state, records) if record["relevant"]], records
+
+
+def session_summary(session_id, kind, fingerprint, compute):
+    """Returns the session's stored `kind` summary if it was made from the same inputs, else compute() and store it."""
+    if session_id:
+        stored = review_store.get_summary(session_id, kind, fingerprint)
+        if stored is not None:
+            print(f"[INCREMENTAL] Reusing {kind} for session {session_id}")
+            return stored
+    result = compute()
+    if session_id and isinstance(result, str):
+        review_store.save_summary(session_id, kind, result, fingerprint)
+    return result
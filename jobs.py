@@ -0,0 +1,146 @@
+# jobs.py
+# In-process background jobs for long-running pipeline steps (screening, answering, searching),
+# so the Flask worker that accepted the request is freed immediately.
+# Jobs live in this process's memory: with several gunicorn workers, poll the worker that
+# accepted the job (or run gunicorn with a single worker and threads).
+import os
+import time
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "4"))
+# Finished jobs are forgotten this many seconds after they end.
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "3600"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+
+
+class Job:
+    """A unit of background work with progress (done out of total) and cooperative cancellation."""
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._future = None
+        self._progress_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def report_progress(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def advance(self, count=1):
+        """Thread-safe increment of `done` for jobs whose items finish on several threads."""
+        with self._progress_lock:
+            self.done += count
+
+    def to_dict(self, include_result=True):
+        info = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(self.done / self.total, 3) if self.total else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.error:
+            info["error"] = self.error
+        # A cancelled job keeps whatever partial result it returned (e.g. screening with the rest unscreened)
+        if include_result and (self.status == SUCCEEDED or (self.status == CANCELLED and self.result is not None)):
+            info["result"] = self.result
+        return info
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _jobs_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix="jobs")
+    return _executor
+
+
+def _run(job, fn, args, kwargs):
+    if job.cancelled:
+        job.status = CANCELLED
+        job.finished_at = time.time()
+        return
+    job.status = RUNNING
+    job.started_at = time.time()
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.status = CANCELLED if job.cancelled else SUCCEEDED
+    except Exception as e:
+        print(f"[JOBS] {job.kind} job {job.id} failed: {e}")
+        job.error = str(e)
+        job.status = CANCELLED if job.cancelled else FAILED
+    finally:
+        job.finished_at = time.time()
+
+
+def _prune_finished(now):
+    expired = [job_id for job_id, job in _jobs.items()
+               if job.finished_at and now - job.finished_at > JOB_RETENTION]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def submit_job(kind, fn, *args, **kwargs):
+    """Queues fn(job, *args, **kwargs) on the background pool and returns the Job.
+
+    fn should call job.report_progress(done, total) as it goes and stop early once job.cancelled is set.
+    Its return value becomes the job result, also when it returns early after a cancel; an exception
+    marks the job failed.
+    """
+    job = Job(kind)
+    with _jobs_lock:
+        _prune_finished(time.time())
+        _jobs[job.id] = job
+    # The job runs in a copy of the submitter's context (e.g. its review for rate limiting)
+    job._future = _get_executor().submit(contextvars.copy_context().run, _run, job, fn, args, kwargs)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def cancel_job(job_id):
+    """Requests cancellation. Queued jobs never start; running ones stop at their next checkpoint."""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    if job.status in (QUEUED, RUNNING):
+        job.cancel_event.set()
+        if job._future is not None and job._future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+    return job
+
+
+def list_jobs():
+    with _jobs_lock:
+        return [job.to_dict(include_result=False) for job in _jobs.values()]
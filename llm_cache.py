@@ -0,0 +1,201 @@
+# llm_cache.py
+# Persistent, content-addressed cache for LLM responses, relevance verdicts and search results.
+# Entries live in a local SQLite file, expire after a TTL and are evicted
+# least-recently-used first once the store grows past its size bound.
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+from metrics import record_cache_lookup
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(__file__).parent / '.cache' / 'llm_cache.sqlite3'))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+RELEVANCE_CACHE_TTL = int(os.getenv("RELEVANCE_CACHE_TTL", str(90 * 24 * 3600)))  # seconds
+# Search results: seconds each source's results count as fresh, and how much longer a stale
+# entry may still be served while it is refreshed in the background.
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") != "0"
+SEARCH_CACHE_TTLS = {
+    "scopus": int(os.getenv("SCOPUS_CACHE_TTL", str(24 * 3600))),
+    "semanticscholar": int(os.getenv("S2_CACHE_TTL", str(24 * 3600))),
+    "scholar": int(os.getenv("SCHOLAR_CACHE_TTL", str(7 * 24 * 3600))),
+}
+SEARCH_CACHE_STALE = int(os.getenv("SEARCH_CACHE_STALE", str(7 * 24 * 3600)))
+
+# Size bounds are enforced every this many writes rather than on each one.
+_EVICT_EVERY = 25
+
+
+def make_key(*parts):
+    """Hashes JSON-serialisable parts into a stable cache key."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """A TTL + LRU key/value table in a shared SQLite file. Values are stored as JSON."""
+    def __init__(self, table, ttl, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024), enabled=LLM_CACHE_ENABLED):
+        self.table = table
+        self.ttl = ttl
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing this module never touches the filesystem
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                         "created_at REAL NOT NULL, last_access REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_access ON {self.table} (last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _disable(self, error):
+        print(f"[LLM_CACHE] Disabling {self.table} cache after SQLite error: {error}")
+        self.enabled = False
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss or expired entry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl and now - row[1] > self.ttl):
+                    if row is not None:
+                        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    record_cache_lookup(self.table, False)
+                    return None
+                conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+                record_cache_lookup(self.table, True)
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        encoded = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, last_access) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, encoded, len(encoded), now, now))
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def _evict(self, conn, now):
+        """Drops expired entries, then least-recently-used ones until both size bounds hold."""
+        if self.ttl:
+            self.evictions += conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?",
+                                           (now - self.ttl,)).rowcount
+        count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        excess_entries = max(0, count - self.max_entries)
+        excess_bytes = max(0, total - self.max_bytes)
+        victims = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            victims.append((key,))
+            excess_entries -= 1
+            excess_bytes -= size
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(f"DELETE FROM {self.table}")
+                conn.commit()
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def stats(self):
+        stats = {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                 "entries": None, "bytes": None}
+        if self.enabled:
+            try:
+                with self._lock:
+                    stats["entries"], stats["bytes"] = self._connect().execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+            except sqlite3.Error as e:
+                self._disable(e)
+        lookups = self.hits + self.misses
+        stats["hit_rate"] = round(self.hits / lookups, 3) if lookups else None
+        return stats
+
+
+# Full chat-completion responses keyed on (model, messages, temperature, max_tokens)
+llm_response_cache = ResponseCache("llm_responses", LLM_CACHE_TTL)
+# Relevant / Not Relevant verdicts keyed on (title, search_string, model), shared across sessions
+relevance_cache = ResponseCache("relevance_verdicts", RELEVANCE_CACHE_TTL)
+# Search API results keyed on (source, normalised query, filters); entries past every source's
+# TTL plus the stale window are expired here, freshness within that is decided by agents3
+search_cache = ResponseCache("search_results", max(SEARCH_CACHE_TTLS.values()) + SEARCH_CACHE_STALE,
+                             enabled=LLM_CACHE_ENABLED and SEARCH_CACHE_ENABLED)
+
+
+def llm_response_key(model_name, messages, temperature, max_tokens):
+    return make_key("chat", model_name, messages, temperature, max_tokens)
+
+
+def _normalise_text(text):
+    return " ".join(str(text or "").split()).casefold()
+
+
+def relevance_key(title, search_string, model_name):
+    # Whitespace and case differences in the title or search string don't change the verdict
+    return make_key("relevance", _normalise_text(title), _normalise_text(search_string), model_name)
+
+
+def normalize_query(search_string):
+    """Case- and whitespace-insensitive form of a Boolean search string, e.g. '( "LLM"  and X )' -> '("llm" and x)'."""
+    query = _normalise_text(search_string)
+    return re.sub(r"\(\s+", "(", re.sub(r"\s+\)", ")", query))
+
+
+def search_key(source, search_string, **filters):
+    # The limit is not part of the key: an entry fetched with a larger limit serves smaller ones
+    return make_key("search", source, normalize_query(search_string), filters)
+
+
+def cache_stats():
+    return {"llm_responses": llm_response_cache.stats(), "relevance_verdicts": relevance_cache.stats(),
+            "search_results": search_cache.stats()}
@@ -0,0 +1,464 @@
+# llm_client.py
+# Shared chat-completions client used by every agent module and route.
+# One pooled keep-alive httpx.Client per provider, so repeated calls reuse
+# TCP/TLS connections (and HTTP/2 when the `h2` package is installed).
+import os
+import json
+import time
+import random
+import fnmatch
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+import httpx
+
+from llm_cache import llm_response_cache, llm_response_key
+from metrics import record_llm_call
+from rate_limiter import get_rate_limiter, request_slot
+from token_counter import count_tokens
+
+# Load environment variables from .env file in the same directory as this file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+try:
+    import h2  # noqa: F401 -- only needed so httpx can negotiate HTTP/2
+    HTTP2_ENABLED = os.getenv("LLM_HTTP2", "1") != "0"
+except ImportError:
+    HTTP2_ENABLED = False
+
+# Seconds to wait for a completion; connecting gets a shorter budget of its own.
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+# Connections kept open per provider; should be >= SCREENING_MAX_WORKERS.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Retries of 429/5xx responses and connection errors, with jittered exponential backoff
+# (or the provider's Retry-After) capped at LLM_BACKOFF_MAX seconds.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Consecutive failed requests that open a provider's circuit, and seconds before a trial request.
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Fallback models per model pattern, e.g. "gpt-*=deepseek-chat,deepseek-*=gpt-4o-mini".
+# Tried in order when a model's provider keeps failing or its circuit is open.
+LLM_FALLBACK_MODELS = os.getenv("LLM_FALLBACK_MODELS", "")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Rejections of the provider setup rather than of the request (bad key, unknown model): fall back.
+PROVIDER_ERROR_STATUS = {401, 403, 404}
+# Completion tokens assumed for rate limiting when a request doesn't set max_tokens.
+LLM_DEFAULT_COMPLETION_TOKENS = 512
+
+
+class Provider:
+    """An OpenAI-compatible chat-completions API."""
+    def __init__(self, name, display_name, base_url, api_key_env):
+        self.name = name
+        self.display_name = display_name
+        self.base_url = base_url.rstrip('/')
+        self.api_key_env = api_key_env
+
+    @property
+    def api_key(self):
+        # Read on every call so keys set after import (e.g. by server.py's load_dotenv) are picked up
+        return os.getenv(self.api_key_env)
+
+    @property
+    def completions_url(self):
+        return f"{self.base_url}/chat/completions"
+
+
+PROVIDERS = {
+    "openai": Provider("openai", "OpenAI",
+                       os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"), "OPENAI_API_KEY"),
+    "deepseek": Provider("deepseek", "DeepSeek",
+                         os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1"), "DEEPSEEK_API_KEY"),
+}
+
+# Model name prefix -> provider name. First match wins.
+MODEL_PREFIXES = [
+    ("gpt", "openai"),
+    ("deepseek", "deepseek"),
+]
+
+
+def get_provider(model_name):
+    """Returns the Provider serving `model_name`, or None if no prefix matches."""
+    for prefix, provider_name in MODEL_PREFIXES:
+        if model_name and model_name.startswith(prefix):
+            return PROVIDERS[provider_name]
+    return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_http_client(provider):
+    """Returns the shared pooled client for a provider, creating it on first use."""
+    client = _clients.get(provider.name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider.name)
+            if client is None:
+                client = httpx.Client(
+                    base_url=provider.base_url,
+                    http2=HTTP2_ENABLED,
+                    timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                        max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                )
+                _clients[provider.name] = client
+    return client
+
+
+def close_clients():
+    """Closes all pooled connections (e.g. at process shutdown)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker.
+
+    After `threshold` consecutive failures the circuit opens and requests fail fast for
+    `reset_timeout` seconds; then one trial request is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name, threshold=LLM_BREAKER_THRESHOLD, reset_timeout=LLM_BREAKER_RESET):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed trial re-opens the circuit; failures of requests already in flight don't extend it
+            if self._trial_in_flight or (self.opened_at is None and self.failures >= self.threshold):
+                print(f"[LLM] {self.name} circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+_breakers = {name: CircuitBreaker(name) for name in PROVIDERS}
+
+
+def breaker_states():
+    return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+class LLMRequestError(Exception):
+    """A failed provider request. `retryable` is False for errors another attempt won't fix (e.g. 400/401);
+    `bad_request` is True when the request itself was rejected (e.g. 400), so no fallback model would take it.
+    """
+    def __init__(self, message, retryable=True, bad_request=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.bad_request = bad_request
+
+
+def _retry_delay(response, attempt):
+    """Seconds to wait before retrying: the server's Retry-After when given, else jittered exponential backoff."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(2 ** attempt, LLM_BACKOFF_MAX) * (0.5 + random.random() / 2)
+
+
+def fallback_models(model_name):
+    """Models to try, in order, when `model_name` fails: the first LLM_FALLBACK_MODELS rule whose pattern matches."""
+    for rule in LLM_FALLBACK_MODELS.split(","):
+        pattern, _, fallbacks = rule.partition("=")
+        if pattern.strip() and fnmatch.fnmatchcase(model_name, pattern.strip()):
+            return [m.strip() for m in fallbacks.split("|") if m.strip() and m.strip() != model_name]
+    return []
+
+
+def estimate_tokens(messages, model_name, max_tokens=None):
+    """Prompt plus completion tokens a request may use, for the tokens-per-minute limit."""
+    prompt = sum(count_tokens(message.get("content") or "", model_name) + 4 for message in messages)
+    return prompt + (max_tokens or LLM_DEFAULT_COMPLETION_TOKENS)
+
+
+def _with_retries(provider, send, tokens=0, call=None):
+    """Runs send() (which raises httpx errors) under the provider's circuit breaker, retrying transient failures.
+
+    Every attempt first waits for the provider key's rate limiter (one request plus `tokens`).
+    Pass a dict as `call` to have the attempts made and seconds spent queueing added to it.
+    Raises LLMRequestError once retries are exhausted, the error isn't retryable, or the circuit is open.
+    """
+    breaker = _breakers[provider.name]
+    limiter = get_rate_limiter(provider.name, provider.api_key)
+    call = call if call is not None else {}
+    call.setdefault("attempts", 0)
+    call.setdefault("queue_wait", 0.0)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if not breaker.allow():
+            raise LLMRequestError(f"{provider.display_name} circuit is open after repeated failures")
+        call["queue_wait"] += limiter.acquire(tokens)
+        call["attempts"] += 1
+        response = None
+        try:
+            queued = time.monotonic()
+            with request_slot():
+                call["queue_wait"] += time.monotonic() - queued
+                result = send()
+        except httpx.HTTPStatusError as e:
+            response = e.response
+            if response.status_code not in RETRYABLE_STATUS:
+                breaker.record_success()  # The provider is up; the request or its setup was rejected
+                raise LLMRequestError(str(e), retryable=False,
+                                      bad_request=response.status_code not in PROVIDER_ERROR_STATUS)
+            breaker.record_failure()
+            error = e
+        except httpx.TransportError as e:
+            breaker.record_failure()
+            error = e
+        except Exception as e:
+            # e.g. a 200 HTML page from a proxy that isn't JSON; also ends a half-open trial
+            breaker.record_failure()
+            raise LLMRequestError(f"invalid response from {provider.display_name}: {e}") from e
+        else:
+            breaker.record_success()
+            return result
+        if attempt == LLM_MAX_RETRIES:
+            raise LLMRequestError(str(error))
+        delay = _retry_delay(response, attempt)
+        print(f"{provider.display_name} request throttled or failed ({error}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def _record_call(provider, model_name, started, call, prompt_tokens=0, completion_tokens=0, ok=True):
+    record_llm_call(provider.name, model_name, time.perf_counter() - started, call.get("queue_wait", 0.0),
+                    max(call.get("attempts", 1) - 1, 0), prompt_tokens, completion_tokens, ok)
+
+
+def provider_request(provider_name, method, path, **kwargs):
+    """Sends an authenticated request to a provider's API (e.g. GET /models). Raises httpx.HTTPError."""
+    provider = PROVIDERS[provider_name]
+    headers = {"Authorization": f"Bearer {provider.api_key}"}
+    headers.update(kwargs.pop("headers", {}))
+    return _get_http_client(provider).request(method, path, headers=headers, **kwargs)
+
+
+def _resolve(model_name):
+    """Returns (provider, None) for a usable model, or (None, error message)."""
+    provider = get_provider(model_name)
+    if provider is None:
+        return None, f"Unsupported model: {model_name}"
+    if not provider.api_key:
+        return None, f"{provider.display_name} API key not found."
+    return provider, None
+
+
+def _request_options(provider, timeout, stream=False):
+    headers = {"Authorization": f"Bearer {provider.api_key}", "Content-Type": "application/json"}
+    if stream:
+        headers["Accept"] = "text/event-stream"
+    return {"headers": headers,
+            "timeout": httpx.Timeout(timeout, connect=LLM_CONNECT_TIMEOUT) if timeout else httpx.USE_CLIENT_DEFAULT}
+
+
+def _payload(model_name, messages, temperature, max_tokens, stream=False):
+    payload = {"model": model_name, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def call_llm(messages, model_name, temperature=0.7, max_tokens=None, timeout=None, use_cache=True):
+    """Calls the chat-completions endpoint for `model_name`.
+
+    Successful responses are cached on (model, messages, temperature, max_tokens), so repeating
+    a prompt is answered from llm_cache without a provider round-trip; pass use_cache=False to bypass.
+    429/5xx responses and connection errors are retried with backoff; if the provider still fails,
+    its circuit is open or it rejects the key or model (401/403/404), the LLM_FALLBACK_MODELS for
+    the model are tried in turn. A rejected request (e.g. 400) is not sent to the fallbacks.
+    Returns the decoded JSON response, or {"error": ...} on failure.
+    """
+    provider, error = _resolve(model_name)
+    if provider is None:
+        return {"error": error}
+
+    cache_key = llm_response_key(model_name, messages, temperature, max_tokens) if use_cache else None
+    if cache_key:
+        cached = llm_response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    errors = []
+    for candidate in [model_name] + fallback_models(model_name):
+        candidate_provider, error = _resolve(candidate)
+        if candidate_provider is None:
+            errors.append(error)
+            continue
+        if candidate != model_name:
+            print(f"[LLM] Falling back from {model_name} to {candidate}")
+        client = _get_http_client(candidate_provider)
+        options = _request_options(candidate_provider, timeout)
+        payload = _payload(candidate, messages, temperature, max_tokens)
+
+        def _send():
+            response = client.post("/chat/completions", json=payload, **options)
+            response.raise_for_status()  # Raises an exception for HTTP error codes
+            return response.json()
+
+        estimated = estimate_tokens(messages, candidate, max_tokens)
+        call = {}
+        started = time.perf_counter()
+        try:
+            result = _with_retries(candidate_provider, _send, estimated, call)
+        except LLMRequestError as e:
+            _record_call(candidate_provider, candidate, started, call, ok=False)
+            print(f"{candidate_provider.display_name} API request failed: {e}")
+            errors.append(f"{candidate_provider.display_name} API request failed for {candidate}: {str(e)}")
+            if e.bad_request:
+                break
+            continue
+
+        usage = (result.get("usage") if isinstance(result, dict) else None) or {}
+        if usage.get("total_tokens"):
+            get_rate_limiter(candidate_provider.name, candidate_provider.api_key).record_usage(
+                estimated, usage["total_tokens"])
+        _record_call(candidate_provider, candidate, started, call, usage.get("prompt_tokens") or 0,
+                     usage.get("completion_tokens") or 0)
+        # Fallback answers are cached too: the prompt was answered, just by another model
+        if cache_key and isinstance(result, dict) and "error" not in result:
+            llm_response_cache.set(cache_key, result)
+        return result
+    return {"error": "; ".join(errors)}
+
+
+def stream_llm(messages, model_name, temperature=0.7, max_tokens=None, timeout=None, use_cache=True):
+    """Streams a chat completion (`"stream": true`), yielding content deltas as strings.
+
+    On failure a single {"error": ...} dict is yielded instead and the generator ends.
+    Retries and model fallback apply until the first delta arrives; a stream that breaks
+    after that ends with an error dict.
+    The assembled completion is written to the same cache call_llm uses, and a cache hit
+    is yielded as one delta.
+    """
+    provider, error = _resolve(model_name)
+    if provider is None:
+        yield {"error": error}
+        return
+
+    cache_key = llm_response_key(model_name, messages, temperature, max_tokens) if use_cache else None
+    if cache_key:
+        cached = llm_response_cache.get(cache_key)
+        if cached is not None:
+            content = get_llm_content(cached, model_name)
+            if isinstance(content, str):
+                yield content
+                return
+
+    errors = []
+    for candidate in [model_name] + fallback_models(model_name):
+        candidate_provider, error = _resolve(candidate)
+        if candidate_provider is None:
+            errors.append(error)
+            continue
+        if candidate != model_name:
+            print(f"[LLM] Falling back from {model_name} to {candidate}")
+        client = _get_http_client(candidate_provider)
+        options = _request_options(candidate_provider, timeout, stream=True)
+        payload = _payload(candidate, messages, temperature, max_tokens, stream=True)
+
+        def _open():
+            # Only opening the stream (status line and headers) is retried
+            response = client.send(client.build_request("POST", "/chat/completions", json=payload, **options),
+                                   stream=True)
+            if response.is_error:
+                response.read()
+                response.close()
+            response.raise_for_status()
+            return response
+
+        estimated = estimate_tokens(messages, candidate, max_tokens)
+        call = {}
+        started = time.perf_counter()
+        try:
+            response = _with_retries(candidate_provider, _open, estimated, call)
+        except LLMRequestError as e:
+            _record_call(candidate_provider, candidate, started, call, ok=False)
+            print(f"{candidate_provider.display_name} API streaming request failed: {e}")
+            errors.append(f"{candidate_provider.display_name} API request failed for {candidate}: {str(e)}")
+            if e.bad_request:
+                break
+            continue
+
+        parts = []
+        try:
+            for line in response.iter_lines():
+                # Server-sent events: "data: {json chunk}" lines, terminated by "data: [DONE]"
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except (httpx.HTTPError, ValueError) as e:
+            _record_call(candidate_provider, candidate, started, call, ok=False)
+            print(f"{candidate_provider.display_name} API streaming request failed: {e}")
+            yield {"error": f"{candidate_provider.display_name} API request failed for {candidate}: {str(e)}"}
+            return
+        finally:
+            response.close()
+
+        # Streams carry no usage block; count the completion locally instead
+        prompt_tokens = estimated - (max_tokens or LLM_DEFAULT_COMPLETION_TOKENS)
+        completion_tokens = count_tokens("".join(parts), candidate)
+        get_rate_limiter(candidate_provider.name, candidate_provider.api_key).record_usage(
+            estimated, prompt_tokens + completion_tokens)
+        _record_call(candidate_provider, candidate, started, call, prompt_tokens, completion_tokens)
+        if cache_key and parts:
+            llm_response_cache.set(cache_key, {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]})
+        return
+    yield {"error": "; ".join(errors)}
+
+
+def get_llm_content(result, model_name):
+    """Extracts the message content from a chat-completions response, propagating error dicts."""
+    if "error" in result:
+        return result  # Propagate error
+    try:
+        return result['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError) as e:
+        print(f"Failed to parse content from {model_name} response: {e}. Response: {result}")
+        return {"error": f"Failed to parse content from {model_name} response."}
@@ -0,0 +1,245 @@
+# metrics.py
+# In-process instrumentation of outbound LLM and search calls, cache lookups and Flask routes.
+# Counters and histograms are rendered in the Prometheus text format by /api/metrics; the same
+# calls are also totalled per review (and per stage within it) for /api/metrics/reviews.
+# The stage is the Flask route or pipeline stage a call was made from, carried in a ContextVar
+# the same way rate_limiter carries the review id.
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from rate_limiter import current_review
+
+# Histogram buckets (seconds) shared by every latency metric.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Reviews whose breakdown is kept; the least recently active are dropped first.
+METRICS_MAX_REVIEWS = int(os.getenv("METRICS_MAX_REVIEWS", "1000"))
+
+# USD per million (prompt, completion) tokens; the longest matching model prefix wins.
+# Override or extend with LLM_PRICES, e.g. "gpt-4o=2.5/10,deepseek-chat=0.27/1.1".
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "deepseek-chat": (0.27, 1.1),
+    "deepseek-reasoner": (0.55, 2.19),
+}
+for _rule in os.getenv("LLM_PRICES", "").split(","):
+    _model, _, _prices = _rule.partition("=")
+    if _model.strip() and "/" in _prices:
+        MODEL_PRICES[_model.strip()] = tuple(float(p) for p in _prices.split("/", 1))
+
+_HELP = {
+    "slr_llm_requests_total": ("counter", "LLM calls by provider, model, stage and outcome"),
+    "slr_llm_request_seconds": ("histogram", "Wall time of LLM calls, including retries and queueing"),
+    "slr_llm_queue_wait_seconds_total": ("counter", "Seconds LLM calls waited for rate limits and the concurrency budget"),
+    "slr_llm_retries_total": ("counter", "LLM request attempts beyond the first"),
+    "slr_llm_tokens_total": ("counter", "Tokens reported by the provider (estimated for streams)"),
+    "slr_llm_cost_usd_total": ("counter", "Estimated LLM spend from MODEL_PRICES"),
+    "slr_search_requests_total": ("counter", "Search API pages requested by source, stage and outcome"),
+    "slr_search_request_seconds": ("histogram", "Wall time of search API requests, including retries and queueing"),
+    "slr_search_queue_wait_seconds_total": ("counter", "Seconds search requests waited for rate limits and the concurrency budget"),
+    "slr_search_retries_total": ("counter", "Search request attempts beyond the first"),
+    "slr_cache_lookups_total": ("counter", "Response cache lookups by cache and result"),
+    "slr_http_requests_total": ("counter", "Flask requests by route, method and status"),
+    "slr_http_request_seconds": ("histogram", "Flask handler time until the response is returned (streams: until headers)"),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_reviews = OrderedDict()
+
+_current_stage = contextvars.ContextVar("stage", default="other")
+
+
+def bind_stage(name):
+    """Attributes calls made in the current context to a stage; returns a token for unbind_stage."""
+    return _current_stage.set(str(name))
+
+
+def unbind_stage(token):
+    _current_stage.reset(token)
+
+
+@contextmanager
+def stage(name):
+    token = bind_stage(name)
+    try:
+        yield
+    finally:
+        unbind_stage(token)
+
+
+def current_stage():
+    return _current_stage.get()
+
+
+def model_cost(model_name, prompt_tokens, completion_tokens):
+    """Estimated USD cost of a call, or 0.0 for models without a price."""
+    matches = [prefix for prefix in MODEL_PRICES if model_name and model_name.startswith(prefix)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+def _labels(**labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _inc(name, amount=1.0, **labels):
+    series = _counters.setdefault(name, {})
+    key = _labels(**labels)
+    series[key] = series.get(key, 0.0) + amount
+
+
+def _observe(name, value, **labels):
+    series = _histograms.setdefault(name, {})
+    key = _labels(**labels)
+    buckets = series.get(key)
+    if buckets is None:
+        # One cumulative count per bucket, then +Inf (the total count), then the running sum
+        buckets = series[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            buckets[i] += 1
+    buckets[-2] += 1
+    buckets[-1] += value
+
+
+def _review_entry():
+    """The current review's {stage: totals} dict, most recently used last. Caller holds _lock."""
+    review = current_review()
+    entry = _reviews.pop(review, None) or {}
+    _reviews[review] = entry
+    while len(_reviews) > METRICS_MAX_REVIEWS:
+        _reviews.popitem(last=False)
+    totals = entry.get(current_stage())
+    if totals is None:
+        totals = entry[current_stage()] = {
+            "llm_calls": 0, "llm_errors": 0, "llm_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost_usd": 0.0, "search_calls": 0, "search_errors": 0, "search_seconds": 0.0,
+            "queue_wait_seconds": 0.0, "retries": 0, "cache_hits": 0, "cache_misses": 0}
+    return totals
+
+
+def record_llm_call(provider, model, seconds, queue_wait=0.0, retries=0, prompt_tokens=0, completion_tokens=0,
+                    ok=True):
+    """One call_llm/stream_llm request to one model, retries included."""
+    cost = model_cost(model, prompt_tokens, completion_tokens)
+    status = "ok" if ok else "error"
+    with _lock:
+        _inc("slr_llm_requests_total", provider=provider, model=model, stage=current_stage(), status=status)
+        _observe("slr_llm_request_seconds", seconds, provider=provider, model=model)
+        _inc("slr_llm_queue_wait_seconds_total", queue_wait, provider=provider)
+        _inc("slr_llm_retries_total", retries, provider=provider)
+        _inc("slr_llm_tokens_total", prompt_tokens, model=model, kind="prompt")
+        _inc("slr_llm_tokens_total", completion_tokens, model=model, kind="completion")
+        _inc("slr_llm_cost_usd_total", cost, model=model)
+        totals = _review_entry()
+        totals["llm_calls"] += 1
+        totals["llm_errors"] += 0 if ok else 1
+        totals["llm_seconds"] += seconds
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["cost_usd"] += cost
+        totals["queue_wait_seconds"] += queue_wait
+        totals["retries"] += retries
+
+
+def record_search_call(source, seconds, queue_wait=0.0, retries=0, ok=True):
+    """One search API page request, retries included."""
+    status = "ok" if ok else "error"
+    with _lock:
+        _inc("slr_search_requests_total", source=source, stage=current_stage(), status=status)
+        _observe("slr_search_request_seconds", seconds, source=source)
+        _inc("slr_search_queue_wait_seconds_total", queue_wait, source=source)
+        _inc("slr_search_retries_total", retries, source=source)
+        totals = _review_entry()
+        totals["search_calls"] += 1
+        totals["search_errors"] += 0 if ok else 1
+        totals["search_seconds"] += seconds
+        totals["queue_wait_seconds"] += queue_wait
+        totals["retries"] += retries
+
+
+def record_cache_lookup(cache, hit):
+    with _lock:
+        _inc("slr_cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+        totals = _review_entry()
+        totals["cache_hits" if hit else "cache_misses"] += 1
+
+
+def record_route(route, method, status, seconds):
+    with _lock:
+        _inc("slr_http_requests_total", route=route, method=method, status=status)
+        _observe("slr_http_request_seconds", seconds, route=route, method=method)
+
+
+def _round(totals):
+    return {name: round(value, 6) if isinstance(value, float) else value for name, value in totals.items()}
+
+
+def review_breakdown(review_id=None):
+    """Per-stage totals for one review ({stage: totals, "total": totals}), or for every review when None."""
+    with _lock:
+        reviews = {review: {s: dict(t) for s, t in stages.items()} for review, stages in _reviews.items()
+                   if review_id is None or review == review_id}
+    breakdown = {}
+    for review, stages in reviews.items():
+        total = {}
+        for totals in stages.values():
+            for name, value in totals.items():
+                total[name] = total.get(name, 0) + value
+        breakdown[review] = dict({s: _round(t) for s, t in stages.items()}, total=_round(total))
+    return breakdown if review_id is None else breakdown.get(review_id)
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    # repr keeps every digit (":g" rounds 12345678 to 1.23457e+07); integral values print without ".0"
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {name: {labels: list(b) for labels, b in series.items()} for name, series in _histograms.items()}
+    lines = []
+    for name, (kind, description) in _HELP.items():
+        series = counters.get(name) if kind == "counter" else histograms.get(name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series.items()):
+            if kind == "counter":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            # Bucket counts are already cumulative: _observe counts a value in every bucket it fits
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                lines.append(f"{name}_bucket{_format_labels(labels, le=f'{bound:g}')} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {value[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[-2]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,275 @@
+# mock_services.py
+# Local stand-ins for the external APIs the app calls, for offline benchmarks and development:
+#   POST /v1/chat/completions   OpenAI/DeepSeek-compatible chat completions (plain and streamed)
+#   GET  /v1/models
+#   GET  /scopus                Scopus Search API (cursor pagination)
+#   GET  /graph/v1/paper/search[/bulk]   Semantic Scholar Graph API (offset / token pagination)
+# Latency, 5xx error rate and 429 rate are configurable, and inject() queues exact faults for
+# tests. Papers come from a synthetic corpus and relevance verdicts are a deterministic function
+# of the title, so runs are reproducible.
+#
+#   python mock_services.py --port 8900 --llm-latency 0.3 --rate-limit-rate 0.05
+# then point the app at it with the environment variables printed at startup.
+import re
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+_TOPICS = ["large language models", "code review", "software testing", "program repair", "requirements engineering",
+           "static analysis", "continuous integration", "technical debt", "code generation", "defect prediction"]
+_WORDS = ("we propose evaluate approach results show model dataset performance study empirical tool "
+          "developers accuracy benchmark method analysis framework improve prompt automated").split()
+_TITLE_RE = re.compile(r"titled '(.*)' is relevant")
+_BATCH_ITEM_RE = re.compile(r"^(\d+)\. Title: (.*)$", re.MULTILINE)
+
+
+def synthetic_paper(index):
+    """The corpus paper at `index`, as a Semantic Scholar record."""
+    rng = random.Random(index)
+    topic = _TOPICS[index % len(_TOPICS)]
+    return {
+        "paperId": f"mock{index}",
+        "title": f"A study {index} of {topic} with {rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+        "abstract": f"This paper on {topic}: " + " ".join(rng.choice(_WORDS) for _ in range(60)) + ".",
+        "year": 2018 + index % 7,
+        "venue": "Journal of Mock Studies" if index % 2 else "Mock Conference",
+        "authors": [{"name": f"Author {index % 97}"}, {"name": f"Author {index % 89}"}],
+        "externalIds": {"DOI": f"10.5555/mock.{index}"},
+        "url": f"https://example.org/papers/{index}",
+        "openAccessPdf": {"url": f"https://example.org/papers/{index}.pdf"} if index % 3 == 0 else None,
+    }
+
+
+def _scopus_entry(index):
+    paper = synthetic_paper(index)
+    return {"dc:title": paper["title"], "dc:creator": paper["authors"][0]["name"],
+            "prism:coverDate": f"{paper['year']}-01-01", "prism:publicationName": paper["venue"],
+            "prism:doi": paper["externalIds"]["DOI"], "dc:identifier": f"SCOPUS_ID:{index}",
+            "prism:aggregationType": "Journal", "openaccess": "1" if index % 3 == 0 else "0",
+            "link": [{"@ref": "scopus", "@href": paper["url"]}]}
+
+
+def is_relevant(title):
+    """The mock model's verdict: two thirds of titles are relevant."""
+    return zlib.crc32(title.encode("utf-8")) % 3 != 0
+
+
+class MockServices(ThreadingHTTPServer):
+    """All mock APIs on one local port. Counters in `requests` are keyed by endpoint and outcome."""
+    daemon_threads = True
+
+    def __init__(self, port=0, llm_latency=0.0, search_latency=0.0, jitter=0.5, error_rate=0.0,
+                 rate_limit_rate=0.0, corpus_size=10000, completion_words=60, seed=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.llm_latency = llm_latency
+        self.search_latency = search_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.corpus_size = corpus_size
+        self.completion_words = completion_words
+        self.requests = {}
+        self._queued_faults = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def env(self):
+        """Environment variables that point the app (llm_client, agents3) at these mocks."""
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/v1", "OPENAI_API_KEY": "mock-key",
+            "DEEPSEEK_BASE_URL": f"{self.url}/v1", "DEEPSEEK_API_KEY": "mock-key",
+            "SCOPUS_API_URL": f"{self.url}/scopus", "SCOPUS_API_KEY": "mock-key",
+            "SEMANTIC_SCHOLAR_API_URL": f"{self.url}/graph/v1", "SEMANTIC_SCHOLAR_API_KEY": "mock-key",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, endpoint, outcome):
+        with self._lock:
+            key = f"{endpoint}:{outcome}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def reset(self):
+        """Clears the request counters and any queued faults."""
+        with self._lock:
+            self.requests.clear()
+            self._queued_faults.clear()
+
+    def inject(self, status, count=1):
+        """Answers the next `count` LLM or search requests with `status` (e.g. 429, 500 or 401) before random faults."""
+        with self._lock:
+            self._queued_faults.extend([status] * count)
+
+    def fault(self):
+        """Draws the injected outcome of one request: None or an error status."""
+        with self._lock:
+            if self._queued_faults:
+                return self._queued_faults.pop(0)
+            draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def delay(self, mean):
+        if mean > 0:
+            with self._lock:
+                factor = 1 + self.jitter * (2 * self._random.random() - 1)
+            time.sleep(mean * factor)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle on, keep-alive clients stall ~40 ms on each
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        encoded = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _injected_fault(self, endpoint):
+        status = self.server.fault()
+        if status is None:
+            return False
+        self.server.count(endpoint, status)
+        if status == 429:
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)"}}, {"Retry-After": "0.05"})
+        else:
+            self._send_json(status, {"error": {"message": f"HTTP {status} (mock)"}})
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path.endswith("/models"):
+            return self._send_json(200, {"data": [{"id": "gpt-3.5-turbo"}, {"id": "deepseek-chat"}]})
+        if url.path.endswith("/scopus"):
+            endpoint = "scopus"
+        elif url.path.endswith("/paper/search") or url.path.endswith("/paper/search/bulk"):
+            endpoint = "semanticscholar"
+        else:
+            return self._send_json(404, {"error": "not found"})
+        self.server.delay(self.server.search_latency)
+        if self._injected_fault(endpoint):
+            return
+        self.server.count(endpoint, 200)
+        total = self.server.corpus_size
+        if endpoint == "scopus":
+            start = 0 if query.get("cursor", "*") == "*" else int(query["cursor"])
+            end = min(start + int(query.get("count", 25)), total)
+            return self._send_json(200, {"search-results": {
+                "opensearch:totalResults": str(total), "cursor": {"@current": query.get("cursor"), "@next": str(end)},
+                "entry": [_scopus_entry(i) for i in range(start, end)]}})
+        if url.path.endswith("/bulk"):
+            start = int(query.get("token") or 0)
+            end = min(start + 1000, total)
+            body = {"total": total, "data": [synthetic_paper(i) for i in range(start, end)]}
+            if end < total:
+                body["token"] = str(end)
+            return self._send_json(200, body)
+        start = int(query.get("offset", 0))
+        end = min(start + int(query.get("limit", 10)), total)
+        body = {"total": total, "offset": start, "data": [synthetic_paper(i) for i in range(start, end)]}
+        if end < total:
+            body["next"] = end
+        return self._send_json(200, body)
+
+    def do_POST(self):
+        if not urlparse(self.path).path.endswith("/chat/completions"):
+            return self._send_json(404, {"error": "not found"})
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.delay(self.server.llm_latency)
+        if self._injected_fault("chat"):
+            return
+        self.server.count("chat", 200)
+        prompt = request["messages"][-1]["content"]
+        reply = self._reply(prompt)
+        if request.get("stream"):
+            return self._stream(reply)
+        prompt_tokens = sum(len(m.get("content") or "") for m in request["messages"]) // 4
+        completion_tokens = len(reply) // 4
+        self._send_json(200, {
+            "id": "mock", "object": "chat.completion", "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens}})
+
+    def _reply(self, prompt):
+        batch = _BATCH_ITEM_RE.findall(prompt)
+        if batch:
+            return "\n".join(f"{number}: {'Relevant' if is_relevant(title) else 'Not Relevant'}"
+                             for number, title in batch)
+        single = _TITLE_RE.search(prompt)
+        if single:
+            return "Relevant" if is_relevant(single.group(1)) else "Not Relevant"
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+        return " ".join(rng.choice(_WORDS) for _ in range(self.server.completion_words)).capitalize() + "."
+
+    def _stream(self, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = reply.split(" ")
+        events = [{"choices": [{"delta": {"content": word if i == 0 else " " + word}}]} for i, word in enumerate(words)]
+        for data in [json.dumps(event) for event in events] + ["[DONE]"]:
+            chunk = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve mock LLM and search APIs locally.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="mean seconds per chat completion")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="mean seconds per search page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--corpus-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    services = MockServices(args.port, args.llm_latency, args.search_latency, error_rate=args.error_rate,
+                            rate_limit_rate=args.rate_limit_rate, corpus_size=args.corpus_size)
+    for name, value in services.env().items():
+        print(f"export {name}={value}")
+    try:
+        services.serve_forever()
+    except KeyboardInterrupt:
+        services.server_close()
+
+
+if __name__ == "__main__":
+    main()
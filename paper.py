@@ -0,0 +1,184 @@
+# paper.py
+# Canonical paper record shared by the search agents (agents3), screening and answering (agents4),
+# summaries (agents) and the Flask routes. Each source has an adapter; on the wire a Paper is
+# serialised with the Scopus-style keys the React tables already read (creator, year, link, ...).
+import json
+from flask.json.provider import DefaultJSONProvider
+
+MISSING = "Not Available"
+
+
+def _clean(value):
+    """Normalises the various "no value" markers sources use to an empty string."""
+    if value is None or value == MISSING:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+class Paper:
+    """One bibliographic record. Uses __slots__ to keep large corpora compact in memory."""
+    __slots__ = ("title", "authors", "year", "url", "venue", "doi", "identifier", "paper_type", "volume",
+                 "affiliation_country", "affiliation_name", "open_access", "abstract", "pdf_url", "sources")
+
+    def __init__(self, title="", authors="", year="", url="", venue="", doi="", identifier="", paper_type="",
+                 volume="", affiliation_country="", affiliation_name="", open_access=False, abstract="",
+                 pdf_url="", sources=None):
+        self.title = _clean(title)
+        self.authors = _clean(authors)
+        self.year = _clean(year)
+        self.url = _clean(url)
+        self.venue = _clean(venue)
+        self.doi = _clean(doi)
+        self.identifier = _clean(identifier)
+        self.paper_type = _clean(paper_type)
+        self.volume = _clean(volume)
+        self.affiliation_country = _clean(affiliation_country)
+        self.affiliation_name = _clean(affiliation_name)
+        self.open_access = bool(open_access)
+        self.abstract = _clean(abstract)
+        self.pdf_url = _clean(pdf_url)
+        self.sources = list(sources or [])
+
+    def __repr__(self):
+        return f"Paper(title={self.title!r}, year={self.year!r}, doi={self.doi!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Paper):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    # --- Source adapters ---
+    @classmethod
+    def from_scopus(cls, entry):
+        """From a raw Scopus Search API entry."""
+        affiliations = entry.get("affiliation") or []
+        return cls(
+            title=entry.get("dc:title"),
+            authors=entry.get("dc:creator"),
+            year=(entry.get("prism:coverDate") or "").split("-")[0],
+            url=next((link["@href"] for link in entry.get("link", []) if link.get("@ref") == "scopus"), ""),
+            venue=entry.get("prism:publicationName"),
+            doi=entry.get("prism:doi"),
+            identifier=entry.get("dc:identifier"),
+            paper_type=entry.get("prism:aggregationType"),
+            volume=entry.get("prism:volume"),
+            affiliation_country=next((a.get("affiliation-country") for a in affiliations), ""),
+            affiliation_name=next((a.get("affilname") for a in affiliations), ""),
+            open_access=entry.get("openaccess", "0") == "1",
+            sources=["scopus"],
+        )
+
+    @classmethod
+    def from_semantic_scholar(cls, entry):
+        """From a raw Semantic Scholar Graph API paper."""
+        venue = entry.get("venue") or ""
+        pdf_url = (entry.get("openAccessPdf") or {}).get("url", "")
+        return cls(
+            title=entry.get("title") or "No title",
+            authors=", ".join(author.get("name", "") for author in entry.get("authors") or []),
+            year=entry.get("year") or "",
+            url=entry.get("url"),
+            venue=venue,
+            doi=(entry.get("externalIds") or {}).get("DOI", ""),
+            identifier=entry.get("paperId"),
+            paper_type="Journal" if "journal" in venue.lower() else "Conference",
+            open_access=bool(pdf_url),
+            abstract=entry.get("abstract"),
+            pdf_url=pdf_url,
+            sources=["semanticscholar"],
+        )
+
+    @classmethod
+    def from_scholarly(cls, pub):
+        """From a scholarly (Google Scholar) publication."""
+        bib = pub.get("bib", {})
+        return cls(
+            title=bib.get("title"),
+            authors=", ".join(bib["author"]) if isinstance(bib.get("author"), list) else bib.get("author"),
+            year=bib.get("pub_year"),
+            url=pub.get("pub_url"),
+            venue=bib.get("journal") or bib.get("venue"),
+            doi=pub.get("doi"),
+            # Simplistic categorization
+            paper_type="Journal" if "journal" in bib else "Conference" if "conference" in bib else "Primary Study",
+            abstract=bib.get("abstract"),
+            pdf_url=pub.get("eprint_url"),
+            sources=["scholar"],
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """From a wire dict (as sent back by the frontend) or a legacy Semantic Scholar / scholarly-shaped dict."""
+        if isinstance(data, Paper):
+            return data
+        get = data.get
+        return cls(
+            title=get("title"),
+            authors=get("creator") or get("author") or get("authors"),
+            year=get("year") or get("pub_year"),
+            url=get("link") or get("publication_url") or get("url"),
+            venue=get("publicationName") or get("journal_name") or get("venue"),
+            doi=get("doi"),
+            identifier=get("identifier"),
+            paper_type=get("aggregationType") or get("paper_type"),
+            volume=get("volume"),
+            affiliation_country=get("affiliation-country"),
+            affiliation_name=get("affilname"),
+            open_access=get("openaccess") or get("open_access"),
+            abstract=get("abstract"),
+            pdf_url=get("pdf_url"),
+            sources=get("sources"),
+        )
+
+    def to_dict(self):
+        """Wire format: the Scopus-style keys the UI tables read, plus abstract, pdf_url and sources."""
+        return {
+            "title": self.title or MISSING,
+            "creator": self.authors or MISSING,
+            "year": self.year or MISSING,
+            "link": self.url or MISSING,
+            "publicationName": self.venue or MISSING,
+            "doi": self.doi or MISSING,
+            "identifier": self.identifier or self.doi or self.url or MISSING,
+            "aggregationType": self.paper_type or MISSING,
+            "volume": self.volume or MISSING,
+            "affiliation-country": self.affiliation_country or MISSING,
+            "affilname": self.affiliation_name or MISSING,
+            "openaccess": self.open_access,
+            "abstract": self.abstract,
+            "pdf_url": self.pdf_url,
+            "sources": self.sources,
+        }
+
+
+def papers_from_dicts(items):
+    """Converts request payload entries to Papers, skipping anything that isn't a dict or Paper."""
+    papers = []
+    for item in items or []:
+        if isinstance(item, Paper):
+            papers.append(item)
+        elif isinstance(item, dict):
+            papers.append(Paper.from_dict(item))
+        else:
+            print(f"Skipping invalid paper entry: {item}")
+    return papers
+
+
+def json_default(obj):
+    """`default` hook for json.dumps that serialises Papers."""
+    if isinstance(obj, Paper):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def papers_to_json(papers):
+    return json.dumps([paper.to_dict() for paper in papers], ensure_ascii=False, separators=(",", ":"))
+
+
+class PaperJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that lets routes jsonify Papers directly."""
+    @staticmethod
+    def default(obj):
+        if isinstance(obj, Paper):
+            return obj.to_dict()
+        return DefaultJSONProvider.default(obj)
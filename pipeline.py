@@ -0,0 +1,315 @@
+# pipeline.py
+# Headless end-to-end review runner, usable as a CLI or a Python API:
+#   research questions -> search string -> search -> screening -> answers -> summaries -> LaTeX
+# Screening starts on each search page as soon as it arrives, many reviews run concurrently under
+# one shared budget of in-flight API requests, and every finished stage is checkpointed to JSON so
+# a crashed or interrupted run resumes where it stopped.
+#
+#   python pipeline.py reviews.json --out runs/ --parallel-reviews 4 --max-concurrency 16
+#
+# reviews.json holds a list of review configs (or one per line), e.g.
+#   {"id": "llm-code-review", "objective": "...", "num_questions": 3, "source": "semanticscholar",
+#    "start_year": 2020, "limit": 200, "model_name": "gpt-3.5-turbo", "prescreen": true}
+# Optional "research_questions" (list of strings) and "search_string" skip the generating stages;
+# "fulltext": true ingests the relevant papers' open-access PDFs before answering.
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader
+
+from agents import (build_abstract_prompt, build_introduction_prompt, generate_abstract_llm,
+                    generate_introduction_summary_llm, generate_research_questions_and_purpose,
+                    generate_summary_conclusion_llm)
+from agents2 import generate_search_string_llm
+from agents3 import (SEARCH_SOURCES, SearchAPIError, iter_elsevier_pages, iter_semantic_scholar_pages, prefetch_pages,
+                     search_federated)
+from agents4 import filter_papers_llm, generate_response_llm
+from fulltext import ingest_fulltext
+from incremental import paper_fingerprint
+from llm_cache import make_key
+from metrics import bind_stage, stage
+from paper import Paper
+from rate_limiter import concurrency_budget, review_context, submit_in_context
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# Outbound requests in flight across all reviews of a run, and reviews run at once.
+PIPELINE_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "16"))
+PIPELINE_PARALLEL_REVIEWS = int(os.getenv("PIPELINE_PARALLEL_REVIEWS", "4"))
+# Screening threads per review; the shared budget still caps the total.
+PIPELINE_SCREENING_WORKERS = 4
+TEMPLATES_DIR = Path(__file__).parent / 'templates'
+
+STAGES = ("research_questions", "search_string", "search", "screening", "fulltext", "answers", "summaries", "latex")
+
+
+class PipelineError(Exception):
+    def __init__(self, stage, message):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+def _check(stage, result):
+    """Raises PipelineError for the agents' {"error": ...} results."""
+    if isinstance(result, dict) and "error" in result:
+        raise PipelineError(stage, result["error"])
+    return result
+
+
+def review_id(config):
+    return str(config.get("id") or make_key(config)[:12])
+
+
+class Checkpoint:
+    """JSON file holding a review's config and the output of each finished stage. Writes are atomic."""
+    def __init__(self, path, config):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.data = {"config": config, "stages": {}, "verdicts": {}}
+        if self.path.exists():
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+            if saved.get("config") == config:
+                self.data = saved
+            else:
+                print(f"[PIPELINE] Config for {self.path.stem} changed; starting it over")
+
+    def get(self, stage):
+        return self.data["stages"].get(stage)
+
+    def done(self, stage, output):
+        with self._lock:
+            self.data["stages"][stage] = output
+            self._write()
+        return output
+
+    def add_verdicts(self, records):
+        """Per-paper screening records, keyed by paper fingerprint, saved as pages finish."""
+        with self._lock:
+            self.data["verdicts"].update(records)
+            self._write()
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+
+def _iter_search_pages(config, search_string):
+    """Pages of Papers for the configured source; sources without paging come back as one page."""
+    source = config.get("source", "scopus").lower()
+    start_year = config.get("start_year", datetime.datetime.now().year - 1)
+    limit = int(config.get("limit", 50))
+    if source == "semanticscholar":
+        return prefetch_pages(iter_semantic_scholar_pages(search_string, start_year, limit))
+    if source == "scopus":
+        return prefetch_pages(iter_elsevier_pages(search_string, start_year, start_year, limit))
+    if source == "all":
+        return iter([_check("search", search_federated(search_string, start_year, limit))["papers"]])
+    if source not in SEARCH_SOURCES:
+        raise PipelineError("search", f"Unknown source: {source}")
+    return iter([_check("search", SEARCH_SOURCES[source](search_string, start_year, limit))])
+
+
+def _search_and_screen(config, checkpoint, search_string, model_name, questions):
+    """Screens each search page while the following pages are still being fetched.
+
+    Verdicts already in the checkpoint are reused, so a resumed run only screens new papers.
+    Returns (papers, screening records in paper order).
+    """
+    verdicts = checkpoint.data["verdicts"]
+    options = dict(batch_size=config.get("batch_size"), prescreen=bool(config.get("prescreen")),
+                   research_questions=questions,
+                   max_workers=config.get("screening_workers", PIPELINE_SCREENING_WORKERS))
+
+    def _screen(page):
+        pending = [paper for paper in page if paper_fingerprint(paper) not in verdicts]
+        stats = {}
+        if pending:
+            filter_papers_llm(search_string, pending, model_name, stats=stats, **options)
+        records = {paper_fingerprint(paper): record for paper, record in zip(pending, stats.get("per_paper", []))
+                   if record["relevant"] is not None and record["mode"] != "cancelled"}
+        checkpoint.add_verdicts(records)
+        return len(pending)
+
+    searched = checkpoint.get("search")
+    papers = [Paper.from_dict(p) for p in searched] if searched is not None else []
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-screening") as executor:
+        if searched is not None:
+            futures = [submit_in_context(executor, _screen, papers)]
+        else:
+            futures = []
+            try:
+                for page in _iter_search_pages(config, search_string):
+                    papers.extend(page)
+                    futures.append(submit_in_context(executor, _screen, page))
+            except SearchAPIError as e:
+                raise PipelineError("search", e.message)
+            checkpoint.done("search", [paper.to_dict() for paper in papers])
+        screened = sum(future.result() for future in futures)
+    print(f"[PIPELINE] {review_id(config)}: {len(papers)} papers, {screened} screened, "
+          f"{len(papers) - screened} verdicts reused")
+    return papers, [verdicts.get(paper_fingerprint(paper)) for paper in papers]
+
+
+def _answer_questions(questions, relevant, model_name, checkpoint):
+    answers = checkpoint.get("answers") or {}
+    missing = [q for q in questions if q not in answers]
+
+    def _answer(question):
+        text = generate_response_llm(question, relevant, model_name)
+        if text.startswith("An error occurred"):
+            raise PipelineError("answers", text)
+        return question, text
+
+    with ThreadPoolExecutor(max_workers=max(1, min(4, len(missing))), thread_name_prefix="pipeline-answers") as executor:
+        for question, text in (future.result() for future in [submit_in_context(executor, _answer, q)
+                                                              for q in missing]):
+            answers[question] = text
+            checkpoint.done("answers", answers)
+    return [{"question": q, "answer": answers[q]} for q in questions]
+
+
+def render_latex(summaries):
+    """Renders templates/latex_template.tex with the abstract, introduction and conclusion."""
+    environment = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)))
+    return environment.get_template("latex_template.tex").render(
+        abstract=summaries.get("abstract", ""), introduction=summaries.get("introduction", ""),
+        conclusion=summaries.get("conclusion", ""))
+
+
+def run_review(config, output_dir):
+    """Runs (or resumes) one review. Returns a result dict; failures raise PipelineError."""
+    rid = review_id(config)
+    output_dir = Path(output_dir)
+    checkpoint = Checkpoint(output_dir / f"{rid}.json", config)
+    model_name = config.get("model_name", DEFAULT_MODEL)
+    objective = config["objective"]
+    started = time.perf_counter()
+
+    # Each bind_stage below attributes the following calls to that stage in /api/metrics/reviews;
+    # leaving `stage` restores whatever the caller had bound.
+    with review_context(rid), stage("pipeline.research_questions"):
+        research_questions = checkpoint.get("research_questions")
+        if research_questions is None:
+            if config.get("research_questions"):
+                research_questions = [{"question": q, "purpose": ""} for q in config["research_questions"]]
+            else:
+                generated = _check("research_questions", generate_research_questions_and_purpose(
+                    objective, int(config.get("num_questions", 3)), model_name))
+                research_questions = generated["research_questions"]
+            checkpoint.done("research_questions", research_questions)
+        questions = [item["question"] for item in research_questions]
+
+        bind_stage("pipeline.search_string")
+        search_string = checkpoint.get("search_string")
+        if search_string is None:
+            search_string = config.get("search_string") or _check(
+                "search_string", generate_search_string_llm(objective, questions, model_name))
+            checkpoint.done("search_string", search_string)
+
+        bind_stage("pipeline.screening")
+        screening = checkpoint.get("screening")
+        if screening is None:
+            papers, records = _search_and_screen(config, checkpoint, search_string, model_name, questions)
+            relevant_positions = [i for i, record in enumerate(records) if record and record["relevant"]]
+            unscreened = sum(1 for record in records if record is None)
+            if unscreened:
+                raise PipelineError("screening", f"{unscreened} papers could not be screened; re-run to retry them")
+            screening = checkpoint.done("screening", {"total": len(papers), "relevant": relevant_positions})
+        papers = [Paper.from_dict(p) for p in checkpoint.get("search")]
+        relevant = [papers[i] for i in screening["relevant"]]
+
+        if config.get("fulltext") and checkpoint.get("fulltext") is None:
+            # Open-access PDFs of the relevant papers; answers then quote their best-matching passages
+            bind_stage("pipeline.fulltext")
+            checkpoint.done("fulltext", ingest_fulltext(relevant))
+
+        bind_stage("pipeline.answers")
+        answers = _answer_questions(questions, relevant, model_name, checkpoint)
+
+        bind_stage("pipeline.summaries")
+        summaries = checkpoint.get("summaries") or {}
+        if "abstract" not in summaries:
+            summaries["abstract"] = _check("summaries", generate_abstract_llm(
+                build_abstract_prompt(questions, objective, search_string), model_name))
+            checkpoint.done("summaries", summaries)
+        if "conclusion" not in summaries:
+            summaries["conclusion"] = _check("summaries", generate_summary_conclusion_llm(relevant, model_name))
+            checkpoint.done("summaries", summaries)
+        if "introduction" not in summaries:
+            summaries["introduction"] = _check("summaries", generate_introduction_summary_llm(
+                build_introduction_prompt(len(papers), len(relevant), search_string, objective, questions, answers),
+                model_name))
+            checkpoint.done("summaries", summaries)
+
+        latex_path = output_dir / f"{rid}.tex"
+        latex_path.write_text(render_latex(summaries), encoding="utf-8")
+        checkpoint.done("latex", str(latex_path))
+
+    return {"id": rid, "status": "succeeded", "search_string": search_string, "total_papers": len(papers),
+            "relevant_papers": len(relevant), "latex": str(latex_path),
+            "elapsed": round(time.perf_counter() - started, 3)}
+
+
+def run_reviews(configs, output_dir, max_concurrency=None, parallel_reviews=None):
+    """Runs many reviews concurrently; every outbound request counts against one shared budget.
+
+    Returns one result per config, in order. A failed review reports {"status": "failed", "stage", "error"}
+    and keeps its checkpoint, so running the same configs again resumes it.
+    """
+    budget = threading.BoundedSemaphore(max_concurrency or PIPELINE_MAX_CONCURRENCY)
+
+    def _run(config):
+        try:
+            return run_review(config, output_dir)
+        except PipelineError as e:
+            print(f"[PIPELINE] {review_id(config)} failed at {e.stage}: {e}")
+            return {"id": review_id(config), "status": "failed", "stage": e.stage, "error": str(e)}
+        except Exception as e:
+            print(f"[PIPELINE] {review_id(config)} failed: {e}")
+            return {"id": review_id(config), "status": "failed", "stage": None, "error": str(e)}
+
+    with concurrency_budget(budget):
+        with ThreadPoolExecutor(max_workers=max(1, parallel_reviews or PIPELINE_PARALLEL_REVIEWS),
+                                thread_name_prefix="pipeline") as executor:
+            return [future.result() for future in [submit_in_context(executor, _run, c) for c in configs]]
+
+
+def load_configs(path):
+    """Review configs from a JSON list, a single JSON object, or JSON lines."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    try:
+        loaded = json.loads(text)
+        return loaded if isinstance(loaded, list) else [loaded]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run systematic literature reviews headlessly.")
+    parser.add_argument("configs", help="JSON (or JSON lines) file of review configs")
+    parser.add_argument("--out", default="runs", help="directory for checkpoints and .tex output")
+    parser.add_argument("--max-concurrency", type=int, default=PIPELINE_MAX_CONCURRENCY,
+                        help="API requests in flight across all reviews")
+    parser.add_argument("--parallel-reviews", type=int, default=PIPELINE_PARALLEL_REVIEWS,
+                        help="reviews run at the same time")
+    parser.add_argument("--model", help="model for reviews that don't set model_name")
+    args = parser.parse_args(argv)
+
+    configs = load_configs(args.configs)
+    if args.model:
+        configs = [dict({"model_name": args.model}, **config) for config in configs]
+    results = run_reviews(configs, args.out, args.max_concurrency, args.parallel_reviews)
+    print(json.dumps(results, indent=2))
+    return 0 if all(result["status"] == "succeeded" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+# rate_limiter.py
+# Process-wide client-side rate limiting for every outbound API call (LLM providers and search APIs).
+# All reviews served by this process share one key per provider, so each (provider, key) gets a
+# requests-per-minute and a tokens-per-minute bucket, and waiting callers are served in weighted
+# fair order per review: a big screening job queues behind other reviews' requests instead of
+# draining the quota first.
+import os
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+
+def _per_minute(name, legacy_per_second=None):
+    value = os.getenv(name)
+    if value:
+        return float(value)
+    # OPENAI_MAX_RPS / DEEPSEEK_MAX_RPS predate the per-minute settings
+    if legacy_per_second and os.getenv(legacy_per_second):
+        return float(os.getenv(legacy_per_second)) * 60
+    return 0.0
+
+
+# Per-minute limits per source (0 = unlimited). Set them a little under the provider's published quota.
+RATE_LIMITS = {
+    "openai": {"rpm": _per_minute("OPENAI_RPM", "OPENAI_MAX_RPS"), "tpm": _per_minute("OPENAI_TPM")},
+    "deepseek": {"rpm": _per_minute("DEEPSEEK_RPM", "DEEPSEEK_MAX_RPS"), "tpm": _per_minute("DEEPSEEK_TPM")},
+    "scopus": {"rpm": _per_minute("SCOPUS_RPM"), "tpm": 0.0},
+    "semanticscholar": {"rpm": _per_minute("S2_RPM"), "tpm": 0.0},
+    "scholar": {"rpm": _per_minute("SCHOLAR_RPM"), "tpm": 0.0},
+}
+# Seconds of quota a bucket may accumulate while idle, i.e. the largest burst allowed.
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))
+
+DEFAULT_REVIEW = "default"
+_current_review = contextvars.ContextVar("review_id", default=(DEFAULT_REVIEW, 1.0))
+
+
+def bind_review(review_id, weight=1.0):
+    """Attributes outbound calls made in the current context to a review; returns a token for unbind_review."""
+    return _current_review.set((str(review_id or DEFAULT_REVIEW), max(float(weight or 1.0), 0.01)))
+
+
+def unbind_review(token):
+    _current_review.reset(token)
+
+
+@contextmanager
+def review_context(review_id, weight=1.0):
+    """Scoped bind_review. Threads started with submit_in_context (or copy_context) inherit it."""
+    token = bind_review(review_id, weight)
+    try:
+        yield
+    finally:
+        unbind_review(token)
+
+
+def current_review():
+    return _current_review.get()[0]
+
+
+_current_budget = contextvars.ContextVar("concurrency_budget", default=None)
+
+
+@contextmanager
+def concurrency_budget(semaphore):
+    """Caps outbound requests in flight in this context (and contexts copied from it) with `semaphore`.
+
+    Used by pipeline.py to give many concurrent reviews one shared budget of open requests.
+    """
+    token = _current_budget.set(semaphore)
+    try:
+        yield
+    finally:
+        _current_budget.reset(token)
+
+
+def request_slot():
+    """Context manager held around one outbound request: a slot of the bound budget, if any."""
+    budget = _current_budget.get()
+    return budget if budget is not None else nullcontext()
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's review context into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TokenBucket:
+    """Refills at `per_minute` units per minute up to `burst_seconds` worth of capacity."""
+    def __init__(self, per_minute, burst_seconds=RATE_LIMIT_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` (clamped to capacity) is available."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def consume(self, amount):
+        # May go negative when usage turns out larger than estimated; later callers wait it off
+        self.level -= amount
+
+
+class RateLimiter:
+    """RPM/TPM limits for one (provider, key), shared by every thread of the process.
+
+    Waiting callers are ordered by weighted fair queueing: each review's requests get virtual
+    finish times spaced 1/weight apart, and the earliest finish time is served next, which
+    interleaves concurrent reviews round-robin in proportion to their weights.
+    """
+    def __init__(self, name, rpm=0.0, tpm=0.0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._review_finish = {}
+        self.waited = 0.0
+        self.granted = 0
+
+    @property
+    def unlimited(self):
+        return self.requests is None and self.tokens is None
+
+    def _wait_time(self, tokens, now):
+        wait = self.requests.wait_time(1, now) if self.requests else 0.0
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def acquire(self, tokens=0):
+        """Blocks until one request (and `tokens` tokens) may be sent; returns the seconds waited."""
+        if self.unlimited:
+            return 0.0
+        review, weight = _current_review.get()
+        started = time.monotonic()
+        with self._cond:
+            finish = max(self._virtual_time, self._review_finish.get(review, 0.0)) + 1.0 / weight
+            self._review_finish[review] = finish
+            entry = (finish, next(self._sequence))
+            heapq.heappush(self._queue, entry)
+            while True:
+                if self._queue[0] is entry:
+                    wait = self._wait_time(tokens, time.monotonic())
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._queue)
+            self._virtual_time = finish
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens and tokens:
+                self.tokens.consume(tokens)
+            if not self._queue:
+                # Idle: forget finish times so a review that was busy earlier isn't penalised later
+                self._review_finish.clear()
+            waited = time.monotonic() - started
+            self.waited += waited
+            self.granted += 1
+            self._cond.notify_all()
+        return waited
+
+    def record_usage(self, estimated, actual):
+        """Corrects the token bucket once a response reports how many tokens a request really used."""
+        if self.tokens and actual is not None and actual != estimated:
+            with self._cond:
+                self.tokens.consume(actual - estimated)
+                self._cond.notify_all()
+
+    def stats(self):
+        return {"requests": self.granted, "waited_seconds": round(self.waited, 3),
+                "queued": len(self._queue),
+                "rpm": self.requests.rate * 60 if self.requests else None,
+                "tpm": self.tokens.rate * 60 if self.tokens else None}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(source, api_key=None):
+    """Returns the shared limiter for a source (a RATE_LIMITS name) and API key."""
+    key_id = hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:8] if api_key else ""
+    with _limiters_lock:
+        limiter = _limiters.get((source, key_id))
+        if limiter is None:
+            limits = RATE_LIMITS.get(source, {})
+            limiter = _limiters[(source, key_id)] = RateLimiter(source, limits.get("rpm", 0.0), limits.get("tpm", 0.0))
+    return limiter
+
+
+def rate_limiter_stats():
+    with _limiters_lock:
+        return {f"{source}:{key_id}" if key_id else source: limiter.stats()
+                for (source, key_id), limiter in _limiters.items() if not limiter.unlimited}
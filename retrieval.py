@@ -0,0 +1,135 @@
+# retrieval.py
+# Local, CPU-only lexical scoring of papers against queries (search strings, research questions).
+# Used to pre-screen papers before paid LLM relevance checks and to pick the papers
+# that fit into an answer prompt.
+import math
+import re
+from collections import Counter
+
+# Common English words plus the Boolean operators that appear in search strings.
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how in into is it its
+may more most not of on or our over such than that the their them then there these they this those
+through to under using via was we were what when where which while who why will with within without
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric terms without stopwords, with a light plural strip."""
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", str(text or "").lower()):
+        if len(term) < 2 or term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def paper_text(paper):
+    """The text a paper is scored on: its title and, when the source supplied one, its abstract."""
+    return f"{paper.title}\n{paper.abstract}" if paper.abstract else paper.title
+
+
+class TfidfScorer:
+    """TF-IDF cosine similarity between a fixed set of documents and arbitrary queries.
+
+    Document weights are kept as sparse per-document dicts; scoring builds a dense
+    documents x query-terms matrix with NumPy, which stays small because queries are short.
+    """
+    def __init__(self, documents):
+        self.doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        document_frequency = Counter()
+        for terms in self.doc_terms:
+            document_frequency.update(terms.keys())
+        n = len(self.doc_terms)
+        self._n = n
+        self.idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        # Sublinear term frequency (1 + log tf) damps repeated words in long abstracts
+        self.doc_weights = [{term: (1 + math.log(tf)) * self.idf[term] for term, tf in terms.items()}
+                            for terms in self.doc_terms]
+        self.doc_norms = [math.sqrt(sum(w * w for w in weights.values())) or 1.0 for weights in self.doc_weights]
+
+    def _idf(self, term):
+        return self.idf.get(term, math.log(1 + self._n) + 1)
+
+    def score(self, queries):
+        """Returns a NumPy array with each document's best cosine similarity over `queries`."""
+        import numpy as np
+
+        query_weights = []
+        for query in queries:
+            counts = Counter(tokenize(query))
+            if counts:
+                query_weights.append({term: (1 + math.log(tf)) * self._idf(term) for term, tf in counts.items()})
+        if not query_weights or not self.doc_weights:
+            return np.zeros(len(self.doc_weights))
+
+        vocabulary = sorted({term for weights in query_weights for term in weights})
+        column = {term: i for i, term in enumerate(vocabulary)}
+        docs = np.zeros((len(self.doc_weights), len(vocabulary)))
+        for row, weights in enumerate(self.doc_weights):
+            for term, weight in weights.items():
+                i = column.get(term)
+                if i is not None:
+                    docs[row, i] = weight
+        queries_matrix = np.zeros((len(query_weights), len(vocabulary)))
+        for row, weights in enumerate(query_weights):
+            for term, weight in weights.items():
+                queries_matrix[row, column[term]] = weight
+
+        similarities = docs @ queries_matrix.T
+        similarities /= np.asarray(self.doc_norms)[:, None]
+        similarities /= np.linalg.norm(queries_matrix, axis=1)[None, :]
+        return similarities.max(axis=1)
+
+
+class Bm25Index:
+    """Okapi BM25 over a fixed set of documents, with postings stored as NumPy arrays.
+
+    Build once per paper set (see agents4.get_paper_index) and query many times.
+    """
+    def __init__(self, documents, k1=1.5, b=0.75):
+        import numpy as np
+
+        doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.size = len(doc_terms)
+        lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=float)
+        average_length = lengths.mean() if self.size and lengths.mean() > 0 else 1.0
+        # Per-document length normalisation is fixed at build time
+        self._length_norm = k1 * (1 - b + b * lengths / average_length)
+        self._k1 = k1
+
+        postings = {}
+        for doc_id, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+        self.postings = {}
+        for term, (doc_ids, tfs) in postings.items():
+            df = len(doc_ids)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            self.postings[term] = (np.array(doc_ids), np.array(tfs, dtype=float), idf)
+
+    def scores(self, query):
+        """BM25 score of every document for `query`, as a NumPy array."""
+        import numpy as np
+
+        scores = np.zeros(self.size)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs, idf = posting
+            scores[doc_ids] += idf * tfs * (self._k1 + 1) / (tfs + self._length_norm[doc_ids])
+        return scores
+
+    def rank(self, query, top_k=None):
+        """Document ids ordered by descending score; documents with score 0 come last in input order."""
+        import numpy as np
+
+        scores = self.scores(query)
+        # Stable sort keeps input order among ties
+        order = np.argsort(-scores, kind="stable")
+        return order[:top_k].tolist() if top_k else order.tolist()
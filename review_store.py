@@ -0,0 +1,300 @@
+# review_store.py
+# Server-side review sessions, so pipeline steps reference data by session id instead of the
+# frontend posting every paper list back on each request. A session holds its search results
+# (in order), the screening verdict of each paper, answers to research questions and summaries.
+# Stored in a local SQLite file; sessions untouched for REVIEW_SESSION_TTL are purged.
+# Verdicts, answers and summaries carry the fingerprint of the inputs they were computed from,
+# so incremental.py can tell which of them are still valid after the review changes.
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+
+from paper import Paper
+
+REVIEW_STORE_PATH = os.getenv("REVIEW_STORE_PATH", str(Path(__file__).parent / '.cache' / 'reviews.sqlite3'))
+REVIEW_SESSION_TTL = int(os.getenv("REVIEW_SESSION_TTL", str(30 * 24 * 3600)))  # seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY, meta TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS papers (
+    session_id TEXT NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL,
+    relevant INTEGER, screening TEXT, screening_fp TEXT,
+    PRIMARY KEY (session_id, position));
+CREATE INDEX IF NOT EXISTS papers_relevant ON papers (session_id, relevant);
+CREATE TABLE IF NOT EXISTS answers (
+    session_id TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, error INTEGER NOT NULL,
+    updated_at REAL NOT NULL, fingerprint TEXT, PRIMARY KEY (session_id, question));
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT NOT NULL, kind TEXT NOT NULL, text TEXT NOT NULL, updated_at REAL NOT NULL,
+    fingerprint TEXT, PRIMARY KEY (session_id, kind));
+"""
+_CHILD_TABLES = ("papers", "answers", "summaries")
+# Columns added after the first release of the schema: (table, column, type).
+_ADDED_COLUMNS = [("papers", "screening_fp", "TEXT"), ("answers", "fingerprint", "TEXT"),
+                  ("summaries", "fingerprint", "TEXT")]
+
+
+class SessionNotFound(LookupError):
+    def __init__(self, session_id):
+        super().__init__(f"Review session not found: {session_id}")
+        self.session_id = session_id
+
+
+class ReviewStore:
+    """Review sessions in a SQLite file. Safe to share between threads."""
+    def __init__(self, path=REVIEW_STORE_PATH, ttl=REVIEW_SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing this module never touches the filesystem
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            for table, column, column_type in _ADDED_COLUMNS:
+                if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _touch(self, conn, session_id, now=None):
+        updated = conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?",
+                               (now or time.time(), session_id)).rowcount
+        if not updated:
+            raise SessionNotFound(session_id)
+
+    def _purge_expired(self, conn, now):
+        expired = [row[0] for row in conn.execute("SELECT id FROM sessions WHERE updated_at < ?", (now - self.ttl,))]
+        for session_id in expired:
+            self._delete(conn, session_id)
+
+    def _delete(self, conn, session_id):
+        for table in _CHILD_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+        return conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+
+    # --- Sessions ---
+    def create_session(self, meta=None):
+        """Starts a session and returns its id. `meta` holds objective, search_string, research_questions..."""
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if self.ttl:
+                self._purge_expired(conn, now)
+            conn.execute("INSERT INTO sessions (id, meta, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                         (session_id, json.dumps(meta or {}, ensure_ascii=False), now, now))
+            conn.commit()
+        return session_id
+
+    def exists(self, session_id):
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def get_session(self, session_id):
+        """Session metadata with paper counts, answers and summaries (but not the papers themselves)."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT meta, created_at, updated_at FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+            if row is None:
+                raise SessionNotFound(session_id)
+            counts = conn.execute("SELECT COUNT(*), SUM(relevant = 1), SUM(relevant = 0), "
+                                  "SUM(relevant IS NULL AND screening IS NOT NULL) "
+                                  "FROM papers WHERE session_id = ?", (session_id,)).fetchone()
+            answers = [{"question": q, "answer": a, **({"error": True} if e else {})} for q, a, e in conn.execute(
+                "SELECT question, answer, error FROM answers WHERE session_id = ? ORDER BY rowid", (session_id,))]
+            summaries = dict(conn.execute("SELECT kind, text FROM summaries WHERE session_id = ?", (session_id,)))
+        return {
+            "session_id": session_id,
+            "meta": json.loads(row[0]),
+            "created_at": row[1],
+            "updated_at": row[2],
+            "total_papers": counts[0],
+            "relevant_papers": counts[1] or 0,
+            "excluded_papers": counts[2] or 0,
+            "unscreened_papers": counts[3] or 0,
+            "answers": answers,
+            "summaries": summaries,
+        }
+
+    def update_meta(self, session_id, **meta):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT meta FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise SessionNotFound(session_id)
+            merged = dict(json.loads(row[0]), **meta)
+            conn.execute("UPDATE sessions SET meta = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps(merged, ensure_ascii=False), time.time(), session_id))
+            conn.commit()
+        return merged
+
+    def delete_session(self, session_id):
+        with self._lock:
+            conn = self._connect()
+            deleted = self._delete(conn, session_id)
+            conn.commit()
+        return bool(deleted)
+
+    # --- Papers ---
+    def add_papers(self, session_id, papers, replace=False):
+        """Appends Papers, or replaces the session's papers. Returns the new total.
+
+        When replacing, papers identical to one already in the session keep its screening verdict.
+        """
+        rows = [json.dumps(paper.to_dict() if isinstance(paper, Paper) else Paper.from_dict(paper).to_dict(),
+                           ensure_ascii=False) for paper in papers]
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id)
+            previous = {}
+            if replace:
+                previous = {data: (relevant, screening, fp) for data, relevant, screening, fp in conn.execute(
+                    "SELECT data, relevant, screening, screening_fp FROM papers WHERE session_id = ?", (session_id,))}
+                conn.execute("DELETE FROM papers WHERE session_id = ?", (session_id,))
+            start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM papers WHERE session_id = ?",
+                                 (session_id,)).fetchone()[0]
+            conn.executemany("INSERT INTO papers (session_id, position, data, relevant, screening, screening_fp) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             [(session_id, start + i, data) + previous.get(data, (None, None, None))
+                              for i, data in enumerate(rows)])
+            conn.commit()
+            return start + len(rows)
+
+    def get_papers(self, session_id, relevant=None):
+        """The session's Papers in insertion order; relevant=True/False filters on the screening verdict."""
+        query = "SELECT data FROM papers WHERE session_id = ?"
+        params = [session_id]
+        if relevant is not None:
+            query += " AND relevant = ?"
+            params.append(int(bool(relevant)))
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id)
+            conn.commit()
+            rows = conn.execute(query + " ORDER BY position", params).fetchall()
+        return [Paper.from_dict(json.loads(row[0])) for row in rows]
+
+    def count_papers(self, session_id, relevant=None):
+        query = "SELECT COUNT(*) FROM papers WHERE session_id = ?"
+        params = [session_id]
+        if relevant is not None:
+            query += " AND relevant = ?"
+            params.append(int(bool(relevant)))
+        with self._lock:
+            return self._connect().execute(query, params).fetchone()[0]
+
+    def get_screening_state(self, session_id):
+        """[(Paper, screening record or None, fingerprint or None)] in get_papers() order."""
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id)
+            conn.commit()
+            rows = conn.execute("SELECT data, screening, screening_fp FROM papers WHERE session_id = ? "
+                                "ORDER BY position", (session_id,)).fetchall()
+        return [(Paper.from_dict(json.loads(data)), json.loads(screening) if screening else None, fp)
+                for data, screening, fp in rows]
+
+    def iter_screening_state(self, session_id, relevant=None, page_size=500):
+        """Yields (Paper, screening record or None) in get_papers() order, reading `page_size` rows at a time.
+
+        Only one page is held in memory, and the store isn't locked between pages.
+        """
+        query = "SELECT position, data, screening FROM papers WHERE session_id = ?"
+        params = [session_id]
+        if relevant is not None:
+            query += " AND relevant = ?"
+            params.append(int(bool(relevant)))
+        query += " AND position > ? ORDER BY position LIMIT ?"
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id)
+            conn.commit()
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._connect().execute(query, params + [last, page_size]).fetchall()
+            for position, data, screening in rows:
+                yield Paper.from_dict(json.loads(data)), json.loads(screening) if screening else None
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def record_verdicts(self, session_id, records, fingerprints=None):
+        """Stores screening records (as returned by agents4.screen_papers_llm for get_papers() order).
+
+        `fingerprints` optionally maps a record's index to the fingerprint of the inputs it was screened with.
+        """
+        fingerprints = fingerprints or {}
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id)
+            positions = [row[0] for row in conn.execute(
+                "SELECT position FROM papers WHERE session_id = ? ORDER BY position", (session_id,))]
+            updates = []
+            for record in records:
+                if record["index"] < len(positions):
+                    relevant = None if record["relevant"] is None else int(bool(record["relevant"]))
+                    updates.append((relevant, json.dumps(record, ensure_ascii=False),
+                                    fingerprints.get(record["index"]), session_id, positions[record["index"]]))
+            conn.executemany("UPDATE papers SET relevant = ?, screening = ?, screening_fp = ? "
+                             "WHERE session_id = ? AND position = ?", updates)
+            conn.commit()
+
+    # --- Answers and summaries ---
+    def save_answers(self, session_id, answers, fingerprints=None):
+        """Stores answers; `fingerprints` optionally maps each question to the fingerprint of its inputs."""
+        fingerprints = fingerprints or {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id, now)
+            conn.executemany("INSERT OR REPLACE INTO answers (session_id, question, answer, error, updated_at, "
+                             "fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+                             [(session_id, a["question"], a["answer"], int(bool(a.get("error"))), now,
+                               fingerprints.get(a["question"])) for a in answers])
+            conn.commit()
+
+    def get_answers(self, session_id):
+        return self.get_session(session_id)["answers"]
+
+    def get_answer(self, session_id, question, fingerprint=None):
+        """The stored answer to `question`, or None. With a fingerprint, only an answer computed from the same inputs."""
+        with self._lock:
+            row = self._connect().execute("SELECT answer, error, fingerprint FROM answers "
+                                          "WHERE session_id = ? AND question = ?", (session_id, question)).fetchone()
+        if row is None or (fingerprint is not None and row[2] != fingerprint):
+            return None
+        return {"question": question, "answer": row[0], **({"error": True} if row[1] else {})}
+
+    def save_summary(self, session_id, kind, text, fingerprint=None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._touch(conn, session_id, now)
+            conn.execute("INSERT OR REPLACE INTO summaries (session_id, kind, text, updated_at, fingerprint) "
+                         "VALUES (?, ?, ?, ?, ?)", (session_id, kind, text, now, fingerprint))
+            conn.commit()
+
+    def get_summary(self, session_id, kind, fingerprint=None):
+        """The stored summary of `kind`, or None. With a fingerprint, only one computed from the same inputs."""
+        with self._lock:
+            row = self._connect().execute("SELECT text, fingerprint FROM summaries WHERE session_id = ? AND kind = ?",
+                                          (session_id, kind)).fetchone()
+        if row is None or (fingerprint is not None and row[1] != fingerprint):
+            return None
+        return row[0]
+
+
+review_store = ReviewStore()
@@ -1,20 +1,43 @@
+import time
+_import_started = time.perf_counter()  # For the start-up report at the end of this module
+
 from dotenv import load_dotenv
 import os
 import tempfile
-from flask import Flask, render_template,send_file, send_from_directory, request, jsonify
+from flask import Flask, render_template,send_file, send_from_directory, request, jsonify, Response, stream_with_context, g
 import datetime
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 # Import refactored agent functions
 from agents import (
+    build_abstract_prompt,
+    build_introduction_prompt,
     generate_research_questions_and_purpose,
     generate_abstract_llm,
+    generate_abstract_llm_stream,
     generate_introduction_summary_llm,
     generate_summary_conclusion_llm
 )
 # from agents2 import generate_search_string_with_gpt # Old name
 from agents2 import generate_search_string_llm # New name
-from agents3 import fetch_papers, save_papers_to_csv, search_elsevier, search_semantic_scholar # agents3.py unchanged by this request
+from agents3 import (
+    fetch_papers, get_scholarly, scholar_ready, search_elsevier, search_semantic_scholar, search_federated,
+    iter_elsevier_pages, iter_semantic_scholar_pages, prefetch_pages, SearchAPIError
+)
 # from agents4 import filter_papers_with_gpt_turbo, generate_response_gpt4_turbo # Old names
-from agents4 import filter_papers_llm, generate_response_llm # New names
+from agents4 import filter_papers_llm, generate_response_llm, generate_response_llm_stream # New names
+from llm_client import PROVIDERS, breaker_states, provider_request
+from llm_cache import cache_stats, make_key
+from jobs import submit_job, get_job, cancel_job, list_jobs
+from paper import PaperJSONProvider, json_default, papers_from_dicts
+from review_store import review_store, SessionNotFound
+from fulltext import ingest_fulltext
+from exporters import EXPORT_FORMATS, export_records, paper_rows
+from incremental import answer_fingerprint, corpus_fingerprint, filter_session_papers, session_summary
+from rate_limiter import bind_review, unbind_review, rate_limiter_stats, submit_in_context
+from metrics import bind_stage, unbind_stage, record_route, render_prometheus, review_breakdown
+from proxy_pool import scholar_proxy_pool
 
 from flask_cors import CORS
 # import requests # Not directly used in this file after refactor
@@ -31,11 +54,102 @@ print(f"[DEBUG] DEEPSEEK_API_KEY at startup: {os.getenv('DEEPSEEK_API_KEY')}")
 # ELSEVIER_API_KEY = os.getenv("ELSEVIER_API_KEY") # Renamed for clarity, was 'key'
 
 app = Flask(__name__, static_folder='dist')
+app.json = PaperJSONProvider(app)  # Lets routes jsonify Paper records directly
 CORS(app)
 
 # Default model if not specified by the client
 DEFAULT_MODEL = "gpt-3.5-turbo"
 
+
+@app.before_request
+def _bind_review():
+    # Outbound API calls made for this request are rate limited fairly per review: the body's
+    # "review_id", an X-Review-Id header, or else the client's address. Background jobs inherit it.
+    data = request.get_json(silent=True) if request.is_json else None
+    review_id = (data.get('review_id') or data.get('session_id')) if isinstance(data, dict) else None
+    g.review_token = bind_review(review_id or request.headers.get('X-Review-Id') or request.remote_addr)
+
+
+@app.before_request
+def _start_span():
+    # Outbound calls made while handling the request are attributed to its route in /api/metrics
+    g.route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.span_started = time.perf_counter()
+    g.stage_token = bind_stage(g.route)
+
+
+@app.after_request
+def _end_span(response):
+    started = g.get('span_started')
+    if started is not None:
+        record_route(g.route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@app.teardown_request
+def _unbind_review(exc):
+    token = g.pop('review_token', None)
+    if token is not None:
+        unbind_review(token)
+    token = g.pop('stage_token', None)
+    if token is not None:
+        unbind_stage(token)
+
+# Research questions answered concurrently by /api/answer_question
+ANSWER_MAX_WORKERS = int(os.getenv("ANSWER_MAX_WORKERS", "4"))
+
+
+@app.errorhandler(SessionNotFound)
+def _session_not_found(e):
+    return jsonify({"error": str(e)}), 404
+
+
+def _session_papers(data, key, relevant=None):
+    """Papers posted under `key`, or else the papers of the request's review session."""
+    if data.get(key) or not data.get('session_id'):
+        return data.get(key, [])
+    return review_store.get_papers(data['session_id'], relevant)
+
+
+def _request_int(data, key):
+    """Optional positive integer field of a request body, or None. Raises ValueError for anything else."""
+    value = data.get(key)
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{key} must be a positive integer") from None
+    if number < 1:
+        raise ValueError(f"{key} must be a positive integer")
+    return number
+
+
+def _with_session_meta(data):
+    """The request body, with fields it leaves out (objective, search_string, ...) taken from its review session."""
+    if not data.get('session_id'):
+        return data
+    meta = review_store.get_session(data['session_id'])["meta"]
+    return dict(meta, **{key: value for key, value in data.items() if value not in (None, "", [])})
+
+
+def _is_error_answer(answer_text):
+    # generate_response_llm returns error string or actual answer
+    return "An error occurred" in answer_text or "API request failed" in answer_text or "Failed to parse" in answer_text
+
+
+def _sse_event(event, data):
+    """Formats one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n"
+
+
+def _sse_response(events):
+    # Disable proxy buffering so tokens reach the browser as they are produced
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/generate_search_string', methods=['POST'])
 def generate_search_string_route():
     data = request.json
@@ -74,67 +188,224 @@ def generate_research_questions_and_purpose_route():
 @app.route('/api/filter_papers', methods=['POST'])
 def filter_papers_route():
     data = request.json
+    try:
+        _request_int(data, 'max_workers')
+        _request_int(data, 'batch_size')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if data.get('async'):
+        return _submit_job_response(submit_job('filter_papers', _filter_papers, data))
+    return jsonify(_filter_papers(None, data))
+
+
+def _filter_papers(job, data):
     search_string = data.get('search_string', '')
-    papers = data.get('papers', [])
     model_name = data.get('model_name', DEFAULT_MODEL)
-    
-    # Use the refactored function from agents4.py
-    filtered_papers = filter_papers_llm(search_string, papers, model_name)
-    # filter_papers_llm currently doesn't explicitly return error dicts for top level,
-    # but good to be prepared if it's enhanced.
-    return jsonify({"filtered_papers": filtered_papers})
+    # Optional overrides of SCREENING_MAX_WORKERS / SCREENING_BATCH_SIZE, capped by their *_LIMIT settings
+    max_workers = _request_int(data, 'max_workers')
+    batch_size = _request_int(data, 'batch_size')
+    # Local TF-IDF pre-screening: true, or {"exclude_below": ..., "include_above": ...} to tune the cutoffs
+    prescreen = data.get('prescreen') or False
+    prescreen_options = prescreen if isinstance(prescreen, dict) else {}
+
+    options = dict(max_workers=max_workers, batch_size=batch_size,
+                   progress=job.report_progress if job else None,
+                   cancel_event=job.cancel_event if job else None,
+                   prescreen=bool(prescreen),
+                   research_questions=data.get('research_questions'),
+                   exclude_below=prescreen_options.get('exclude_below'),
+                   include_above=prescreen_options.get('include_above'))
+
+    stats = {}
+    if data.get('session_id') and not data.get('papers'):
+        # Session papers: only papers that are new or whose screening inputs changed are re-screened
+        filtered_papers, _ = filter_session_papers(data['session_id'], search_string, model_name, stats=stats, **options)
+        papers = review_store.get_papers(data['session_id'])
+    else:
+        # Use the refactored function from agents4.py; papers are screened concurrently
+        papers = papers_from_dicts(data.get('papers', []))
+        filtered_papers = filter_papers_llm(search_string, papers, model_name, stats=stats, **options)
+    # Papers whose relevance check failed are returned separately so the UI can retry them
+    unscreened_papers = [papers[record["index"]] for record in stats.get("per_paper", [])
+                         if record["relevant"] is None]
+    return {"filtered_papers": filtered_papers, "unscreened_papers": unscreened_papers, "screening": stats}
+
+
+@app.route('/api/ingest_fulltext', methods=['POST'])
+def ingest_fulltext_route():
+    # Downloads and indexes open-access PDFs so answers can quote full text; "async": true runs it as a job
+    data = request.json
+    if data.get('async'):
+        return _submit_job_response(submit_job('ingest_fulltext', _ingest_fulltext, data))
+    return jsonify(_ingest_fulltext(None, data))
+
+
+def _ingest_fulltext(job, data):
+    papers = _session_papers(data, 'papers', relevant=True)
+    return ingest_fulltext(papers, progress=job.report_progress if job else None,
+                           cancel_event=job.cancel_event if job else None)
 
 
 @app.route('/api/answer_question', methods=['POST'])
 def answer_question_route(): # Renamed for clarity
     data = request.json
     questions = data.get('questions')
-    papers_info = data.get('papers_info', [])
+    papers_info = _session_papers(data, 'papers_info', relevant=True)
     model_name = data.get('model_name', DEFAULT_MODEL)
  
     if not questions or not papers_info:
         return jsonify({"error": "Both questions and papers information are required."}), 400
+    try:
+        _request_int(data, 'max_concurrency')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    answers = []
-    for question in questions:
+    if data.get('session_id') and not data.get('papers_info'):
+        data = dict(data, papers_info=papers_info)  # Loaded once here rather than in every worker
+    if data.get('stream'):
+        return _sse_response(_stream_answers(questions, papers_info, model_name, data.get('session_id')))
+    if data.get('async'):
+        return _submit_job_response(submit_job('answer_question', _answer_questions, data))
+    return jsonify(_answer_questions(None, data))
+
+
+def _answer_questions(job, data):
+    questions = data.get('questions')
+    papers_info = data.get('papers_info', [])
+    model_name = data.get('model_name', DEFAULT_MODEL)
+    session_id = data.get('session_id')
+    fingerprints = _answer_fingerprints(questions, papers_info, model_name) if session_id else {}
+    if job:
+        job.report_progress(0, len(questions))
+
+    def _answer(question):
+        if job and job.cancelled:
+            return {"question": question, "answer": "Cancelled before this question was answered.", "error": True}
+        # Answers computed earlier from the same question, papers and model are reused
+        answer = review_store.get_answer(session_id, question, fingerprints[question]) if session_id else None
+        if answer is None or answer.get("error"):
+            answer = _answer_question(question, papers_info, model_name)
+        if job:
+            job.advance()
+        return answer
+
+    # Questions are answered concurrently; map() keeps answers in question order
+    # max_concurrency may lower ANSWER_MAX_WORKERS for a request, not raise it
+    max_workers = max(1, min(_request_int(data, 'max_concurrency') or ANSWER_MAX_WORKERS, ANSWER_MAX_WORKERS,
+                             len(questions)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="answers") as executor:
+        answers = [future.result() for future in [submit_in_context(executor, _answer, q) for q in questions]]
+    if session_id:
+        review_store.save_answers(session_id, answers, fingerprints)
+    return {"answers": answers}
+
+
+def _answer_fingerprints(questions, papers_info, model_name):
+    papers = papers_from_dicts(papers_info)
+    return {question: answer_fingerprint(question, papers, model_name) for question in questions}
+
+
+def _answer_question(question, papers_info, model_name):
+    """Answers one question; any failure is contained to that question's entry."""
+    try:
         # Use the refactored function from agents4.py
         answer_text = generate_response_llm(question, papers_info, model_name)
-        # generate_response_llm returns error string or actual answer
-        if "An error occurred" in answer_text or "API request failed" in answer_text or "Failed to parse" in answer_text:
-            answers.append({"question": question, "answer": answer_text, "error": True}) # Mark error
+    except Exception as e:
+        print(f"Error answering question '{question}': {e}")
+        answer_text = f"An error occurred while generating the response with {model_name}: {str(e)}"
+    if _is_error_answer(answer_text):
+        return {"question": question, "answer": answer_text, "error": True} # Mark error
+    return {"question": question, "answer": answer_text}
+
+
+def _stream_answers(questions, papers_info, model_name, session_id=None):
+    """SSE stream for /api/answer_question: 'token' events per delta, one 'answer' per question, then 'done'."""
+    fingerprints = _answer_fingerprints(questions, papers_info, model_name) if session_id else {}
+    answers = []
+    for index, question in enumerate(questions):
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        stored = review_store.get_answer(session_id, question, fingerprints[question]) if session_id else None
+        if stored is not None and not stored.get("error"):
+            deltas = [stored["answer"]]
         else:
-            answers.append({"question": question, "answer": answer_text})
-    
-    return jsonify({"answers": answers})
+            deltas = generate_response_llm_stream(question, papers_info, model_name)
+        for delta in deltas:
+            if ttft is None:
+                ttft = round(time.perf_counter() - started, 3)
+            parts.append(delta)
+            yield _sse_event("token", {"question_index": index, "delta": delta})
+        answer = {"question": question, "answer": "".join(parts)}
+        if _is_error_answer(answer["answer"]):
+            answer["error"] = True
+        answers.append(answer)
+        print(f"[STREAM] answer_question #{index} with {model_name}: time to first token {ttft}s, "
+              f"total {time.perf_counter() - started:.3f}s")
+        yield _sse_event("answer", dict(answer, question_index=index, ttft=ttft))
+    if session_id:
+        review_store.save_answers(session_id, answers, fingerprints)
+    yield _sse_event("done", {"answers": answers})
 
 
 @app.route('/api/generate-summary-abstract', methods=['POST'])
 def generate_summary_abstract_route(): # Renamed for clarity
     try:
-        data = request.json
+        data = _with_session_meta(request.json)
         research_questions = data.get('research_questions', 'No research questions provided.')
         objective = data.get('objective', 'No objective provided.')
         search_string = data.get('search_string', 'No search string provided.')
         model_name = data.get('model_name', DEFAULT_MODEL)
 
-        prompt = (f"Based on the research questions: '{research_questions}', the objective: '{objective}', "
-                  f"and the search string: '{search_string}', generate a comprehensive abstract.")
+        prompt = build_abstract_prompt(research_questions, objective, search_string)
 
-        summary_abstract = generate_abstract_llm(prompt, model_name)
+        session_id = data.get('session_id')
+        fingerprint = make_key("summary_abstract", prompt, model_name)
+        if data.get('stream'):
+            stored = review_store.get_summary(session_id, "summary_abstract", fingerprint) if session_id else None
+            deltas = [stored] if stored is not None else generate_abstract_llm_stream(prompt, model_name)
+            return _sse_response(_stream_summary(deltas, "summary_abstract", model_name, session_id, fingerprint))
+
+        summary_abstract = session_summary(session_id, "summary_abstract", fingerprint,
+                                           lambda: generate_abstract_llm(prompt, model_name))
         if isinstance(summary_abstract, dict) and "error" in summary_abstract:
             return jsonify(summary_abstract), 500
         return jsonify({"summary_abstract": summary_abstract})
+    except SessionNotFound:
+        raise
     except Exception as e:
         print(f"Error in generate_summary_abstract_route: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _stream_summary(deltas, result_key, model_name, session_id=None, fingerprint=None):
+    """SSE stream for summary routes: 'token' events, then 'done' with the full text under result_key (or 'error')."""
+    started = time.perf_counter()
+    ttft = None
+    parts = []
+    for delta in deltas:
+        if isinstance(delta, dict) and "error" in delta:
+            yield _sse_event("error", delta)
+            return
+        if ttft is None:
+            ttft = round(time.perf_counter() - started, 3)
+        parts.append(delta)
+        yield _sse_event("token", {"delta": delta})
+    print(f"[STREAM] {result_key} with {model_name}: time to first token {ttft}s, "
+          f"total {time.perf_counter() - started:.3f}s")
+    text = "".join(parts).strip()
+    if session_id:
+        review_store.save_summary(session_id, result_key, text, fingerprint)
+    yield _sse_event("done", {result_key: text, "ttft": ttft})
+
 @app.route("/api/generate-summary-conclusion", methods=["POST"])
 def generate_summary_conclusion_route():
     data = request.json
-    papers_info = data.get("papers_info", [])
+    papers_info = _session_papers(data, "papers_info", relevant=True)
     model_name = data.get('model_name', DEFAULT_MODEL)
     try:
-        summary_conclusion = generate_summary_conclusion_llm(papers_info, model_name)
+        fingerprint = make_key("summary_conclusion", corpus_fingerprint(papers_from_dicts(papers_info)), model_name)
+        summary_conclusion = session_summary(data.get('session_id'), "summary_conclusion", fingerprint,
+                                             lambda: generate_summary_conclusion_llm(papers_info, model_name))
         if isinstance(summary_conclusion, dict) and "error" in summary_conclusion:
             return jsonify(summary_conclusion), 500
         return jsonify({"summary_conclusion": summary_conclusion})
@@ -145,38 +416,35 @@ def generate_summary_conclusion_route():
 @app.route('/api/generate-introduction-summary', methods=['POST'])
 def generate_introduction_summary_route(): # Renamed for clarity
     try:
-        data = request.json
+        data = _with_session_meta(request.json)
         # Corrected: 'papersData' from frontend is all_papers, 'papersFilterData' is filtered_papers
         total_papers_count = len(data.get("total_papers", [])) # Expect 'total_papers' to be the full list
         filtered_papers_count = len(data.get("filtered_papers", []))
+        if data.get('session_id'):
+            # Sessions only need counting; the lists are never sent
+            session = review_store.get_session(data['session_id'])
+            total_papers_count = total_papers_count or session["total_papers"]
+            filtered_papers_count = filtered_papers_count or session["relevant_papers"]
+            if not data.get("answers"):
+                data["answers"] = session["answers"]
         research_questions = data.get("research_questions", [])
         objective = data.get("objective", "")
         search_string = data.get("search_string", "")
         answers = data.get("answers", []) # List of {question: ..., answer: ...}
         model_name = data.get('model_name', DEFAULT_MODEL)
 
-        # Constructing the introduction based on the provided data
-        prompt_intro = (f"This document synthesizes findings. Initially, {total_papers_count} papers related to \"{search_string}\" were considered. "
-                        f"After filtering, {filtered_papers_count} papers were thoroughly examined. The primary research objective is: {objective}.")
-        
-        prompt_questions = "\n\nKey Research Questions Addressed:\n" + "\n".join([f"- {q}" for q in research_questions])
-        
-        # Summarize answers briefly
-        answers_summary_parts = []
-        for ans_obj in answers:
-            if isinstance(ans_obj, dict) and 'question' in ans_obj and 'answer' in ans_obj:
-                 # Take first 150 chars of answer for brevity in prompt
-                ans_brief = ans_obj['answer'][:150] + "..." if len(ans_obj['answer']) > 150 else ans_obj['answer']
-                answers_summary_parts.append(f"- For question '{ans_obj['question']}': {ans_brief}")
-        prompt_answers = "\n\nSummary of Key Findings:\n" + "\n".join(answers_summary_parts)
-        
-        prompt = (f"{prompt_intro}{prompt_questions}{prompt_answers}\n\nBased on this information, "
-                  f"generate a coherent introduction and high-level summary of the findings for a research paper section.")
+        prompt = build_introduction_prompt(total_papers_count, filtered_papers_count, search_string, objective,
+                                           research_questions, answers)
 
-        introduction_summary = generate_introduction_summary_llm(prompt, model_name)
+        # The prompt carries every input (counts, questions, answers), so it is the fingerprint
+        introduction_summary = session_summary(data.get('session_id'), "introduction_summary",
+                                               make_key("introduction_summary", prompt, model_name),
+                                               lambda: generate_introduction_summary_llm(prompt, model_name))
         if isinstance(introduction_summary, dict) and "error" in introduction_summary:
             return jsonify(introduction_summary), 500
         return jsonify({"introduction_summary": introduction_summary})
+    except SessionNotFound:
+        raise
     except Exception as e:
         print(f"Error in generate_introduction_summary_route: {e}")
         return jsonify({"error": str(e)}), 500
@@ -185,9 +453,15 @@ def generate_introduction_summary_route(): # Renamed for clarity
 @app.route("/api/generate-summary-all", methods=["POST"])
 def generate_summary_all_route():
     data = request.json
-    abstract_summary = data.get("abstract_summary", "No abstract provided.")
-    intro_summary = data.get("intro_summary", "No introduction provided.")
-    conclusion_summary = data.get("conclusion_summary", "No conclusion provided.")
+    if data.get('session_id'):
+        stored = review_store.get_session(data['session_id'])["summaries"]
+        data = dict({"abstract_summary": stored.get("summary_abstract"),
+                     "intro_summary": stored.get("introduction_summary"),
+                     "conclusion_summary": stored.get("summary_conclusion")},
+                    **{key: value for key, value in data.items() if value})
+    abstract_summary = data.get("abstract_summary") or "No abstract provided."
+    intro_summary = data.get("intro_summary") or "No introduction provided."
+    conclusion_summary = data.get("conclusion_summary") or "No conclusion provided."
 
     try:
         # Ensure templates directory exists
@@ -250,29 +524,229 @@ def generate_summary_all_route():
 def search_papers_route():
     try:
         data = request.json
-        search_string = data.get('search_string')
-        start_year = data.get('start_year', datetime.datetime.now().year - 1)
-        limit = data.get('limit', 10)
-        source = data.get('source', 'scopus')  # Default to scopus for backward compatibility
-        
-        if not search_string:
+        if not data.get('search_string'):
             return jsonify({"error": "Search string is required"}), 400
-            
-        # Call the appropriate search function based on source
-        if source.lower() == 'semanticscholar':
-            papers = search_semantic_scholar(search_string, start_year, limit)
-        else:  # Default to scopus
-            papers = search_elsevier(search_string, start_year, start_year, limit)
-        
+        try:
+            _request_int(data, 'limit')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if data.get('async'):
+            return _submit_job_response(submit_job('search_papers', _search_papers_job, data))
+        if data.get('stream'):
+            return _sse_response(_stream_search_pages(data))
+
+        papers = _search_papers(data)
         if isinstance(papers, dict) and "error" in papers:
             return jsonify({"error": papers.get("error", "Failed to fetch papers")}), 500
+        _store_search_results(data, papers)
             
         return jsonify(papers)
         
+    except SessionNotFound:
+        raise
     except Exception as e:
         print(f"Error in search_papers_route: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+def _search_papers(data):
+    search_string = data.get('search_string')
+    start_year = data.get('start_year', datetime.datetime.now().year - 1)
+    limit = _request_int(data, 'limit') or 10
+    source = data.get('source', 'scopus')  # Default to scopus for backward compatibility
+    # Results are cached per normalised query; "refresh": true fetches them again
+    use_cache = not data.get('refresh')
+
+    # Call the appropriate search function based on source
+    if source.lower() in ('all', 'federated'):
+        # Returns {"papers": [...], "sources": {...}} rather than a bare list
+        return search_federated(search_string, start_year, limit, data.get('sources'))
+    elif source.lower() == 'semanticscholar':
+        return search_semantic_scholar(search_string, start_year, limit, use_cache)
+    else:  # Default to scopus
+        return search_elsevier(search_string, start_year, start_year, limit, use_cache)
+
+
+def _store_search_results(data, papers, replace=None):
+    """Saves search results to the request's review session: replacing its papers unless "append" is set."""
+    session_id = data.get('session_id')
+    if not session_id:
+        return
+    found = papers.get("papers", []) if isinstance(papers, dict) else papers
+    review_store.add_papers(session_id, found, replace=not data.get('append') if replace is None else replace)
+    review_store.update_meta(session_id, search_string=data.get('search_string'))
+
+
+def _stream_search_pages(data):
+    """SSE stream of 'page' events as Scopus / Semantic Scholar pages arrive, then 'done' (or 'error')."""
+    search_string = data.get('search_string')
+    start_year = data.get('start_year', datetime.datetime.now().year - 1)
+    limit = _request_int(data, 'limit') or 10
+    if data.get('source', 'scopus').lower() == 'semanticscholar':
+        pages = iter_semantic_scholar_pages(search_string, start_year, limit)
+    else:
+        pages = iter_elsevier_pages(search_string, start_year, start_year, limit)
+    total = 0
+    try:
+        for number, page in enumerate(prefetch_pages(pages)):
+            total += len(page)
+            # The first page replaces the session's papers (unless appending); later pages extend them
+            _store_search_results(data, page, replace=number == 0 and not data.get('append'))
+            yield _sse_event("page", {"page": number, "papers": page})
+    except SearchAPIError as e:
+        yield _sse_event("error", {"error": e.message, "status_code": e.status_code})
+        return
+    yield _sse_event("done", {"total": total})
+
+
+def _search_papers_job(job, data):
+    job.report_progress(0, 1)
+    papers = _search_papers(data)
+    if isinstance(papers, dict) and "error" in papers:
+        raise RuntimeError(papers.get("error", "Failed to fetch papers"))
+    _store_search_results(data, papers)
+    job.report_progress(1)
+    return papers
+
+
+# --- Review sessions ---
+@app.route('/api/sessions', methods=['POST'])
+def create_session_route():
+    # Optional body: objective, search_string, research_questions... kept as session metadata
+    meta = request.get_json(silent=True) or {}
+    session_id = review_store.create_session(meta)
+    return jsonify({"session_id": session_id}), 201
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+def get_session_route(session_id):
+    return jsonify(review_store.get_session(session_id))
+
+@app.route('/api/sessions/<session_id>', methods=['PATCH'])
+def update_session_route(session_id):
+    return jsonify({"meta": review_store.update_meta(session_id, **(request.get_json(silent=True) or {}))})
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def delete_session_route(session_id):
+    if not review_store.delete_session(session_id):
+        raise SessionNotFound(session_id)
+    return jsonify({"deleted": session_id})
+
+@app.route('/api/sessions/<session_id>/papers', methods=['GET'])
+def session_papers_route(session_id):
+    # ?relevant=true / false filters on the screening verdict
+    relevant = request.args.get('relevant')
+    relevant = None if relevant is None else relevant.lower() in ('1', 'true', 'yes')
+    return jsonify({"papers": review_store.get_papers(session_id, relevant)})
+
+@app.route('/api/sessions/<session_id>/papers', methods=['POST'])
+def add_session_papers_route(session_id):
+    data = request.get_json(silent=True) or {}
+    total = review_store.add_papers(session_id, papers_from_dicts(data.get('papers')), replace=bool(data.get('replace')))
+    return jsonify({"total_papers": total})
+
+
+# --- Exports ---
+def _export_response(fmt, rows, provenance, filename):
+    # Streamed a record at a time, so large reviews export in constant memory
+    _, mimetype, extension = EXPORT_FORMATS[fmt]
+    return Response(stream_with_context(export_records(fmt, rows, provenance)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}.{extension}"',
+                             'X-Accel-Buffering': 'no'})
+
+def _unknown_export_format(fmt):
+    return jsonify({"error": f"Unknown export format '{fmt}'; use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+@app.route('/api/sessions/<session_id>/export/<fmt>', methods=['GET'])
+def session_export_route(session_id, fmt):
+    # ?relevant=true / false exports only included / excluded papers
+    if fmt not in EXPORT_FORMATS:
+        return _unknown_export_format(fmt)
+    relevant = request.args.get('relevant')
+    relevant = None if relevant is None else relevant.lower() in ('1', 'true', 'yes')
+    meta = review_store.get_session(session_id)["meta"]
+    provenance = {"session_id": session_id, "search_string": meta.get("search_string")}
+    return _export_response(fmt, review_store.iter_screening_state(session_id, relevant), provenance,
+                            f"review-{session_id}")
+
+@app.route('/api/export/<fmt>', methods=['POST'])
+def export_route(fmt):
+    # Body: papers, their screening records in the same order (the "per_paper" list of /api/filter_papers'
+    # "screening" report, or that whole report) when screened, and the search_string they came from
+    if fmt not in EXPORT_FORMATS:
+        return _unknown_export_format(fmt)
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('papers'), list):
+        return jsonify({"error": "papers must be a list"}), 400
+    screening = data.get('screening')
+    if isinstance(screening, dict):
+        # The whole screening report was posted; its records are under per_paper
+        screening = screening.get('per_paper')
+    if screening is not None and not (isinstance(screening, list)
+                                      and all(record is None or isinstance(record, dict) for record in screening)):
+        return jsonify({"error": "screening must be a list of screening records"}), 400
+    provenance = {"search_string": data.get('search_string')}
+    return _export_response(fmt, paper_rows(data['papers'], screening), provenance, "papers")
+
+
+# --- Background jobs ---
+def _submit_job_response(job):
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": f"/api/jobs/{job.id}"}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs_route():
+    return jsonify({"jobs": list_jobs()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status_route(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats_route():
+    # Hit/miss counters are per worker process; entry counts are read from the shared SQLite store
+    return jsonify(cache_stats())
+
+
+@app.route('/api/rate_limits', methods=['GET'])
+def rate_limits_route():
+    # Per provider/key: requests granted, total seconds callers waited, and callers queued right now
+    return jsonify(rate_limiter_stats())
+
+@app.route('/api/scholar_proxies', methods=['GET'])
+def scholar_proxies_route():
+    # The Google Scholar proxy pool, best first: score, successes/failures, CAPTCHAs, latency, ban time left
+    return jsonify(scholar_proxy_pool.stats())
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_route():
+    # Prometheus scrape endpoint: LLM/search call counts, latencies, tokens, cost, cache lookups, route timings
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics/reviews', methods=['GET'])
+@app.route('/api/metrics/reviews/<review_id>', methods=['GET'])
+def review_metrics_route(review_id=None):
+    # Cost and latency per review, broken down by the route or pipeline stage that made the calls
+    breakdown = review_breakdown(review_id)
+    if breakdown is None:
+        return jsonify({"error": f"No metrics recorded for review {review_id}"}), 404
+    return jsonify(breakdown)
+
+@app.route('/api/startup', methods=['GET'])
+def startup_route():
+    # How long this worker took to import, and which lazily initialised components have loaded since
+    return jsonify({"import_seconds": STARTUP_SECONDS, "uptime_seconds": round(time.perf_counter() - _import_started, 1),
+                    "scholar_ready": scholar_ready()})
+
 # --- Static file serving ---
 @app.route('/')
 def index():
@@ -288,49 +762,35 @@ def serve(path):
 
 @app.route('/api/test-keys', methods=['GET'])
 def test_keys():
-    import requests
-    deepseek_key = os.getenv('DEEPSEEK_API_KEY')
-    openai_key = os.getenv('OPENAI_API_KEY')
-    result = {
-        'deepseek_key_loaded': bool(deepseek_key),
-        'openai_key_loaded': bool(openai_key),
-        'deepseek_api_status': None,
-        'openai_api_status': None,
-        'deepseek_message': '',
-        'openai_message': ''
-    }
-    # Test DeepSeek API (example endpoint, adjust as needed)
-    if deepseek_key:
-        try:
-            resp = requests.get(
-                'https://api.deepseek.com/v1/models',
-                headers={'Authorization': f'Bearer {deepseek_key}'}
-            )
-            result['deepseek_api_status'] = resp.status_code
-            if resp.ok:
-                result['deepseek_message'] = 'DeepSeek API key valid.'
-            else:
-                result['deepseek_message'] = f'DeepSeek API error: {resp.text}'
-        except Exception as e:
-            result['deepseek_api_status'] = 'error'
-            result['deepseek_message'] = str(e)
-    # Test OpenAI API (list models)
-    if openai_key:
+    result = {}
+    # Test each registered provider by listing its models over the shared client
+    for name, provider in PROVIDERS.items():
+        result[f'{name}_key_loaded'] = bool(provider.api_key)
+        result[f'{name}_circuit'] = breaker_states()[name]
+        result[f'{name}_api_status'] = None
+        result[f'{name}_message'] = ''
+        if not provider.api_key:
+            continue
         try:
-            resp = requests.get(
-                'https://api.openai.com/v1/models',
-                headers={'Authorization': f'Bearer {openai_key}'}
-            )
-            result['openai_api_status'] = resp.status_code
-            if resp.ok:
-                result['openai_message'] = 'OpenAI API key valid.'
+            resp = provider_request(name, 'GET', '/models')
+            result[f'{name}_api_status'] = resp.status_code
+            if resp.is_success:
+                result[f'{name}_message'] = f'{provider.display_name} API key valid.'
             else:
-                result['openai_message'] = f'OpenAI API error: {resp.text}'
+                result[f'{name}_message'] = f'{provider.display_name} API error: {resp.text}'
         except Exception as e:
-            result['openai_api_status'] = 'error'
-            result['openai_message'] = str(e)
+            result[f'{name}_api_status'] = 'error'
+            result[f'{name}_message'] = str(e)
     return jsonify(result)
 
+# Google Scholar (scholarly + proxy health checks) loads on the first Scholar search; SCHOLAR_WARMUP=1
+# starts loading it in the background instead, without delaying start-up.
+if os.getenv("SCHOLAR_WARMUP", "0") == "1":
+    threading.Thread(target=get_scholarly, name="scholar-warmup", daemon=True).start()
+
+STARTUP_SECONDS = round(time.perf_counter() - _import_started, 3)
+print(f"[STARTUP] Server ready in {STARTUP_SECONDS}s")
+
 # For Vercel serverless deployment
 def handler(event, context):
     return app(event, context)
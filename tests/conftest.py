@@ -0,0 +1,41 @@
+# tests/conftest.py
+# The app modules read their endpoints and settings from the environment at import time, so the
+# mock services are started and the environment pointed at them (and at scratch caches and stores)
+# here, before any test module imports them.
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_services import MockServices  # noqa: E402
+
+_services = MockServices().start()
+_scratch = tempfile.mkdtemp(prefix="slr-tests-")
+os.environ.update(_services.env())
+os.environ.update(
+    LLM_CACHE_ENABLED="0", LLM_MAX_RETRIES="2", LLM_BACKOFF_MAX="0.05", LLM_FALLBACK_MODELS="",
+    # Tests inject failures on purpose; keep them from opening the circuit for later tests
+    LLM_BREAKER_THRESHOLD="1000", SEARCH_MAX_RETRIES="2", SEARCH_PREFETCH_PAGES="2",
+    REVIEW_STORE_PATH=os.path.join(_scratch, "reviews.sqlite3"), FULLTEXT_DIR=os.path.join(_scratch, "fulltext"),
+    SCHOLAR_USE_PROXY="0",
+)
+
+
+@atexit.register
+def _cleanup():
+    _services.stop()
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+
+@pytest.fixture
+def services():
+    """The shared MockServices, with counters and injected faults reset for each test."""
+    _services.reset()
+    yield _services
+    _services.reset()
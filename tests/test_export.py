@@ -0,0 +1,38 @@
+# tests/test_export.py
+# /api/export/<fmt> with the screening records /api/filter_papers returns.
+import csv
+import io
+
+from mock_services import synthetic_paper
+from paper import Paper
+
+SEARCH_STRING = "large language models AND code review"
+
+
+def _papers(count):
+    return [Paper.from_semantic_scholar(synthetic_paper(i)).to_dict() for i in range(count)]
+
+
+def _csv_statuses(response):
+    return [row["screening_status"] for row in csv.DictReader(io.StringIO(response.get_data(as_text=True)))]
+
+
+def test_exports_screening_records_or_report():
+    from server import app
+
+    records = [{"relevant": True, "mode": "batch"}, {"relevant": False, "mode": "batch"}, None]
+    client = app.test_client()
+    for screening in [records, {"per_paper": records, "unscreened": 1}]:
+        response = client.post("/api/export/csv", json={
+            "papers": _papers(3), "screening": screening, "search_string": SEARCH_STRING})
+        assert response.status_code == 200
+        assert _csv_statuses(response) == ["included", "excluded", "unscreened"]
+
+
+def test_rejects_malformed_screening_before_streaming():
+    from server import app
+
+    client = app.test_client()
+    for screening in ["included", [1, 2], {"per_paper": "none"}]:
+        response = client.post("/api/export/csv", json={"papers": _papers(2), "screening": screening})
+        assert response.status_code == 400
@@ -0,0 +1,173 @@
+# tests/test_fulltext.py
+# Full-text ingestion against small generated PDFs served from a local HTTP server: text
+# extraction, chunking, the content-addressed store and BM25 passage selection.
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fulltext
+from fulltext import (DownloadError, FullTextStore, check_url, chunk_words, extract_pdf_chunks,
+                      ingest_fulltext)
+from paper import Paper
+
+
+def make_pdf(lines):
+    """A one-page PDF showing `lines` in Helvetica."""
+    content = "BT /F1 12 Tf 72 720 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return data
+
+
+REVIEW_LINES = ["Reviewer latency in modern code review"] + \
+    [f"Line {i}: reviewers answer pull requests within hours" for i in range(20)]
+TESTING_LINES = ["Mutation testing of numerical libraries"] + \
+    [f"Line {i}: mutants survive floating point tolerance checks" for i in range(20)]
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def pdf_server(tmp_path_factory):
+    """Base URL of a local HTTP server for a directory of PDFs (and one login page posing as a PDF)."""
+    root = tmp_path_factory.mktemp("pdfs")
+    (root / "review.pdf").write_bytes(make_pdf(REVIEW_LINES))
+    (root / "review-mirror.pdf").write_bytes(make_pdf(REVIEW_LINES))
+    (root / "testing.pdf").write_bytes(make_pdf(TESTING_LINES))
+    (root / "paywalled.pdf").write_text("<html><body>Please log in</body></html>")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty FullTextStore; downloads from the loopback test server are allowed."""
+    monkeypatch.setattr(fulltext, "FULLTEXT_ALLOW_PRIVATE", True)
+    return FullTextStore(tmp_path / "fulltext")
+
+
+def _paper(title, pdf_url, abstract=""):
+    return Paper(title=title, pdf_url=pdf_url, abstract=abstract)
+
+
+def _files(store, kind):
+    return sorted(path.name for path in (store.root / kind).rglob("*") if path.is_file())
+
+
+def test_extracts_text_from_pdf():
+    pages, chunks = extract_pdf_chunks(make_pdf(REVIEW_LINES))
+    assert pages == 1
+    text = " ".join(chunks)
+    assert "Reviewer latency in modern code review" in text
+    assert "Line 19: reviewers answer pull requests within hours" in text
+
+
+def test_chunks_overlap():
+    words = [str(i) for i in range(100)]
+    chunks = chunk_words(" ".join(words), size=30, overlap=10)
+    assert [chunk.split()[0] for chunk in chunks] == ["0", "20", "40", "60", "80"]
+    assert chunks[-1].split()[-1] == "99"
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.split()[-10:] == chunk.split()[:10]
+    assert chunk_words("a few words") == ["a few words"]
+
+
+def test_store_keeps_each_chunk_once(store):
+    store.put_document("d1", 1, ["shared chunk", "first only"])
+    store.put_document("d2", 1, ["shared chunk", "second only"])
+    assert len(_files(store, "chunks")) == 3
+    assert len(_files(store, "documents")) == 2
+
+
+def test_ingest_parses_identical_pdfs_once(store, pdf_server):
+    papers = [_paper("Review", f"{pdf_server}/review.pdf"),
+              _paper("Review (mirror)", f"{pdf_server}/review-mirror.pdf"),
+              _paper("No PDF", "")]
+    report = ingest_fulltext(papers, store=store, max_processes=0)
+    assert (report["downloaded"], report["parsed"], report["no_pdf"], report["failed"]) == (2, 1, 1, 0)
+    assert len(_files(store, "documents")) == 1
+    assert len(_files(store, "sources")) == 2
+    chunks = store.get_chunks(papers[0])
+    assert chunks and store.get_chunks(papers[1]) == chunks
+    assert len(_files(store, "chunks")) == len(set(chunks))
+    assert store.document_id(papers[0]) == store.document_id(papers[1])
+
+    report = ingest_fulltext(papers, store=store, max_processes=0)
+    assert (report["cached"], report["downloaded"]) == (2, 0)
+
+
+def test_ingest_in_process_pool(store, pdf_server, monkeypatch):
+    monkeypatch.setattr(fulltext, "FULLTEXT_MAX_PROCESSES", 1)
+    papers = [_paper("Review", f"{pdf_server}/review.pdf"), _paper("Testing", f"{pdf_server}/testing.pdf")]
+    report = ingest_fulltext(papers, store=store)
+    assert (report["parsed"], report["failed"]) == (2, 0)
+    assert "mutants survive" in " ".join(store.get_chunks(papers[1]))
+
+
+def test_ingest_records_failures_and_skips_them(store, pdf_server):
+    papers = [_paper("Paywalled", f"{pdf_server}/paywalled.pdf"), _paper("Missing", f"{pdf_server}/missing.pdf")]
+    report = ingest_fulltext(papers, store=store, max_processes=0)
+    assert report["failed"] == 2
+    assert report["errors"] == {"Paywalled": "response is not a PDF", "Missing": "HTTP 404"}
+    assert store.get_chunks(papers[0]) == []
+
+    report = ingest_fulltext(papers, store=store, max_processes=0)
+    assert (report["skipped"], report["failed"]) == (2, 0)
+
+
+def test_refuses_non_public_urls(tmp_path, monkeypatch, pdf_server):
+    monkeypatch.setattr(fulltext, "FULLTEXT_ALLOW_PRIVATE", False)
+    for url in [f"{pdf_server}/review.pdf", "http://localhost/x.pdf", "http://169.254.169.254/latest/meta-data",
+                "http://[::1]/x.pdf", "file:///etc/passwd", "ftp://example.org/x.pdf"]:
+        with pytest.raises(DownloadError):
+            check_url(url)
+
+    store = FullTextStore(tmp_path / "fulltext")
+    report = ingest_fulltext([_paper("Review", f"{pdf_server}/review.pdf")], store=store, max_processes=0)
+    assert report["failed"] == 1 and "non-public" in report["errors"]["Review"]
+
+
+def test_selects_passages_from_matching_paper(store, pdf_server, monkeypatch):
+    import agents4
+
+    monkeypatch.setattr(agents4, "fulltext_store", store)
+    review = _paper("Reviewer latency in code review", f"{pdf_server}/review.pdf",
+                    "How quickly reviewers answer pull requests.")
+    testing = _paper("Mutation testing of numerical libraries", f"{pdf_server}/testing.pdf",
+                     "Surviving mutants and floating point tolerances.")
+    unread = _paper("Pull request reviewers at scale", "", "Reviewers and pull requests.")
+    papers = [testing, unread, review]
+
+    assert agents4.select_fulltext_passages("How fast do reviewers answer pull requests?", papers) == []
+
+    ingest_fulltext(papers, store=store, max_processes=0)
+    lines = agents4.select_fulltext_passages("How fast do reviewers answer pull requests?", papers, top_papers=3)
+    assert lines and all(line.startswith(f"- From '{review.title}': ") for line in lines)
+
+    lines = agents4.select_fulltext_passages("Which mutants survive tolerance checks?", papers, top_papers=3)
+    assert lines[0].startswith(f"- From '{testing.title}': ")
+
+    assert agents4.select_fulltext_passages("reviewers", papers, token_budget=0) == []
@@ -0,0 +1,30 @@
+# tests/test_jobs.py
+# Background job lifecycle: results of finished and cancelled jobs.
+import threading
+
+from jobs import CANCELLED, SUCCEEDED, cancel_job, submit_job
+
+
+def test_succeeded_job_exposes_result():
+    job = submit_job("test", lambda job: {"answers": []})
+    job._future.result(timeout=5)
+    assert job.status == SUCCEEDED
+    assert job.to_dict()["result"] == {"answers": []}
+
+
+def test_cancelled_job_keeps_partial_result():
+    started = threading.Event()
+
+    def _screen(job):
+        started.set()
+        job.cancel_event.wait(5)
+        return {"filtered_papers": [], "screening": {"screened": 1, "unscreened": 2}}
+
+    job = submit_job("test", _screen)
+    assert started.wait(5)
+    cancel_job(job.id)
+    job._future.result(timeout=5)
+    assert job.status == CANCELLED
+    assert job.to_dict()["result"]["screening"] == {"screened": 1, "unscreened": 2}
+    assert "result" not in job.to_dict(include_result=False)
+
@@ -0,0 +1,43 @@
+# tests/test_llm_client.py
+# Circuit breaker and model fallback of llm_client against the mock chat-completions API.
+import pytest
+
+import llm_client
+from llm_client import CircuitBreaker, LLMRequestError, PROVIDERS, call_llm
+
+MESSAGES = [{"role": "user", "content": "Say hello."}]
+
+
+def test_invalid_response_ends_half_open_trial(monkeypatch):
+    provider = PROVIDERS["openai"]
+    breaker = CircuitBreaker(provider.name, threshold=1, reset_timeout=0)
+    monkeypatch.setitem(llm_client._breakers, provider.name, breaker)
+
+    def _html_page():
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+    with pytest.raises(LLMRequestError):
+        llm_client._with_retries(provider, _html_page)
+    assert breaker.opened_at is not None
+    # The half-open trial fails the same way; the next request must still be let through
+    with pytest.raises(LLMRequestError):
+        llm_client._with_retries(provider, _html_page)
+    assert llm_client._with_retries(provider, lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("status", [401, 403, 404])
+def test_falls_back_when_provider_rejects_key_or_model(services, monkeypatch, status):
+    monkeypatch.setattr(llm_client, "LLM_FALLBACK_MODELS", "gpt-*=deepseek-chat")
+    services.inject(status)
+    result = call_llm(MESSAGES, "gpt-3.5-turbo", use_cache=False)
+    assert "error" not in result
+    assert services.requests == {f"chat:{status}": 1, "chat:200": 1}
+
+
+def test_bad_request_is_not_sent_to_fallbacks(services, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_FALLBACK_MODELS", "gpt-*=deepseek-chat")
+    services.inject(400)
+    result = call_llm(MESSAGES, "gpt-3.5-turbo", use_cache=False)
+    assert "error" in result
+    assert services.requests == {"chat:400": 1}
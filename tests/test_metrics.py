@@ -0,0 +1,19 @@
+# tests/test_metrics.py
+# Prometheus rendering of the metrics counters.
+from metrics import _format_value, model_cost, record_llm_call, render_prometheus
+
+
+def test_renders_large_counters_exactly():
+    record_llm_call("openai", "gpt-4o-metrics-test", 0.5, prompt_tokens=12345678, completion_tokens=1)
+    lines = render_prometheus().splitlines()
+    assert 'slr_llm_tokens_total{kind="prompt",model="gpt-4o-metrics-test"} 12345678' in lines
+    cost = model_cost("gpt-4o-metrics-test", 12345678, 1)
+    assert f'slr_llm_cost_usd_total{{model="gpt-4o-metrics-test"}} {cost!r}' in lines
+
+
+def test_formats_special_values():
+    assert _format_value(3) == "3"
+    assert _format_value(0.1) == "0.1"
+    assert _format_value(float("inf")) == "+Inf"
+    assert _format_value(float("-inf")) == "-Inf"
+    assert _format_value(float("nan")) == "NaN"
@@ -0,0 +1,126 @@
+# tests/test_screening.py
+# Screening against the mock chat-completions API: batching, retries of 429/500 responses,
+# unscreened accounting and incremental reuse of session verdicts.
+import pytest
+
+from mock_services import is_relevant, synthetic_paper
+from paper import Paper
+from agents4 import filter_papers_llm
+from incremental import filter_session_papers
+from review_store import review_store
+
+SEARCH_STRING = "large language models AND code review"
+
+
+def _papers(count, start=0):
+    return [Paper.from_semantic_scholar(synthetic_paper(i)) for i in range(start, start + count)]
+
+
+def _titles(papers):
+    return [paper.title for paper in papers]
+
+
+def test_batches_papers_into_one_request_each(services):
+    papers = _papers(20)
+    stats = {}
+    relevant = filter_papers_llm(SEARCH_STRING, papers, stats=stats, batch_size=5)
+    assert services.requests == {"chat:200": 4}
+    assert _titles(relevant) == [paper.title for paper in papers if is_relevant(paper.title)]
+    assert stats["unscreened"] == 0
+    assert {record["mode"] for record in stats["per_paper"]} == {"batch"}
+
+
+def test_single_mode_sends_one_request_per_paper(services):
+    papers = _papers(6)
+    relevant = filter_papers_llm(SEARCH_STRING, papers, batch_size=1)
+    assert services.requests == {"chat:200": 6}
+    assert _titles(relevant) == [paper.title for paper in papers if is_relevant(paper.title)]
+
+
+@pytest.mark.parametrize("status", [429, 500])
+def test_retries_transient_errors(services, status):
+    # LLM_MAX_RETRIES=2 (conftest): the third attempt gets through
+    services.inject(status, 2)
+    stats = {}
+    filter_papers_llm(SEARCH_STRING, _papers(10), stats=stats, batch_size=10)
+    assert services.requests == {f"chat:{status}": 2, "chat:200": 1}
+    assert stats["unscreened"] == 0
+
+
+def test_failed_requests_leave_papers_unscreened(services):
+    services.inject(500, 3)
+    stats = {}
+    relevant = filter_papers_llm(SEARCH_STRING, _papers(10), stats=stats, batch_size=10)
+    assert relevant == []
+    assert stats["unscreened"] == 10
+    assert all(record["relevant"] is None for record in stats["per_paper"])
+
+
+def test_filter_route_returns_unscreened_papers(services):
+    from server import app
+
+    papers = _papers(10)
+    # max_workers=1 sends the batches in order, so only the first one exhausts its retries
+    services.inject(500, 3)
+    response = app.test_client().post("/api/filter_papers", json={
+        "search_string": SEARCH_STRING, "papers": [paper.to_dict() for paper in papers],
+        "batch_size": 5, "max_workers": 1})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [paper["title"] for paper in body["unscreened_papers"]] == _titles(papers[:5])
+    assert [paper["title"] for paper in body["filtered_papers"]] == \
+        [paper.title for paper in papers[5:] if is_relevant(paper.title)]
+    assert body["screening"]["unscreened"] == 5
+
+
+def test_filter_route_rejects_bad_overrides(services):
+    from server import app
+
+    response = app.test_client().post("/api/filter_papers", json={
+        "search_string": SEARCH_STRING, "papers": [], "batch_size": "lots"})
+    assert response.status_code == 400
+    assert services.requests == {}
+
+
+def test_session_screening_reuses_verdicts(services):
+    session_id = review_store.create_session({"search_string": SEARCH_STRING})
+    review_store.add_papers(session_id, _papers(12))
+
+    stats = {}
+    first, _ = filter_session_papers(session_id, SEARCH_STRING, stats=stats, batch_size=4)
+    assert services.requests == {"chat:200": 3}
+    assert stats["reused"] == 0
+
+    services.reset()
+    stats = {}
+    second, records = filter_session_papers(session_id, SEARCH_STRING, stats=stats, batch_size=4)
+    assert services.requests == {}
+    assert stats["reused"] == 12
+    assert {record["mode"] for record in records} == {"reused"}
+    assert _titles(second) == _titles(first)
+
+    # Only papers added since are screened
+    review_store.add_papers(session_id, _papers(4, start=12))
+    stats = {}
+    filter_session_papers(session_id, SEARCH_STRING, stats=stats, batch_size=4)
+    assert services.requests == {"chat:200": 1}
+    assert stats["reused"] == 12
+
+
+def test_session_screening_retries_unscreened_papers(services):
+    session_id = review_store.create_session()
+    review_store.add_papers(session_id, _papers(6))
+
+    services.inject(500, 3)
+    stats = {}
+    relevant, _ = filter_session_papers(session_id, SEARCH_STRING, stats=stats, batch_size=6)
+    assert relevant == []
+    assert stats["unscreened"] == 6
+    assert review_store.get_session(session_id)["unscreened_papers"] == 6
+
+    services.reset()
+    stats = {}
+    relevant, _ = filter_session_papers(session_id, SEARCH_STRING, stats=stats, batch_size=6)
+    assert services.requests == {"chat:200": 1}
+    assert stats["reused"] == 0 and stats["unscreened"] == 0
+    assert _titles(relevant) == [paper.title for paper in _papers(6) if is_relevant(paper.title)]
@@ -0,0 +1,86 @@
+# tests/test_search.py
+# Paginated Semantic Scholar and Scopus retrieval against the mock search APIs, including
+# retries of 429/500 responses and the error dict returned once retries run out.
+import time
+
+import agents3
+from agents3 import search_elsevier, search_semantic_scholar
+
+SEARCH_STRING = "large language models AND code review"
+
+
+def test_semantic_scholar_pages_until_limit(services):
+    papers = search_semantic_scholar(SEARCH_STRING, 2018, 250, use_cache=False)
+    assert [paper.identifier for paper in papers] == [f"mock{i}" for i in range(250)]
+    # S2_PAGE_SIZE=100
+    assert services.requests == {"semanticscholar:200": 3}
+
+
+def test_semantic_scholar_retries_rate_limits(services):
+    # SEARCH_MAX_RETRIES=2 (conftest): the third attempt gets through
+    services.inject(429, 2)
+    papers = search_semantic_scholar(SEARCH_STRING, 2018, 50, use_cache=False)
+    assert len(papers) == 50
+    assert services.requests == {"semanticscholar:429": 2, "semanticscholar:200": 1}
+
+
+def test_scopus_follows_cursor_and_retries_errors(services):
+    services.inject(500, 1)
+    papers = search_elsevier(SEARCH_STRING, 2018, 2018, 60, use_cache=False)
+    assert [paper.identifier for paper in papers] == [f"SCOPUS_ID:{i}" for i in range(60)]
+    # SCOPUS_PAGE_SIZE=25
+    assert services.requests == {"scopus:500": 1, "scopus:200": 3}
+
+
+def test_search_returns_error_after_retries(services):
+    services.inject(500, 3)
+    result = search_elsevier(SEARCH_STRING, 2018, 2018, 10, use_cache=False)
+    assert isinstance(result, dict) and "error" in result
+    assert services.requests == {"scopus:500": 3}
+
+
+class _DictCache:
+    """In-memory stand-in for search_cache, which the test environment disables."""
+    enabled = True
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+def test_stale_refresh_keeps_the_larger_limit(services, monkeypatch):
+    cache = _DictCache()
+    monkeypatch.setattr(agents3, "search_cache", cache)
+    monkeypatch.setitem(agents3.SEARCH_CACHE_TTLS, "semanticscholar", -1)
+    assert len(search_semantic_scholar(SEARCH_STRING, 2018, 100)) == 100
+
+    # Stale: served from the cache and refreshed in the background
+    assert len(search_semantic_scholar(SEARCH_STRING, 2018, 10)) == 10
+    deadline = time.monotonic() + 5
+    while agents3._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    (entry,) = cache.entries.values()
+    assert entry["limit"] == 100 and len(entry["papers"]) == 100
+    assert services.requests == {"semanticscholar:200": 2}
+
+
+def test_accepts_string_limit(services):
+    papers = search_semantic_scholar(SEARCH_STRING, "2018", "20", use_cache=False)
+    assert len(papers) == 20
+
+
+def test_search_route_validates_limit(services):
+    from server import app
+
+    client = app.test_client()
+    response = client.post("/api/search_papers", json={
+        "search_string": SEARCH_STRING, "source": "semanticscholar", "limit": "20", "refresh": True})
+    assert response.status_code == 200 and len(response.get_json()) == 20
+    response = client.post("/api/search_papers", json={"search_string": SEARCH_STRING, "limit": "lots"})
+    assert response.status_code == 400
+    assert services.requests == {"semanticscholar:200": 1}
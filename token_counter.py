@@ -0,0 +1,61 @@
+# token_counter.py
+# Token counting for prompt budgeting. Uses tiktoken's BPE encodings when they can be loaded
+# (tiktoken downloads each encoding once and caches it under TIKTOKEN_CACHE_DIR); otherwise
+# falls back to a characters-per-token estimate so budgeting still works offline.
+import math
+import threading
+
+# Rough English average for GPT-style BPE vocabularies, used only by the fallback.
+CHARS_PER_TOKEN = 4.0
+# DeepSeek doesn't publish a tiktoken encoding; cl100k_base is a close stand-in.
+_FALLBACK_ENCODING = "cl100k_base"
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+_warned = False
+
+
+def _get_encoding(model_name):
+    """Returns a tiktoken encoding for the model, or None when tiktoken or the encoding is unavailable."""
+    global _warned
+    key = model_name or _FALLBACK_ENCODING
+    if key in _encodings:
+        return _encodings[key]
+    with _encodings_lock:
+        if key in _encodings:
+            return _encodings[key]
+        encoding = None
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model_name) if model_name else None
+            except KeyError:
+                encoding = None
+            encoding = encoding or tiktoken.get_encoding(_FALLBACK_ENCODING)
+        except Exception as e:
+            if not _warned:
+                print(f"[TOKEN_COUNTER] tiktoken unavailable ({e}); estimating {CHARS_PER_TOKEN} characters per token")
+                _warned = True
+        _encodings[key] = encoding
+        return encoding
+
+
+def count_tokens(text, model_name=None):
+    """Number of tokens `text` occupies in `model_name`'s prompt."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model_name=None):
+    """Cuts `text` down to at most `max_tokens` tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return text[:int(max_tokens * CHARS_PER_TOKEN)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])